@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Category, Seller, Product, Order, OrderItem
+from django.contrib import admin, messages
+from .models import Category, Seller, Product, Order, OrderItem, InventoryMovement, ArchivedOrder
+from .order_status import STATUS_LABELS, OrderStatusConflict, change_order_status
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -19,14 +20,73 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     list_editable = ['price', 'stock', 'is_active']
 
+    def save_model(self, request, obj, form, change):
+        # การแก้ stock ถูกบันทึกเป็น movement (ดู signals.py)
+        obj._stock_reference = f'admin:{request.user.get_username()}'
+        super().save_model(request, obj, form, change)
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    """ดูได้อย่างเดียว สมุด stock ไม่มีการแก้หรือลบ"""
+    list_display = ['id', 'product_id', 'quantity', 'reason', 'reference', 'created_at']
+    list_filter = ['reason']
+    search_fields = ['reference']
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
 
+def status_action(target):
+    """action เปลี่ยนสถานะผ่าน change_order_status (ตรวจลำดับสถานะและคืน stock เมื่อยกเลิก)"""
+
+    def action(modeladmin, request, queryset):
+        try:
+            updated, errors = change_order_status(None, dict.fromkeys(queryset.values_list('pk', flat=True), target))
+        except OrderStatusConflict:
+            modeladmin.message_user(request, 'ออร์เดอร์ถูกแก้ไขพร้อมกัน กรุณาลองใหม่', messages.ERROR)
+            return
+        if updated:
+            modeladmin.message_user(request, f'เปลี่ยน {len(updated)} ออร์เดอร์เป็น "{STATUS_LABELS[target]}"')
+        for pk, (_, message) in sorted(errors.items()):
+            modeladmin.message_user(request, f'ออร์เดอร์ {pk}: {message}', messages.WARNING)
+
+    action.__name__ = f'mark_{target}'
+    action.short_description = f'เปลี่ยนสถานะเป็น "{STATUS_LABELS[target]}"'
+    return action
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'customer_name', 'total_amount', 'status', 'created_at']
     list_filter = ['status', 'payment_method', 'created_at']
     search_fields = ['customer_name', 'customer_phone']
-    list_editable = ['status']
-    inlines = [OrderItemInline]
\ No newline at end of file
+    # สถานะเปลี่ยนผ่าน action เท่านั้น save() ไม่ตรวจลำดับสถานะและไม่คืน stock
+    readonly_fields = ['status']
+    actions = [status_action(target) for target in ('confirmed', 'shipped', 'delivered', 'cancelled')]
+    inlines = [OrderItemInline]
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """ดูได้อย่างเดียว ออร์เดอร์ที่ archive_orders ย้ายออกจากตารางหลัก"""
+    list_display = ['id', 'order_number', 'customer_name', 'total_amount', 'status', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['order_number', 'customer_email']
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OtopAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'otop_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
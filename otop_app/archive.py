@@ -0,0 +1,101 @@
+"""
+แยกออร์เดอร์ร้อน / เย็น: ย้ายออร์เดอร์ที่ปิดแล้ว (ส่งถึงแล้ว / ยกเลิก) และเก่ากว่า ORDER_ARCHIVE_AFTER_DAYS
+ไปตาราง ArchivedOrder / ArchivedOrderItem / ArchivedOrderSeller (id เดิม)
+
+ตาราง Order / OrderItem / OrderSeller ที่ทุก checkout เขียนและทุกหน้ารายการอ่านจึงเหลือแค่ช่วงล่าสุด
+(index ทั้งหมดอยู่ใน memory ได้) ส่วน archive ถูกอ่านเฉพาะเมื่อ request ขอช่วงเวลาที่ย้อนไปถึง
+
+- manage.py archive_orders ย้ายทีละ batch: SELECT ... FOR UPDATE -> INSERT 3 ตาราง -> DELETE ใน transaction เดียว
+- reaches_archive(filters): ?created_from / ?created_to ที่ครอบคลุมช่วงก่อน archive_boundary() เท่านั้น
+  ถึงจะ UNION ALL กับ archive (order_rows) ไม่ส่งช่วงเวลา = อ่านเฉพาะตารางหลักเหมือนเดิม
+- ตอนย้ายใช้ cutoff ไม่ใหม่กว่า archive_boundary() เสมอ ออร์เดอร์ใน archive จึงสร้างก่อนขอบนี้ทั้งหมด
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from .exports import apply_export_filters
+from .fastpath import ORDER_VALUES
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedOrderSeller, Order, OrderItem, OrderSeller
+
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+ARCHIVE_BATCH_SIZE = 500
+
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+
+
+def archive_boundary():
+    """ออร์เดอร์ที่สร้างก่อนเวลานี้อาจอยู่ใน archive"""
+    return timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """ย้ายออร์เดอร์ที่ปิดแล้วและสร้างก่อน before หนึ่ง batch คืนจำนวนที่ย้าย"""
+    with transaction.atomic():
+        orders = Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=before).order_by('pk')
+        if connection.features.has_select_for_update:
+            orders = orders.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+        rows = list(orders.values(*ORDER_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(archived_at=now, **row) for row in rows])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                id=pk, order_id=order_id, product_id=product_id, product_name=name, quantity=quantity, price=price,
+            )
+            for pk, order_id, product_id, name, quantity, price in OrderItem.objects.filter(order_id__in=ids)
+            .values_list('id', 'order_id', 'product_id', 'product__name', 'quantity', 'price')
+        ])
+        ArchivedOrderSeller.objects.bulk_create([
+            ArchivedOrderSeller(order_id=order_id, seller_id=seller_id, created_at=created_at, status=status)
+            for order_id, seller_id, created_at, status in OrderSeller.objects.filter(order_id__in=ids)
+            .values_list('order_id', 'seller_id', 'created_at', 'status')
+        ])
+        # OrderItem / OrderSeller ถูกลบตาม (CASCADE)
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """ย้ายทีละ batch จนหมด yield จำนวนที่ย้ายของแต่ละ batch (before ใหม่กว่า archive_boundary() ไม่ได้)"""
+    boundary = archive_boundary()
+    before = min(before or boundary, boundary)
+    while True:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            return
+        yield moved
+
+
+def reaches_archive(filters):
+    """ช่วงเวลาที่ขอ (จาก exports.parse_export_filters) ย้อนไปก่อนขอบของ archive หรือไม่"""
+    if 'created_from' not in filters and 'created_before' not in filters:
+        return False
+    return filters.get('created_from') is None or filters['created_from'] < archive_boundary()
+
+
+def order_rows(hot, archived):
+    """
+    UNION ALL ของ .values() จากตารางหลักและ archive เรียงใหม่สุดก่อน
+    แต่ละแถวมี archived (True = มาจาก archive) ให้ fastpath.serialize_orders โหลดรายการจากตารางที่ถูก
+    """
+    hot = hot.order_by().values(*ORDER_VALUES, archived=Value(False))
+    archived = archived.order_by().values(*ORDER_VALUES, archived=Value(True))
+    return hot.union(archived, all=True).order_by('-created_at', '-id')
+
+
+def ranged_order_rows(hot, archived, filters, created_field='created_at', status_field='status'):
+    """
+    .values() ของออร์เดอร์ตามช่วงเวลา / สถานะ รวม archive เฉพาะเมื่อช่วงย้อนไปถึง
+    ทั้งสองตารางกรองด้วยชื่อ field เดียวกัน (ผู้ขายใช้ annotation link_created_at / link_status ทั้งคู่)
+    """
+    hot = apply_export_filters(hot, filters, created_field, status_field)
+    if not reaches_archive(filters):
+        return hot.values(*ORDER_VALUES)
+    return order_rows(hot, apply_export_filters(archived, filters, created_field, status_field))
@@ -0,0 +1,53 @@
+"""
+Cache ของ payload สินค้าที่ serialize แล้ว (หนึ่ง key ต่อสินค้า)
+
+เก็บ payload แบบไม่ผูกกับ request (image เป็น path) แล้วค่อยเติม absolute URL
+ตอนส่งออก signal ใน otop_app/signals.py ลบ key เมื่อ Product, Category หรือ Seller เปลี่ยน
+โค้ดที่อัปเดตสินค้าด้วย queryset.update() ต้องเรียก invalidate_products() เอง
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+PRODUCT_PAYLOAD_KEY = 'product:payload:{}'
+
+# cache ที่ไม่แชร์ข้าม process: invalidation จาก worker / management command ไปไม่ถึง web
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def check_cache():
+    """เรียกตอนเริ่ม WSGI/ASGI process: payload มี stock และราคา ห้ามค้างต่อ process นอก DEBUG"""
+    if not settings.DEBUG and settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            'CACHES ใช้ LocMemCache ซึ่งแยกกันต่อ process: payload สินค้า (stock, ราคา) จะค้างได้ถึง '
+            'PRODUCT_PAYLOAD_CACHE_TIMEOUT หลังถูกแก้จาก process อื่น ตั้ง REDIS_URL'
+        )
+
+
+def product_payload_key(pk):
+    return PRODUCT_PAYLOAD_KEY.format(pk)
+
+
+def get_product_payloads(pks):
+    """ดึง payload หลายตัวด้วย get_many ครั้งเดียว คืน dict {pk: payload}"""
+    keys = {product_payload_key(pk): pk for pk in pks}
+    if not keys:
+        return {}
+    return {keys[key]: payload for key, payload in cache.get_many(list(keys)).items()}
+
+
+def set_product_payloads(payloads):
+    if payloads:
+        cache.set_many(
+            {product_payload_key(pk): payload for pk, payload in payloads.items()},
+            timeout=settings.PRODUCT_PAYLOAD_CACHE_TIMEOUT,
+        )
+
+
+def invalidate_products(pks):
+    keys = [product_payload_key(pk) for pk in pks]
+    if keys:
+        cache.delete_many(keys)
+        # ลบซ้ำหลัง commit กัน request อื่นที่อ่านค่าเก่าระหว่าง transaction แล้วใส่กลับเข้า cache
+        transaction.on_commit(lambda: cache.delete_many(keys))
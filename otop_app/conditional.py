@@ -0,0 +1,47 @@
+"""
+Conditional GET (ETag / Last-Modified) สำหรับ endpoint ของ catalog
+
+validator คำนวณจาก query ถูก ๆ (MAX(updated_at), COUNT) รวมกับ path + query string
+ถ้า client ส่ง If-None-Match / If-Modified-Since ที่ตรงกัน จะตอบ 304 ทันที
+โดยไม่ต้องดึงข้อมูลหรือรัน serializer
+
+endpoint แบบ list ส่งแค่ ETag เพราะการลบแถวไม่ทำให้ MAX(updated_at) เปลี่ยน
+Last-Modified อย่างเดียวจึงตอบ 304 ผิดได้ ส่วน ETag รวม COUNT ไว้ด้วย
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    view ที่ใช้ mixin นี้ต้อง implement get_validators() คืน (etag, last_modified)
+    หรือ None ถ้าคำนวณไม่ได้ (เช่น object ไม่มีอยู่ ให้ view ตอบ 404 ตามปกติ)
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        # HTTP date ละเอียดแค่วินาที จึงปัดทิ้งเหมือน django.views.decorators.http.condition
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,73 @@
+"""
+ผูกออร์เดอร์กับบัญชีลูกค้า (Order.customer)
+
+ประวัติออร์เดอร์ของลูกค้าอ่านด้วย customer_id ผ่าน index (customer, created_at)
+ไม่ใช้ customer_email (ข้อความอิสระ และเปลี่ยนได้เมื่อผู้ใช้แก้อีเมล)
+
+- ออร์เดอร์ใหม่: ผู้ใช้ที่ login แล้วเป็นเจ้าของออร์เดอร์ ส่วนแขก / การนำเข้า จับคู่ด้วยอีเมลตอนสร้าง
+- สมัครสมาชิก: link_guest_orders() ผูกออร์เดอร์แขกที่สั่งด้วยอีเมลนี้ก่อนมีบัญชี
+- ออร์เดอร์เดิม: manage.py backfill_order_customers ไล่ทีละช่วง primary key (รันครั้งเดียวหลัง deploy ที่เพิ่ม Order.customer)
+  แต่ละช่วงเป็น UPDATE เดียวใน transaction สั้น ๆ (lock แค่แถวในช่วงนั้น) หยุดแล้วรันต่อจาก id ที่พิมพ์ไว้ได้
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Subquery
+
+from .models import ArchivedOrder, Order
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def match_customers(emails):
+    """{อีเมล: user_id} ของอีเมลที่มีบัญชี (อีเมลซ้ำหลายบัญชีใช้บัญชีแรก) query เดียว"""
+    emails = {email for email in emails if email}
+    if not emails:
+        return {}
+    matched = {}
+    for email, pk in User.objects.filter(email__in=emails).order_by('-pk').values_list('email', 'pk'):
+        matched[email] = pk
+    return matched
+
+
+def order_customer_id(user, email):
+    """เจ้าของออร์เดอร์ใหม่: ผู้ใช้ที่ login อยู่ หรือบัญชีที่ใช้อีเมลเดียวกันถ้าสั่งแบบแขก"""
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return match_customers([email]).get(email)
+
+
+def link_guest_orders(user):
+    """ผูกออร์เดอร์แขก (รวม archive) ที่ใช้อีเมลของ user กับบัญชีนี้ UPDATE เดียวต่อตาราง คืนจำนวนที่ผูก"""
+    if not user.email:
+        return 0
+    return sum(
+        model.objects.filter(customer__isnull=True, customer_email=user.email).update(customer=user)
+        for model in (Order, ArchivedOrder)
+    )
+
+
+def accounts_by_email():
+    """บัญชีที่ใช้อีเมลเดียวกับ customer_email ของ Order (ใช้ใน subquery)"""
+    return User.objects.filter(email=OuterRef('customer_email'))
+
+
+def backfill_order_customers(start_id=1, batch_size=BACKFILL_BATCH_SIZE, end_id=None):
+    """
+    เติม customer ของออร์เดอร์เดิมที่ยังเป็น NULL ทีละช่วง id [lo, lo + batch_size)
+    yield (id สุดท้ายของช่วง, จำนวนแถวที่เติม) หลัง commit แต่ละช่วง
+    ออร์เดอร์ที่ไม่มีบัญชีตรงกันยังเป็น NULL (รันซ้ำได้ ไม่เขียนทับแถวที่มี customer แล้ว)
+    """
+    if end_id is None:
+        end_id = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+    lo = max(start_id, 1)
+    while lo <= end_id:
+        hi = min(lo + batch_size - 1, end_id)
+        with transaction.atomic():
+            updated = (
+                Order.objects.filter(pk__gte=lo, pk__lte=hi, customer__isnull=True)
+                .exclude(customer_email='')
+                .filter(Exists(accounts_by_email()))
+                .update(customer=Subquery(accounts_by_email().order_by('pk').values('pk')[:1]))
+            )
+        yield hi, updated
+        lo = hi + 1
@@ -0,0 +1,60 @@
+"""
+ตรวจ/ซ่อมชื่อหมวดหมู่และผู้ขายที่สำเนาไว้บน Product และสร้างตารางเชื่อมออร์เดอร์กับผู้ขาย (OrderSeller)
+
+รับ model class เป็น argument เพื่อให้ migration ใช้กับ historical model ได้
+การซ่อมเป็น UPDATE แบบ set-based ครั้งเดียวต่อ field
+"""
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+DENORMALIZED_FIELDS = (
+    # (field บน Product, relation, model ต้นทาง)
+    ('category_name', 'category', 'Category'),
+    ('seller_name', 'seller', 'Seller'),
+)
+
+
+def drifted_products(product_model, field, relation):
+    return product_model.objects.exclude(**{field: F(f'{relation}__name')})
+
+
+def repair_product_names(product_model, source_models, touch=True):
+    """คืน dict {field: จำนวนแถวที่ซ่อม}"""
+    repaired = {}
+    for field, relation, source in DENORMALIZED_FIELDS:
+        name = Subquery(source_models[source].objects.filter(pk=OuterRef(f'{relation}_id')).values('name')[:1])
+        values = {field: name}
+        if touch:
+            values['updated_at'] = timezone.now()
+        repaired[field] = drifted_products(product_model, field, relation).update(**values)
+    return repaired
+
+
+def link_order_sellers(order_seller_model, pairs):
+    """สร้าง OrderSeller จาก [(order, seller_id)] ด้วย INSERT เดียว (คู่ที่มีอยู่แล้วถูกข้าม)"""
+    return order_seller_model.objects.bulk_create(
+        [
+            order_seller_model(order_id=order.pk, seller_id=seller_id, created_at=order.created_at, status=order.status)
+            for order, seller_id in pairs
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_order_sellers(order_item_model, order_seller_model, batch_size=1000):
+    """สร้าง OrderSeller ของออร์เดอร์เดิมทั้งหมดจาก OrderItem คืนจำนวนคู่ (order, seller)"""
+    rows = (
+        order_item_model.objects
+        .values_list('order_id', 'product__seller_id', 'order__created_at', 'order__status')
+        .distinct().order_by('order_id')
+    )
+    total = 0
+    batch = []
+    for order_id, seller_id, created_at, status in rows.iterator(chunk_size=batch_size):
+        batch.append(order_seller_model(order_id=order_id, seller_id=seller_id, created_at=created_at, status=status))
+        if len(batch) >= batch_size:
+            order_seller_model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+            batch = []
+    order_seller_model.objects.bulk_create(batch, ignore_conflicts=True)
+    return total + len(batch)
@@ -0,0 +1,226 @@
+"""
+แจ้งเปลี่ยนสถานะออร์เดอร์แบบ push ให้ลูกค้าเจ้าของออร์เดอร์และผู้ขาย (Server-Sent Events)
+
+    change_order_status / Order.save()  ->  order_status_changed()  --on_commit-->  broker.publish()
+    GET /api/orders/events/ (ASGI)      ->  broker.subscribe(['customer:<user_id>', 'seller:<seller_id>'])
+
+broker เปลี่ยนได้ด้วย settings.ORDER_EVENTS_BACKEND (dotted path ของ class ที่มี publish / subscribe)
+- LocalBroker: pub/sub ใน process เดียว ใช้ได้เมื่อมี ASGI worker เดียว (หรือตอนพัฒนา)
+- RedisBroker: Redis PUBLISH / SUBSCRIBE ใช้ได้หลาย worker (ค่าเริ่มต้นเมื่อตั้ง REDIS_URL)
+Procfile แยก web (WSGI, ผู้ publish) กับ events (ASGI, ผู้ฟัง) เป็นคนละ process จึงต้องใช้ RedisBroker
+check_broker() ให้ process events ไม่ยอมเริ่มถ้าเป็น LocalBroker นอก DEBUG (otop_project/asgi.py)
+event ส่งหลัง commit เท่านั้น ถ้าผู้ฟังรับไม่ทัน (คิวเต็ม) event ตกหล่นได้
+client ควรดึงรายการออร์เดอร์ใหม่หนึ่งครั้งทุกครั้งที่ต่อ stream ใหม่ แล้วรอ event แทนการ poll
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import OrderSeller
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = 100
+
+
+def customer_channel(user_id):
+    return f'customer:{user_id}'
+
+
+def seller_channel(seller_id):
+    return f'seller:{seller_id}'
+
+
+class LocalBroker:
+    """pub/sub ใน process: publish จาก thread ใดก็ได้ ผู้ฟังแต่ละรายมี asyncio.Queue บน event loop ของตัวเอง"""
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channels, event):
+        with self.lock:
+            targets = {subscriber for channel in channels for subscriber in self.subscribers.get(channel, ())}
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self.deliver, queue, event)
+            except RuntimeError:
+                pass  # loop ปิดไปแล้ว (ผู้ฟังกำลังหลุด)
+
+    @staticmethod
+    def deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscriber)
+        try:
+            yield LocalSubscription(subscriber[1])
+        finally:
+            with self.lock:
+                for channel in channels:
+                    self.subscribers[channel].discard(subscriber)
+                    if not self.subscribers[channel]:
+                        del self.subscribers[channel]
+
+
+class LocalSubscription:
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def get(self, timeout):
+        """event ถัดไป หรือ None ถ้าไม่มีภายใน timeout วินาที"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        """
+        event ถัดไป หรือ None ถ้าไม่มีภายใน timeout วินาที
+        ให้ redis-py รอเองด้วย timeout ไม่ยกเลิกการอ่าน socket กลางคัน (connection ของ pubsub จะเสีย)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                return json.loads(message['data'])
+
+
+class RedisBroker:
+    """Redis PUBLISH / SUBSCRIBE (ต้องมี package redis และ settings.REDIS_URL)"""
+
+    def __init__(self, url=None):
+        import redis
+
+        self.url = url or settings.REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, channels, event):
+        data = json.dumps(event)
+        with self.client.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.publish(channel, data)
+            pipe.execute()
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*channels)
+        try:
+            yield RedisSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.ORDER_EVENTS_BACKEND)()
+
+
+def check_broker():
+    """เรียกตอนเริ่ม ASGI process: LocalBroker ส่ง event ข้าม process ไม่ได้ (web publish แต่ผู้ฟังอยู่ใน events)"""
+    if not settings.DEBUG and issubclass(import_string(settings.ORDER_EVENTS_BACKEND), LocalBroker):
+        raise ImproperlyConfigured(
+            'ORDER_EVENTS_BACKEND เป็น LocalBroker แต่ process events แยกจาก web: ตั้ง REDIS_URL '
+            '(หรือ ORDER_EVENTS_BACKEND=otop_app.events.RedisBroker)'
+        )
+
+
+def order_status_changed(orders):
+    """
+    แจ้งสถานะใหม่ของ orders [(order_id, order_number, status, customer_id)] หลัง transaction commit
+    หาผู้ขายของทุกออร์เดอร์ด้วย query เดียว (OrderSeller)
+    """
+    orders = list(orders)
+    if not orders:
+        return
+    sellers = defaultdict(list)
+    links = OrderSeller.objects.filter(order_id__in=[row[0] for row in orders]).values_list('order_id', 'seller_id')
+    for order_id, seller_id in links:
+        sellers[order_id].append(seller_id)
+
+    messages = []
+    for order_id, order_number, status, customer_id in orders:
+        channels = [seller_channel(seller_id) for seller_id in sellers[order_id]]
+        if customer_id is not None:
+            channels.append(customer_channel(customer_id))
+        messages.append((channels, {'id': order_id, 'order_number': order_number, 'status': status}))
+
+    def publish():
+        # งานเปลี่ยนสถานะ commit ไปแล้ว broker ล่ม (เช่น Redis) ต้องไม่ทำให้ request ตอบ 500
+        try:
+            broker = get_broker()
+            for channels, event in messages:
+                broker.publish(channels, event)
+        except Exception:
+            logger.exception('Failed to publish %d order status events', len(messages))
+
+    transaction.on_commit(publish)
+
+
+def user_channels(user):
+    """channel ที่ผู้ใช้ฟังได้: ออร์เดอร์ของตัวเอง และของร้าน (ถ้าเป็นผู้ขาย)"""
+    channels = [customer_channel(user.pk)]
+    if hasattr(user, 'seller'):
+        channels.append(seller_channel(user.seller.pk))
+    return channels
+
+
+def format_event(event):
+    return f'event: order.status\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'
+
+
+async def event_stream(channels, heartbeat=None, expires_at=None):
+    """
+    body ของ text/event-stream: event ตามที่ broker ส่งมา และ comment keepalive ทุก heartbeat วินาที
+    expires_at (epoch วินาที = exp ของ JWT): ส่ง event token.expired แล้วปิด stream
+    ผู้ใช้ที่ถูกปิดบัญชีจึงฟังต่อได้ไม่เกินอายุ access token ที่ใช้เปิด client ต่อใหม่ด้วย token ใหม่
+    """
+    heartbeat = heartbeat or settings.ORDER_EVENTS_HEARTBEAT
+    async with get_broker().subscribe(channels) as subscription:
+        # retry = ระยะรอก่อน EventSource ต่อใหม่ (ms) และส่ง byte แรกให้ proxy เปิด stream ทันที
+        yield 'retry: 5000\n\n'
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield 'event: token.expired\ndata: {}\n\n'
+                    return
+                timeout = min(timeout, remaining)
+            event = await subscription.get(timeout)
+            if event is None:
+                if expires_at is None or time.time() < expires_at:
+                    yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
@@ -0,0 +1,156 @@
+"""
+ส่งออกออร์เดอร์ / สินค้าเป็น CSV หรือ NDJSON แบบ stream (หน่วยความจำคงที่ไม่ขึ้นกับจำนวนแถว)
+
+อ่านด้วย .values().iterator(chunk_size) (server-side cursor บน PostgreSQL) ทีละ chunk
+รายการสินค้าของออร์เดอร์ทั้ง chunk ดึงด้วย query เดียว แล้วสร้าง record ด้วย fast path (fastpath.py)
+จึงได้ field หน้าตาเดียวกับ API list (NDJSON หนึ่งบรรทัดต่อหนึ่ง record)
+CSV ของออร์เดอร์เป็นหนึ่งแถวต่อหนึ่งรายการสินค้า (ออร์เดอร์ที่ไม่มีรายการได้หนึ่งแถวที่คอลัมน์สินค้าว่าง)
+
+ใช้ทั้งใน GET /api/orders/export.csv (StreamingHttpResponse) และ manage.py export_data
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .fastpath import ORDER_VALUES, PRODUCT_VALUES, serialize_orders, serialize_products
+from .models import Order
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# ?status= ที่รับได้ -> ค่าในฐานข้อมูล
+ORDER_STATUSES = {value: value for value, _ in Order.STATUS_CHOICES}
+PRODUCT_STATUSES = {'active': True, 'inactive': False}
+
+ORDER_CSV_FIELDS = list(ORDER_VALUES)
+ORDER_ITEM_CSV_FIELDS = ['product', 'product_name', 'quantity', 'price']
+PRODUCT_CSV_FIELDS = [
+    'id', 'name', 'category_name', 'seller_name', 'description', 'price', 'image',
+    'stock', 'is_available', 'created_at', 'updated_at',
+]
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ExportFilterError(f'{name} ต้องเป็นวันที่รูปแบบ YYYY-MM-DD')
+    return day
+
+
+def parse_export_filters(params, statuses):
+    """
+    อ่าน created_from / created_to (YYYY-MM-DD รวมทั้งสองวัน ตามเวลาไทย) และ status
+    คืน dict สำหรับ apply_export_filters ค่าไม่ถูกต้อง raise ExportFilterError
+    """
+    filters = {}
+    tz = timezone.get_current_timezone()
+    start = parse_day(params.get('created_from'), 'created_from')
+    end = parse_day(params.get('created_to'), 'created_to')
+    if start and end and start > end:
+        raise ExportFilterError('created_from ต้องไม่หลัง created_to')
+    if start:
+        filters['created_from'] = datetime.combine(start, time.min, tzinfo=tz)
+    if end:
+        filters['created_before'] = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+    status = params.get('status')
+    if status:
+        if status not in statuses:
+            raise ExportFilterError(f'status ต้องเป็นหนึ่งใน {", ".join(statuses)}')
+        filters['status'] = statuses[status]
+    return filters
+
+
+def apply_export_filters(queryset, filters, created_field='created_at', status_field='status'):
+    """กรองด้วยช่วงเวลาแบบ >= / < บนคอลัมน์ตรง ๆ (ใช้ index ได้ ไม่ใช้ __date)"""
+    if 'created_from' in filters:
+        queryset = queryset.filter(**{f'{created_field}__gte': filters['created_from']})
+    if 'created_before' in filters:
+        queryset = queryset.filter(**{f'{created_field}__lt': filters['created_before']})
+    if 'status' in filters:
+        queryset = queryset.filter(**{status_field: filters['status']})
+    return queryset
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def order_records(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    dict ของออร์เดอร์พร้อม items ทีละ chunk (SELECT ออร์เดอร์ 1 ครั้ง + SELECT รายการ 1 ครั้งต่อ chunk)
+    rows = .values(*ORDER_VALUES) ของ Order หรือ UNION กับ archive (archive.ranged_order_rows)
+    """
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        yield from serialize_orders(chunk)
+
+
+def product_records(products, chunk_size=EXPORT_CHUNK_SIZE, request=None):
+    for chunk in chunked(products.values(*PRODUCT_VALUES).iterator(chunk_size=chunk_size), chunk_size):
+        yield from serialize_products(chunk, request)
+
+
+def order_csv_rows(order):
+    head = [order[name] for name in ORDER_CSV_FIELDS]
+    if not order['items']:
+        yield head + [''] * len(ORDER_ITEM_CSV_FIELDS)
+    for item in order['items']:
+        yield head + [item[name] for name in ORDER_ITEM_CSV_FIELDS]
+
+
+def product_csv_rows(product):
+    yield [product[name] for name in PRODUCT_CSV_FIELDS]
+
+
+class Echo:
+    """ไฟล์ปลอมให้ csv.writer คืนบรรทัดที่เขียนแทนการเก็บไว้"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records, header, rows_of):
+    writer = csv.writer(Echo())
+    # BOM ให้ Excel อ่านภาษาไทยเป็น UTF-8 (importer ตัดออกให้เองตอนนำเข้า)
+    yield '\ufeff' + writer.writerow(header)
+    for record in records:
+        for row in rows_of(record):
+            yield writer.writerow(row)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_orders(rows, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """บรรทัดของไฟล์ส่งออก (generator ยังไม่แตะฐานข้อมูลจนกว่าจะเริ่มอ่าน)"""
+    records = order_records(rows, chunk_size)
+    if fmt == 'csv':
+        return csv_lines(records, ORDER_CSV_FIELDS + ORDER_ITEM_CSV_FIELDS, order_csv_rows)
+    return ndjson_lines(records)
+
+
+def export_products(products, fmt, chunk_size=EXPORT_CHUNK_SIZE, request=None):
+    records = product_records(products, chunk_size, request)
+    if fmt == 'csv':
+        return csv_lines(records, PRODUCT_CSV_FIELDS, product_csv_rows)
+    return ndjson_lines(records)
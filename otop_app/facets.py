@@ -0,0 +1,84 @@
+"""
+Facet counts (หมวดหมู่ / ผู้ขาย / ช่วงราคา) ของผลการค้นหาสินค้า
+
+นับทั้งสามแบบด้วย GROUP BY ครั้งเดียวบน queryset ที่ผ่าน filter แล้ว
+แล้วแยกผลรวมใน Python ผลลัพธ์ cache ตาม query ที่ normalize แล้ว
+(ไม่สนใจ page / cursor / ordering เพราะไม่ทำให้ count เปลี่ยน)
+"""
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+
+FACET_CACHE_KEY = 'product:facets:{}'
+
+# (key, ราคาต่ำสุด, ราคาสูงสุดแบบไม่รวม)
+PRICE_BUCKETS = [
+    ('0-100', 0, 100),
+    ('100-500', 100, 500),
+    ('500-1000', 500, 1000),
+    ('1000+', 1000, None),
+]
+
+IGNORED_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'facets'}
+
+
+def facet_cache_key(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in IGNORED_PARAMS
+        for value in values
+    )
+    digest = hashlib.sha1(repr((request.path, params)).encode('utf-8')).hexdigest()
+    return FACET_CACHE_KEY.format(digest)
+
+
+def price_bucket_expression():
+    whens = [When(price__lt=upper, then=Value(key)) for key, _, upper in PRICE_BUCKETS if upper is not None]
+    return Case(*whens, default=Value(PRICE_BUCKETS[-1][0]), output_field=CharField())
+
+
+def compute_facets(queryset):
+    # ใช้ pk__in เพราะ queryset ของการค้นหามี GROUP BY/HAVING อยู่แล้ว
+    rows = (
+        queryset.model.objects
+        .filter(pk__in=queryset.order_by().values('pk'))
+        .annotate(price_bucket=price_bucket_expression())
+        .values('category_id', 'category_name', 'seller_id', 'seller_name', 'price_bucket')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    categories = {}
+    sellers = {}
+    prices = defaultdict(int)
+    for row in rows:
+        category = categories.setdefault(row['category_id'], {'id': row['category_id'], 'name': row['category_name'], 'count': 0})
+        category['count'] += row['count']
+        seller = sellers.setdefault(row['seller_id'], {'id': row['seller_id'], 'name': row['seller_name'], 'count': 0})
+        seller['count'] += row['count']
+        prices[row['price_bucket']] += row['count']
+
+    def by_count(items):
+        return sorted(items, key=lambda item: (-item['count'], item['id']))
+
+    return {
+        'category': by_count(categories.values()),
+        'seller': by_count(sellers.values()),
+        'price': [
+            {'key': key, 'min': lower, 'max': upper, 'count': prices[key]}
+            for key, lower, upper in PRICE_BUCKETS
+            if prices[key]
+        ],
+    }
+
+
+def get_facets(queryset, request):
+    key = facet_cache_key(request)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, timeout=settings.FACET_CACHE_TIMEOUT)
+    return facets
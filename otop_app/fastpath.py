@@ -0,0 +1,113 @@
+"""
+Fast path สำหรับ list endpoint ที่มีปริมาณสูง
+
+สร้าง output หน้าตาเดียวกับ ProductSerializer / OrderSerializer ทุก byte
+แต่ทำจาก row ของ .values() โดยตรง ไม่สร้าง model instance และไม่ผ่าน field ของ DRF
+เปิดใช้ด้วย settings.FAST_LIST_SERIALIZERS (วัดผลด้วย manage.py benchmark_serializers)
+"""
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, OrderItem, Product
+
+PRODUCT_VALUES = (
+    'id', 'category_name', 'seller_name', 'name', 'description', 'price', 'image',
+    'stock', 'is_active', 'created_at', 'updated_at',
+)
+
+ORDER_VALUES = (
+    'id', 'order_number', 'customer_name', 'customer_phone', 'customer_email', 'total_amount',
+    'shipping_address', 'payment_method', 'status', 'created_at',
+)
+
+ORDER_ITEM_VALUES = ('order_id', 'product_id', 'product__name', 'quantity', 'price')
+
+CENT = Decimal('0.01')
+
+
+def format_decimal(value):
+    # เหมือน DecimalField(decimal_places=2, coerce_to_string=True) ของ DRF
+    return '{:f}'.format(value.quantize(CENT))
+
+
+def format_datetime(value, tz):
+    # เหมือน DateTimeField ของ DRF: แปลงเป็น timezone ปัจจุบัน แล้วใช้ ISO 8601
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def serialize_products(rows, request=None):
+    tz = timezone.get_current_timezone()
+    storage = Product._meta.get_field('image').storage
+    result = []
+    for row in rows:
+        image = row['image']
+        if image:
+            image = storage.url(image)
+            if request:
+                image = request.build_absolute_uri(image)
+            else:
+                image = f"http://127.0.0.1:8000{image}"
+        else:
+            image = None
+        result.append({
+            'id': row['id'],
+            'category_name': row['category_name'],
+            'seller_name': row['seller_name'],
+            'name': row['name'],
+            'description': row['description'],
+            'price': format_decimal(row['price']),
+            'image': image,
+            'stock': row['stock'],
+            'created_at': format_datetime(row['created_at'], tz),
+            'updated_at': format_datetime(row['updated_at'], tz),
+            'category': row['category_name'],
+            'seller': row['seller_name'],
+            'is_available': row['is_active'],
+        })
+    return result
+
+
+def order_items(rows):
+    """รายการสินค้าของทุกแถว: ตารางหลักหนึ่ง query และ archive อีกหนึ่ง query ถ้ามีแถวจาก archive (archive.py)"""
+    hot = [row['id'] for row in rows if not row.get('archived')]
+    archived = [row['id'] for row in rows if row.get('archived')]
+    if hot:
+        yield from OrderItem.objects.filter(order_id__in=hot).order_by('id').values_list(*ORDER_ITEM_VALUES)
+    if archived:
+        yield from ArchivedOrderItem.objects.filter(order_id__in=archived).order_by('id').values_list(
+            'order_id', 'product_id', 'product_name', 'quantity', 'price',
+        )
+
+
+def serialize_orders(rows):
+    rows = list(rows)
+    items_by_order = {row['id']: [] for row in rows}
+    for order_id, product_id, product_name, quantity, price in order_items(rows):
+        items_by_order[order_id].append({
+            'product': product_id,
+            'product_name': product_name,
+            'quantity': quantity,
+            'price': format_decimal(price),
+        })
+
+    tz = timezone.get_current_timezone()
+    return [
+        {
+            'id': row['id'],
+            'order_number': row['order_number'],
+            'customer_name': row['customer_name'],
+            'customer_phone': row['customer_phone'],
+            'customer_email': row['customer_email'],
+            'total_amount': format_decimal(row['total_amount']),
+            'shipping_address': row['shipping_address'],
+            'payment_method': row['payment_method'],
+            'status': row['status'],
+            'created_at': format_datetime(row['created_at'], tz),
+            'items': items_by_order[row['id']],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,150 @@
+"""
+Idempotency-Key สำหรับ endpoint ที่สร้างข้อมูล (เช่น POST /api/orders/create/)
+
+client ส่ง header Idempotency-Key (เช่น UUID ต่อหนึ่งการกดสั่งซื้อ) แล้ว retry ได้อย่างปลอดภัย
+- request แรกจอง key (สถานะ processing) แล้วรัน view ตามปกติ
+- request ซ้ำที่มาหลังเสร็จแล้ว ได้คำตอบเดิมกลับไป (header Idempotent-Replayed: true)
+  โดยไม่รัน transaction ซ้ำ
+- request ซ้ำที่มาระหว่างที่ request แรกยังทำงาน ได้ 409 พร้อม Retry-After ทันที (ไม่ถือ worker ไว้รอ)
+- key เดิมแต่ข้อมูลต่างกัน ตอบ 422
+- key แยกตามผู้ใช้ที่ login (แขกทุกคนใช้ชุดเดียวกัน ต่างกันที่ fingerprint)
+- view บันทึกคำตอบด้วย store_response() ใน transaction เดียวกับออร์เดอร์ (ไม่มีช่วงที่ออร์เดอร์ commit แล้วแต่ key ยังว่าง)
+คำตอบ 5xx ไม่ถูกเก็บ (ลบ key ทิ้ง) เพื่อให้ retry รันใหม่ได้
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    user = request.user.pk if request.user.is_authenticated else None
+    raw = json.dumps([request.method, request.path, user, data], sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def acquire_key(key, user, fingerprint):
+    """จอง key ของ user (None = แขก) คืน (record, True) ถ้าจองได้ หรือ (IdempotencyKey ที่มีอยู่แล้ว, False)"""
+    while True:
+        expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(key=key, user=user, fingerprint=fingerprint, expires_at=expires_at)
+            return record, True
+        except IntegrityError:
+            pass
+        existing = IdempotencyKey.objects.filter(key=key, user=user).first()
+        if existing is None:
+            continue
+        if existing.expires_at <= timezone.now():
+            # คำตอบหมดอายุ หรือ request แรกค้าง/ตายไป ลบแล้วจองใหม่
+            IdempotencyKey.objects.filter(pk=existing.pk, expires_at=existing.expires_at).delete()
+            continue
+        return existing, False
+
+
+class IdempotencyLeaseLost(Exception):
+    """lease ของ key หมดแล้วและ request ซ้ำจองไปใหม่ระหว่างที่ request นี้ยังทำงาน"""
+
+
+def replay(record):
+    return Response(record.response_body, status=record.response_status, headers={REPLAYED_HEADER: 'true'})
+
+
+def store_response(request, response):
+    """
+    บันทึกคำตอบให้ key ของ request นี้ (ไม่มี key = ไม่ทำอะไร) คืน response เดิม
+    view ที่สร้างข้อมูลต้องเรียกภายใน transaction.atomic() เดียวกับที่สร้าง: commit พร้อมกันหรือไม่ commit เลย
+    ถ้า process ตายก่อน commit ทั้งออร์เดอร์และคำตอบหายไปด้วยกัน retry หลัง lease หมดจึงสร้างใหม่ได้ครั้งเดียว
+
+    UPDATE ผูกกับ lease เดิม (pk + expires_at ตอนจอง) ถ้าทำงานนานเกิน IDEMPOTENCY_LOCK_TIMEOUT
+    จน request ซ้ำจอง key ไปแล้ว จะ raise IdempotencyLeaseLost ให้ transaction ของออร์เดอร์นี้ rollback
+    (request ที่ถือ lease ใหม่เป็นผู้สร้างออร์เดอร์แทน ไม่เกิดออร์เดอร์ซ้ำ)
+    """
+    record = getattr(request, 'idempotency_record', None)
+    if record is None or response.status_code >= 500:
+        return response
+    updated = IdempotencyKey.objects.filter(pk=record.pk, status='processing', expires_at=record.expires_at).update(
+        status='completed',
+        response_status=response.status_code,
+        response_body=response.data,
+        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    )
+    if updated != 1:
+        raise IdempotencyLeaseLost(f'{IDEMPOTENCY_HEADER} lease expired before the response was stored')
+    request.idempotency_stored = True
+    return response
+
+
+def idempotent(view_func):
+    """
+    decorator สำหรับ function view ของ DRF (วางใต้ @api_view / @permission_classes)
+    key แยกตามผู้ใช้ (แขกใช้ชุดเดียวกัน) คำตอบที่ view ไม่ได้ store_response เอง (เช่น 400) ถูกบันทึกหลัง view จบ
+    """
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view_func(request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response({
+                'success': False,
+                'message': f'{IDEMPOTENCY_HEADER} ต้องยาว 1-255 ตัวอักษร'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else None
+        fingerprint = request_fingerprint(request)
+        record, acquired = acquire_key(key, user, fingerprint)
+        if not acquired:
+            if record.fingerprint != fingerprint:
+                return Response({
+                    'success': False,
+                    'message': f'{IDEMPOTENCY_HEADER} นี้ถูกใช้กับข้อมูลอื่นแล้ว'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status == 'completed':
+                return replay(record)
+            return Response({
+                'success': False,
+                'message': 'คำขอเดิมยังประมวลผลอยู่ กรุณาลองใหม่อีกครั้ง'
+            }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': str(settings.IDEMPOTENCY_RETRY_AFTER)})
+
+        request.idempotency_record = record
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+
+        if response.status_code >= 500:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        elif not getattr(request, 'idempotency_stored', False):
+            try:
+                store_response(request, response)
+            except IdempotencyLeaseLost:
+                # view ไม่ได้ใช้ transaction เดียวกับ key ทำได้แค่ปล่อยให้ lease ใหม่เป็นเจ้าของ
+                pass
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """ลบ key ที่หมดอายุ คืนจำนวนที่ลบ"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,243 @@
+"""
+นำเข้าออร์เดอร์จำนวนมาก (sync จาก marketplace อื่น) แบบ stream
+
+รับได้สองรูปแบบ อ่านทีละบรรทัด หน่วยความจำจึงไม่ขึ้นกับขนาดไฟล์:
+- NDJSON: หนึ่งบรรทัดต่อหนึ่งออร์เดอร์ รูปแบบเดียวกับ body ของ POST /api/orders/create/
+- CSV: หนึ่งแถวต่อหนึ่งรายการสินค้า คอลัมน์ตาม CSV_ORDER_FIELDS + CSV_ITEM_FIELDS
+  แถวที่ติดกันและมี order_ref เดียวกันรวมเป็นออร์เดอร์เดียว
+
+ตรวจแต่ละออร์เดอร์ด้วย CreateOrderSerializer แล้วเขียนทีละ chunk ใน transaction เดียว:
+จับคู่บัญชีลูกค้าด้วยอีเมล (query เดียว), bulk_create Order, bulk_create OrderItem, OrderSeller,
+ตัด stock ด้วย UPDATE เดียว, บันทึก movement รายออร์เดอร์ และเพิ่มงาน order.created
+ออร์เดอร์ที่ไม่ผ่าน (ข้อมูลผิด / ไม่พบสินค้า / stock ไม่พอ) ถูกข้ามและรายงานเป็นรายแถว
+
+POST /api/orders/import/ ไม่นำเข้าใน request: เก็บไฟล์ลง ORDER_IMPORT_STORAGE แล้วเพิ่มงาน orders.import
+worker รัน run_import_job() เขียนข้อผิดพลาดทั้งหมดลงไฟล์รายงาน และเก็บแค่ส่วนต้นไว้ใน Job.result
+"""
+import codecs
+import csv
+import json
+import shutil
+import tempfile
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .customers import match_customers
+from .denormalize import link_order_sellers
+from .inventory import InsufficientStock, available_stock, lock_products, merge_quantities, reserve_stock
+from .jobs import enqueue_many
+from .ledger import record_movements
+from .models import Order, OrderItem, OrderSeller, Product
+from .order_numbers import allocate_order_numbers
+from .serializers import CreateOrderSerializer
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_RETRIES = 3
+
+CSV_ORDER_FIELDS = ['customer_name', 'customer_phone', 'customer_email', 'shipping_address', 'payment_method']
+CSV_ITEM_FIELDS = ['product_id', 'quantity', 'price']
+
+
+def decode_lines(lines):
+    """bytes ทีละบรรทัด -> str (ตัด BOM ของไฟล์จาก Excel)"""
+    return codecs.iterdecode(lines, 'utf-8-sig')
+
+
+def read_ndjson(lines):
+    """yield (เลขบรรทัด, dict หรือ None, error)"""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'non_field_errors': [f'JSON ไม่ถูกต้อง: {e}']}
+            continue
+        if not isinstance(data, dict):
+            yield number, None, {'non_field_errors': ['แต่ละบรรทัดต้องเป็น JSON object']}
+            continue
+        yield number, data, None
+
+
+def read_csv(lines):
+    """yield (เลขบรรทัดแรกของออร์เดอร์, dict, None) รวมแถวที่มี order_ref เดียวกัน"""
+    reader = csv.DictReader(lines)
+    current = None
+    for row in reader:
+        ref = row.get('order_ref') or None
+        item = {field: row.get(field) for field in CSV_ITEM_FIELDS}
+        if current and ref is not None and current[1]['order_ref'] == ref:
+            current[1]['items'].append(item)
+            continue
+        if current:
+            yield current
+        order = {field: row[field] for field in CSV_ORDER_FIELDS if row.get(field)}
+        current = (reader.line_num, {**order, 'order_ref': ref, 'items': [item]}, None)
+    if current:
+        yield current
+
+
+def read_orders(lines, fmt):
+    lines = decode_lines(lines)
+    return read_csv(lines) if fmt == 'csv' else read_ndjson(lines)
+
+
+class OrderImporter:
+    """
+    นำเข้าออร์เดอร์จาก iterable ของ (row, data, error)
+    on_error(row, errors) ถูกเรียกต่อแถวที่ไม่ผ่าน ถ้าไม่ส่งมาจะเก็บไว้ใน self.errors
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, on_error=None):
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.errors = []
+        self.created = 0
+        self.failed = 0
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return self
+            self.import_chunk(chunk)
+
+    def report_error(self, row, errors):
+        self.failed += 1
+        if self.on_error:
+            self.on_error(row, errors)
+        else:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def import_chunk(self, chunk):
+        valid = []
+        for row, data, error in chunk:
+            if error:
+                self.report_error(row, error)
+                continue
+            serializer = CreateOrderSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((row, serializer.validated_data))
+            else:
+                self.report_error(row, serializer.errors)
+
+        # จองเลขออร์เดอร์นอก transaction เลขของแถวที่ถูกปฏิเสธจะถูกข้ามไป
+        numbers = allocate_order_numbers(len(valid)) if valid else []
+        for attempt in range(IMPORT_RETRIES):
+            try:
+                with transaction.atomic():
+                    created, rejected = self.write_chunk(valid, numbers)
+                break
+            except InsufficientStock:
+                # stock เปลี่ยนระหว่างอ่านกับตัด (SQLite ไม่มี row lock) อ่านใหม่ทั้ง chunk
+                if attempt == IMPORT_RETRIES - 1:
+                    raise
+        self.created += created
+        for row, errors in rejected:
+            self.report_error(row, errors)
+
+    def write_chunk(self, valid, numbers):
+        """เขียนออร์เดอร์ที่ stock พอ คืน (จำนวนที่สร้าง, [(row, errors)] ที่ถูกปฏิเสธ)"""
+        product_ids = {item['product_id'] for _, data in valid for item in data['items']}
+        lock_products(product_ids)
+        products = available_stock(product_ids)
+        remaining = {pk: available for pk, (_, available) in products.items()}
+
+        accepted = []
+        rejected = []
+        for (row, data), number in zip(valid, numbers):
+            quantities = merge_quantities((item['product_id'], item['quantity']) for item in data['items'])
+            problems = [f'ไม่พบสินค้า id {pk}' for pk in quantities if pk not in products]
+            problems += [
+                f'สินค้า "{products[pk][0]}" มีไม่เพียงพอ (เหลือ {remaining[pk]} ชิ้น)'
+                for pk, quantity in quantities.items()
+                if pk in products and remaining[pk] < quantity
+            ]
+            if problems:
+                rejected.append((row, {'items': problems}))
+                continue
+            for pk, quantity in quantities.items():
+                remaining[pk] -= quantity
+            accepted.append({**data, 'order_number': number})
+
+        if not accepted:
+            return 0, rejected
+
+        reserve_stock(merge_quantities(
+            (item['product_id'], item['quantity']) for data in accepted for item in data['items']
+        ), ledger=False)
+        customers = match_customers(data.get('customer_email') for data in accepted)
+        orders = Order.objects.bulk_create([
+            Order(
+                total_amount=sum(item['price'] * item['quantity'] for item in data['items']),
+                customer_id=customers.get(data.get('customer_email')),
+                **{field: value for field, value in data.items() if field not in ('items', 'hold_token')},
+            )
+            for data in accepted
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=item['product_id'], quantity=item['quantity'], price=item['price'])
+            for order, data in zip(orders, accepted)
+            for item in data['items']
+        ])
+        sellers = dict(Product.objects.filter(pk__in=list(product_ids)).values_list('pk', 'seller_id'))
+        link_order_sellers(OrderSeller, [
+            (order, seller_id)
+            for order, data in zip(orders, accepted)
+            for seller_id in sorted({sellers[item['product_id']] for item in data['items']})
+        ])
+        record_movements('sale', [
+            (pk, -quantity, data['order_number'])
+            for data in accepted
+            for pk, quantity in merge_quantities((item['product_id'], item['quantity']) for item in data['items']).items()
+        ])
+        enqueue_many('order.created', [{'order_id': order.pk} for order in orders])
+        return len(orders), rejected
+
+
+def import_storage():
+    return import_string(settings.ORDER_IMPORT_STORAGE)()
+
+
+def save_import_upload(stream, fmt):
+    """คัดลอก body ที่อัปโหลดลง storage ทีละ block (ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ) คืนชื่อไฟล์"""
+    with tempfile.TemporaryFile() as upload:
+        shutil.copyfileobj(stream, upload)
+        upload.seek(0)
+        return import_storage().save(f'imports/{uuid.uuid4().hex}.{fmt}', File(upload))
+
+
+def run_import_job(payload):
+    """
+    handler ของงาน orders.import: นำเข้าไฟล์ payload['path'] แล้วลบไฟล์ทิ้ง
+    ข้อผิดพลาดรายแถวเขียนเป็น NDJSON ลงไฟล์รายงานใน storage เดียวกัน
+    result เก็บแค่ ORDER_IMPORT_ERROR_SAMPLE แถวแรก ขนาดจึงไม่โตตามไฟล์
+    """
+    storage = import_storage()
+    sample = []
+    with tempfile.TemporaryFile() as report:
+        def write_error(row, errors):
+            line = {'row': row, 'errors': errors}
+            if len(sample) < settings.ORDER_IMPORT_ERROR_SAMPLE:
+                sample.append(line)
+            report.write((json.dumps(line, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+
+        importer = OrderImporter(chunk_size=payload['chunk_size'], on_error=write_error)
+        try:
+            with storage.open(payload['path'], 'rb') as source:
+                importer.run(read_orders(source, payload['format']))
+        finally:
+            storage.delete(payload['path'])
+
+        report_name = ''
+        if importer.failed:
+            report.seek(0)
+            report_name = storage.save(f"{payload['path'].rsplit('.', 1)[0]}-errors.ndjson", File(report))
+    return {'created': importer.created, 'failed': importer.failed, 'errors': sample, 'report': report_name}
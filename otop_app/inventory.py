@@ -0,0 +1,194 @@
+"""
+ตัด stock แบบ atomic สำหรับการสั่งซื้อ
+
+ทุกรายการในออร์เดอร์ถูกตัดด้วย UPDATE คำสั่งเดียว
+    UPDATE product SET stock = stock - CASE id WHEN .. THEN q END
+    WHERE id IN (..) AND stock >= CASE id WHEN .. THEN q END
+ถ้าจำนวนแถวที่อัปเดตไม่ครบ แปลว่ามีสินค้าไม่พอ (หรือไม่มีสินค้านั้น)
+ทั้ง statement จะถูก rollback แล้ว raise InsufficientStock
+ไม่มีการอ่าน stock มาเช็คใน Python ก่อน จึงขายเกินไม่ได้แม้มีหลาย request พร้อมกัน
+
+Stock hold: ลูกค้ากันสินค้าในตะกร้าไว้ชั่วคราว (StockHold มีวันหมดอายุ)
+stock ที่ซื้อได้ = stock - ผลรวม hold ที่ยังไม่หมดอายุ (subquery บน index (product, expires_at))
+เงื่อนไขของ UPDATE ด้านบนจึงรวม hold ของคนอื่นด้วย ส่วนตอน checkout
+รายการที่ hold ไว้ครบจะถูกตัดโดยเช็คแค่ stock >= จำนวน (ไม่นับ hold ของคนอื่น)
+เพราะผู้ขายยังแก้ stock ให้ต่ำกว่าที่ hold ไว้ได้
+hold ที่หมดอายุไม่ถูกนับอยู่แล้ว manage.py sweep_stock_holds แค่ลบทิ้งเป็นระยะ
+
+ทุกการเปลี่ยน stock ถูกบันทึกเป็น InventoryMovement ใน transaction เดียวกัน (ดู ledger.py)
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_products
+from .ledger import record_movements
+from .models import Product, StockHold
+
+
+class InsufficientStock(Exception):
+    """สินค้าบางรายการมี stock ไม่พอ shortages = [(product_id, name, stock)] (ไม่พบสินค้า name เป็น None)"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(self.message)
+
+    @property
+    def message(self):
+        pk, name, stock = self.shortages[0]
+        if name is None:
+            return f'ไม่พบสินค้า id {pk}'
+        return f'สินค้า "{name}" มีไม่เพียงพอ (เหลือ {stock} ชิ้น)'
+
+
+def merge_quantities(items):
+    """รวมจำนวนของสินค้าเดียวกัน [(product_id, quantity)] -> {product_id: quantity}"""
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def held_quantity(exclude_token=None, now=None):
+    """expression: จำนวนที่ถูก hold ไว้ (ยังไม่หมดอายุ) ของสินค้าในแถวปัจจุบัน ใช้ index (product, expires_at)"""
+    holds = StockHold.objects.filter(product=OuterRef('pk'), expires_at__gt=now or timezone.now())
+    if exclude_token:
+        holds = holds.exclude(token=exclude_token)
+    total = holds.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def available_stock(product_ids, exclude_token=None):
+    """{product_id: (name, stock - hold ที่ยังไม่หมดอายุ)} ของสินค้าที่มีอยู่"""
+    rows = Product.objects.filter(pk__in=list(product_ids)).annotate(
+        available=F('stock') - held_quantity(exclude_token),
+    ).values_list('pk', 'name', 'available')
+    return {pk: (name, available) for pk, name, available in rows}
+
+
+def lock_products(product_ids):
+    """ล็อกแถวสินค้าตามลำดับ id (ฐานข้อมูลที่มี row lock) กัน deadlock ระหว่างออร์เดอร์ที่มีสินค้าซ้ำกัน"""
+    if connection.features.has_select_for_update:
+        list(Product.objects.filter(pk__in=list(product_ids)).select_for_update().order_by('pk').values_list('pk', flat=True))
+
+
+def find_shortages(quantities, exclude_token=None):
+    available = available_stock(quantities, exclude_token)
+    return [
+        (pk, *available.get(pk, (None, None)))
+        for pk in sorted(quantities)
+        if pk not in available or available[pk][1] < quantities[pk]
+    ]
+
+
+def adjust_stock(quantities, sign=-1, guard=True, hold_token=None, reason='sale', reference='', ledger=True,
+                 count_holds=True):
+    """
+    บวก/ลบ stock ของหลายสินค้าด้วย UPDATE เดียว คืนจำนวนแถวที่อัปเดต
+    guard=True จะอัปเดตเฉพาะแถวที่ stock - hold ของคนอื่น >= จำนวนที่ขอ (count_holds=False: stock >= จำนวนที่ขอ)
+    ledger=True บันทึก movement (reason, reference) เมื่ออัปเดตครบทุกแถว
+    ถ้าอัปเดตไม่ครบผู้เรียกต้อง rollback เอง (ดู reserve_stock)
+    """
+    ids = sorted(quantities)
+    if not ids:
+        return 0
+    lock_products(ids)
+    queryset = Product.objects.filter(pk__in=ids)
+    amount = _quantity_case(quantities)
+    if guard:
+        queryset = queryset.filter(stock__gte=amount + held_quantity(hold_token) if count_holds else amount)
+    updated = queryset.update(stock=F('stock') + sign * amount, updated_at=timezone.now())
+    invalidate_products(ids)
+    if ledger and updated == len(ids):
+        record_movements(reason, [(pk, sign * quantities[pk], reference) for pk in ids])
+    return updated
+
+
+def convert_holds(token, quantities):
+    """
+    ลบ hold ของ token ที่ครอบคลุมจำนวนที่สั่งครบ คืน {product_id: quantity} ที่ตัด stock ได้เลย
+    (หน่วยเหล่านี้ถูกกันไว้ให้แล้ว จึงไม่ต้องเช็คกับ hold ของคนอื่น)
+    """
+    now = timezone.now()
+    holds = StockHold.objects.filter(token=token, product_id__in=list(quantities), expires_at__gt=now)
+    covered = {
+        pk: quantities[pk]
+        for pk, held in holds.values_list('product_id', 'quantity')
+        if held >= quantities[pk]
+    }
+    if not covered:
+        return {}
+    deleted, _ = holds.filter(product_id__in=list(covered)).delete()
+    # sweeper ลบ hold ไปก่อน (เพิ่งหมดอายุ) ให้กลับไปใช้เส้นทางปกติที่มีเงื่อนไข
+    return covered if deleted == len(covered) else {}
+
+
+def reserve_stock(quantities, hold_token=None, reference='', ledger=True):
+    """
+    ตัด stock {product_id: quantity} ทั้งหมดหรือไม่ตัดเลย (raise InsufficientStock)
+    hold_token: รายการที่ token นี้ hold ไว้ครบจะถูกตัดจาก hold โดยไม่แข่งกับ hold ของคนอื่น
+    reference: เลขออร์เดอร์ที่บันทึกใน movement (ledger=False ถ้าผู้เรียกบันทึกเองรายออร์เดอร์)
+    """
+    with transaction.atomic():
+        covered = convert_holds(hold_token, quantities) if hold_token else {}
+        rest = {pk: quantity for pk, quantity in quantities.items() if pk not in covered}
+        if (
+            adjust_stock(covered, count_holds=False, reference=reference, ledger=ledger) == len(covered)
+            and adjust_stock(rest, hold_token=hold_token, reference=reference, ledger=ledger) == len(rest)
+        ):
+            if hold_token:
+                StockHold.objects.filter(token=hold_token, product_id__in=list(rest)).delete()
+            return
+        transaction.set_rollback(True)
+
+    # อ่านหลัง rollback แล้ว จึงเห็น stock จริงก่อนถูกตัดบางส่วน
+    raise InsufficientStock(find_shortages(quantities, hold_token))
+
+
+def place_holds(token, quantities, user, ttl=None):
+    """
+    กันสินค้า {product_id: quantity} ให้ token ของ user (แทนที่ hold เดิมของสินค้าเดียวกัน)
+    ทั้งหมดหรือไม่กันเลย (raise InsufficientStock) คืนเวลาหมดอายุ
+    """
+    expires_at = timezone.now() + timedelta(seconds=ttl or settings.STOCK_HOLD_TTL)
+    with transaction.atomic():
+        lock_products(quantities)
+        StockHold.objects.filter(token=token, product_id__in=list(quantities)).delete()
+        StockHold.objects.bulk_create([
+            StockHold(token=token, user=user, product_id=pk, quantity=quantity, expires_at=expires_at)
+            for pk, quantity in quantities.items()
+        ])
+        # INSERT ก่อนแล้วค่อยเช็ค: บน SQLite การเขียนถือ lock ของทั้งฐานข้อมูล จึงเห็น hold ของคนอื่นครบ
+        available = available_stock(quantities)
+        if len(available) == len(quantities) and all(value >= 0 for _, value in available.values()):
+            return expires_at
+        transaction.set_rollback(True)
+
+    raise InsufficientStock(find_shortages(quantities, token))
+
+
+def release_holds(token, user):
+    deleted, _ = StockHold.objects.filter(token=token, user=user).delete()
+    return deleted
+
+
+def release_expired_holds(batch_size=1000):
+    """ลบ hold ที่หมดอายุทีละ batch คืนจำนวนที่ลบ"""
+    total = 0
+    while True:
+        ids = list(StockHold.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = StockHold.objects.filter(pk__in=ids).delete()
+        total += deleted
@@ -0,0 +1,195 @@
+"""
+คิวงานเบื้องหลังบนตาราง Job (ไม่ต้องมี broker แยก)
+
+- enqueue() เขียนแถวใน transaction เดียวกับข้อมูลที่ก่อให้เกิดงาน
+  ถ้า transaction rollback งานก็หายไปด้วย ถ้า commit งานก็ถูกเห็นแน่นอน
+- worker (manage.py run_jobs) ดึงงานด้วย claim_jobs():
+  PostgreSQL ใช้ SELECT ... FOR UPDATE SKIP LOCKED หลาย worker จึงไม่แย่งแถวเดียวกัน
+  SQLite (ไม่มี row lock) ใช้ UPDATE แบบมีเงื่อนไข status='queued' แทน
+- งานที่ error จะถูกลองใหม่แบบ exponential backoff จนครบ max_attempts แล้วเป็น failed
+- งานที่ done / failed เก่ากว่า JOB_RETENTION_DAYS ถูกลบโดย purge_finished_jobs() (run_jobs เรียกเป็นระยะ)
+
+เพิ่มงานใหม่ด้วย @job_handler('ชื่องาน') แล้วเรียก enqueue('ชื่องาน', {...})
+dict ที่ handler คืนถูกเก็บใน Job.result เมื่องานเสร็จ
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+
+
+def job_handler(name):
+    """ลงทะเบียนฟังก์ชันที่รับ payload (dict) ของงานชื่อ name และคืน dict ผลลัพธ์ (หรือ None)"""
+    def register(func):
+        handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, run_at=None, max_attempts=None):
+    """เพิ่มงานในคิว (ใช้ transaction ของผู้เรียก) max_attempts=1 สำหรับงานที่รันซ้ำไม่ได้"""
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_many(name, payloads):
+    """เพิ่มงานชื่อเดียวกันหลายงานด้วย INSERT เดียว"""
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(name=name, payload=payload, run_at=now, max_attempts=settings.JOB_MAX_ATTEMPTS)
+        for payload in payloads
+    ])
+
+
+def claim_jobs(worker_id, limit):
+    """จองงานที่ถึงเวลาแล้วสูงสุด limit งาน คืน list ของ Job ที่จองได้"""
+    now = timezone.now()
+    token = f'{worker_id}:{uuid.uuid4().hex[:8]}'
+    due = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        # status='queued' ซ้ำอีกครั้ง กัน worker อื่นที่จองไปก่อน (กรณีไม่มี SKIP LOCKED)
+        Job.objects.filter(id__in=ids, status='queued').update(
+            status='running', locked_at=now, locked_by=token, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(locked_by=token, status='running').order_by('run_at', 'id'))
+
+
+def requeue_stale_jobs():
+    """
+    คืนงานที่ running นานเกิน JOB_LOCK_TIMEOUT (worker ตาย) กลับเข้าคิว คืนจำนวนที่คืน + ที่ให้ failed
+    attempts ถูกนับไปแล้วตอน claim_jobs จึงนับรอบที่ worker ตายด้วย งานที่ทำ worker ตายทุกครั้ง
+    (OOM, ถูก kill) จึงเป็น failed เมื่อครบ max_attempts ไม่วนไม่รู้จบ
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by='', last_error='worker lost (lock timeout)', finished_at=now,
+    )
+    return failed + stale.update(status='queued', locked_by='', last_error='worker lost (lock timeout)')
+
+
+def retry_delay(attempts):
+    """backoff แบบเท่าตัว + jitter เล็กน้อย (วินาที)"""
+    delay = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return delay + random.uniform(0, delay / 10)
+
+
+def finish_job(job, **fields):
+    """
+    อัปเดตผลของงานเฉพาะเมื่อ worker นี้ยังถือ lock อยู่ (locked_by เดิม)
+    ถ้างานถูก requeue_stale_jobs คืนแล้ว worker อื่นจองไป ผลของ worker ที่ช้าเกินไม่เขียนทับ
+    """
+    updated = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(**fields)
+    if not updated:
+        logger.warning('Job %s #%s lost its lock before finishing, result discarded', job.name, job.id)
+    return updated
+
+
+def run_job(job):
+    """รันงานหนึ่งงาน คืนสถานะใหม่ ('done', 'queued' = จะลองใหม่, 'failed')"""
+    handler = handlers.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f'no handler registered for job {job.name!r}')
+        result = handler(job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s #%s failed (attempt %s/%s)', job.name, job.id, job.attempts, job.max_attempts)
+        if job.attempts >= job.max_attempts:
+            finish_job(job, status='failed', last_error=error, finished_at=timezone.now())
+            return 'failed'
+        run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        finish_job(job, status='queued', last_error=error, run_at=run_at, locked_by='')
+        return 'queued'
+    finish_job(job, status='done', result=result or {}, finished_at=timezone.now())
+    return 'done'
+
+
+def purge_finished_jobs(batch_size=1000):
+    """ลบงาน done / failed ที่จบไปนานกว่า JOB_RETENTION_DAYS ทีละ batch (ไม่ล็อกตารางนาน) คืนจำนวนที่ลบ"""
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    finished = Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff)
+    total = 0
+    while True:
+        ids = list(finished.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = Job.objects.filter(id__in=ids).delete()
+        total += deleted
+
+
+def queue_stats():
+    """จำนวนงานแยกตามสถานะ"""
+    return dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+
+
+class WorkerMetrics:
+    """ตัวนับของ worker (thread-safe)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'done': 0, 'queued': 0, 'failed': 0}
+        self.run_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.started = time.monotonic()
+
+    def record(self, job, result, run_seconds):
+        with self.lock:
+            self.counts[result] += 1
+            self.run_seconds += run_seconds
+            self.wait_seconds += max((job.locked_at - job.run_at).total_seconds(), 0)
+
+    def summary(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            elapsed = time.monotonic() - self.started
+            return {
+                'processed': total,
+                'succeeded': self.counts['done'],
+                'retried': self.counts['queued'],
+                'failed': self.counts['failed'],
+                'jobs_per_sec': total / elapsed if elapsed else 0.0,
+                'avg_run_ms': self.run_seconds / total * 1000 if total else 0.0,
+                'avg_wait_ms': self.wait_seconds / total * 1000 if total else 0.0,
+            }
+
+
+# ---------- Handlers ----------
+@job_handler('order.created')
+def order_created(payload):
+    """
+    งานหลังสร้างออร์เดอร์ (แจ้งเตือน, webhook ผู้ขาย, ใบเสร็จ, analytics)
+    ให้เพิ่มขั้นตอนใหม่ที่นี่แทนการเพิ่มใน create_order
+    """
+    logger.info('Order %s created', payload['order_id'])
+
+
+@job_handler('orders.import')
+def import_orders(payload):
+    """นำเข้าไฟล์ที่ POST /api/orders/import/ อัปโหลดไว้ (ดู importer.run_import_job)"""
+    from .importer import run_import_job
+
+    return run_import_job(payload)
@@ -0,0 +1,122 @@
+"""
+สมุดบัญชี stock (InventoryMovement) แบบเพิ่มแถวอย่างเดียว
+
+ทุกการเปลี่ยน stock (ขาย, ยกเลิก, เติมสินค้า, ปรับยอดจาก admin / ผู้ขาย) เขียน movement
+ใน transaction เดียวกับ UPDATE ของ Product.stock ไม่มีการแก้หรือลบ movement ย้อนหลัง
+
+Product.stock ยังเป็นยอดปัจจุบันที่อ่านได้ทันที (ProductSerializer ไม่ต้อง SUM อะไร)
+และยังเป็นแถวเดียวที่ UPDATE แบบมีเงื่อนไขใช้กันขายเกิน (ดู inventory.py)
+สมุดเป็นบันทึกสำหรับตรวจสอบย้อนหลังเท่านั้น ไม่ได้ลดการแย่งแถวของสินค้าขายดี:
+ทุกการขายยัง UPDATE แถว Product เดิม และมี INSERT movement เพิ่มอีกหนึ่งแถวต่อรายการ
+
+InventorySnapshot เก็บยอดที่รวม movement ถึง last_movement_id แล้ว
+manage.py compact_inventory รวม movement ใหม่เข้า snapshot เป็นระยะ
+ยอดตามสมุด = snapshot + SUM(movement หลัง snapshot) จึงเป็น range scan สั้น ๆ บน index (product, id)
+และใช้ตรวจว่า Product.stock ตรงกับสมุด (find_drift)
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryMovement, InventorySnapshot, Product
+
+# movement ที่ใหม่กว่านี้ยังไม่ถูกรวม (transaction ที่จอง id ไปแล้วอาจยังไม่ commit)
+COMPACT_SETTLE_SECONDS = 60
+
+
+def record_movements(reason, rows):
+    """เพิ่ม movement [(product_id, ค่าเปลี่ยนแปลง, reference)] ด้วย INSERT เดียว"""
+    return InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=pk, quantity=quantity, reason=reason, reference=reference[:64])
+        for pk, quantity, reference in rows
+        if quantity
+    ])
+
+
+def movements_after_snapshot():
+    """subquery ของ Product: ผลรวม movement ที่ยังไม่ถูกรวมเข้า snapshot"""
+    last_id = Subquery(
+        InventorySnapshot.objects.filter(product=OuterRef(OuterRef('pk'))).values('last_movement_id')
+    )
+    total = (
+        InventoryMovement.objects.filter(product=OuterRef('pk'), id__gt=Coalesce(last_id, Value(0)))
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def ledger_stock():
+    """annotation ของ Product: ยอด stock ตามสมุด"""
+    return Coalesce(F('inventory_snapshot__stock'), Value(0)) + movements_after_snapshot()
+
+
+def find_drift():
+    """สินค้าที่ Product.stock ไม่ตรงกับสมุด [(product_id, stock, ยอดตามสมุด)] (query เดียว)"""
+    return list(
+        Product.objects.annotate(ledger=ledger_stock()).exclude(stock=F('ledger'))
+        .order_by('pk').values_list('pk', 'stock', 'ledger')
+    )
+
+
+def compact_snapshots(batch_size=1000, settle_seconds=COMPACT_SETTLE_SECONDS):
+    """
+    รวม movement ที่เก่ากว่า settle_seconds เข้า InventorySnapshot ทีละ batch ของสินค้า
+    คืนจำนวน snapshot ที่ถูกเขียน
+    ล็อก snapshot ของ batch ก่อนอ่านยอด จึงรันซ้อนกันได้โดยไม่รวม movement ซ้ำ
+    """
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    upto = InventoryMovement.objects.filter(created_at__lte=cutoff).aggregate(last=Max('id'))['last']
+    if upto is None:
+        return 0
+
+    pending = InventoryMovement.objects.filter(
+        id__lte=upto,
+        id__gt=Coalesce(
+            Subquery(InventorySnapshot.objects.filter(product=OuterRef('product_id')).values('last_movement_id')),
+            Value(0),
+        ),
+    )
+    written = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            candidates = list(
+                pending.filter(product_id__gt=last_pk)
+                .values_list('product_id', flat=True).distinct().order_by('product_id')[:batch_size]
+            )
+            if not candidates:
+                return written
+            last_pk = candidates[-1]
+            # อีก process ที่รวม batch เดียวกันอยู่ต้องรอ commit ก่อน แล้ว query ถัดไปจะเห็น last_movement_id ใหม่
+            list(
+                InventorySnapshot.objects.filter(product_id__in=candidates)
+                .select_for_update().order_by('product_id').values_list('pk', flat=True)
+            )
+            deltas = dict(
+                pending.filter(product_id__in=candidates)
+                .values('product_id').annotate(total=Sum('quantity')).order_by()
+                .values_list('product_id', 'total')
+            )
+            # สินค้าที่ถูกลบไปแล้วไม่มี snapshot (movement ยังอยู่ในสมุด)
+            for pk in set(deltas) - set(Product.objects.filter(pk__in=list(deltas)).values_list('pk', flat=True)):
+                del deltas[pk]
+            snapshots = InventorySnapshot.objects.in_bulk(list(deltas))
+            now = timezone.now()
+            InventorySnapshot.objects.bulk_create(
+                [
+                    InventorySnapshot(
+                        product_id=pk,
+                        stock=(snapshots[pk].stock if pk in snapshots else 0) + total,
+                        last_movement_id=upto,
+                        taken_at=now,
+                    )
+                    for pk, total in deltas.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['stock', 'last_movement_id', 'taken_at'],
+            )
+        written += len(deltas)
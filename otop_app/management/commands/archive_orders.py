@@ -0,0 +1,44 @@
+"""
+ย้ายออร์เดอร์ที่ปิดแล้ว (ส่งถึงแล้ว / ยกเลิก) และเก่ากว่า ORDER_ARCHIVE_AFTER_DAYS ไปตาราง archive
+
+รันด้วย: python manage.py archive_orders --batch-size 500 --sleep 0.2
+รันซ้ำได้ (เช่นทุกคืนจาก cron) และหยุดกลางคันได้: แต่ละ batch ย้ายครบหรือไม่ย้ายเลยใน transaction เดียว
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from otop_app.archive import ARCHIVE_BATCH_SIZE, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'ย้ายออร์เดอร์ที่ปิดแล้วและเก่าไปตาราง archive ทีละ batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='ย้ายออร์เดอร์ที่สร้างก่อนกี่วัน (ต้องไม่น้อยกว่า ORDER_ARCHIVE_AFTER_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='จำนวนออร์เดอร์ต่อ batch')
+        parser.add_argument('--sleep', type=float, default=0, help='พักกี่วินาทีระหว่าง batch')
+
+    def handle(self, *args, **options):
+        if options['days'] < settings.ORDER_ARCHIVE_AFTER_DAYS:
+            # หน้ารายการอ่าน archive เฉพาะช่วงก่อน ORDER_ARCHIVE_AFTER_DAYS ออร์เดอร์ที่ใหม่กว่านั้นจะหายจากผลลัพธ์
+            raise CommandError(f'--days ต้องไม่น้อยกว่า ORDER_ARCHIVE_AFTER_DAYS ({settings.ORDER_ARCHIVE_AFTER_DAYS})')
+
+        total = 0
+        before = timezone.now() - timedelta(days=options['days'])
+        try:
+            for moved in archive_orders(before, batch_size=max(options['batch_size'], 1)):
+                total += moved
+                self.stdout.write(f'Archived {moved} orders ({total} so far)')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(f'Stopped, archived {total} orders')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} orders'))
@@ -0,0 +1,38 @@
+"""
+เติม Order.customer ของออร์เดอร์เดิมจาก customer_email ทีละช่วง primary key
+
+รันด้วย: python manage.py backfill_order_customers --batch-size 1000 --sleep 0.2
+หยุดกลางคันได้ (Ctrl+C) แล้วรันต่อด้วย --start-id ที่พิมพ์ไว้
+รันระหว่างเปิดระบบได้: แต่ละช่วงเป็น transaction สั้น ๆ และ --sleep เว้นจังหวะให้ request ปกติ
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from otop_app.customers import BACKFILL_BATCH_SIZE, backfill_order_customers
+
+
+class Command(BaseCommand):
+    help = 'เติมบัญชีลูกค้าของออร์เดอร์เดิมจากอีเมล ทีละช่วง id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='จำนวน id ต่อช่วง')
+        parser.add_argument('--sleep', type=float, default=0, help='พักกี่วินาทีระหว่างช่วง')
+        parser.add_argument('--start-id', type=int, default=1, help='เริ่มจาก id นี้ (รันต่อจากครั้งก่อน)')
+        parser.add_argument('--end-id', type=int, default=None, help='หยุดที่ id นี้ (ค่าเริ่มต้น = id ล่าสุดตอนเริ่ม)')
+
+    def handle(self, *args, **options):
+        total = 0
+        batches = backfill_order_customers(
+            start_id=options['start_id'], batch_size=max(options['batch_size'], 1), end_id=options['end_id'],
+        )
+        try:
+            for last_id, updated in batches:
+                total += updated
+                self.stdout.write(f'ids up to {last_id}: linked {updated} orders (resume with --start-id {last_id + 1})')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(f'Stopped, linked {total} orders')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Linked {total} orders'))
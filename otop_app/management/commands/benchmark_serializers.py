@@ -0,0 +1,108 @@
+"""
+เทียบ ProductSerializer / OrderSerializer กับ fast path ใน otop_app/fastpath.py
+
+ตรวจว่า JSON ที่ได้เหมือนกันทุก byte แล้ววัดเวลา
+ข้อมูลทดสอบถูกสร้างใน transaction ที่ rollback ตอนจบ ฐานข้อมูลจึงไม่เปลี่ยน
+
+รันด้วย: python manage.py benchmark_serializers --products 2000 --orders 500
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from otop_app.fastpath import ORDER_VALUES, PRODUCT_VALUES, serialize_orders, serialize_products
+from otop_app.models import Category, Order, OrderItem, Product, Seller
+from otop_app.serializers import OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'วัดความเร็ว fast path serializer เทียบกับ DRF serializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        request = APIRequestFactory().get('/api/products/', HTTP_HOST='localhost')
+        renderer = JSONRenderer()
+
+        with transaction.atomic():
+            self.seed(options['products'], options['orders'], options['items_per_order'])
+
+            products = Product.objects.filter(is_active=True).order_by('-created_at')
+            orders = Order.objects.prefetch_related('items__product').order_by('-created_at')
+
+            cases = [
+                (
+                    'products',
+                    lambda: ProductSerializer(list(products), many=True, context={'request': request}).data,
+                    lambda: serialize_products(products.values(*PRODUCT_VALUES), request),
+                ),
+                (
+                    'orders',
+                    lambda: OrderSerializer(list(orders), many=True).data,
+                    lambda: serialize_orders(orders.values(*ORDER_VALUES)),
+                ),
+            ]
+            for name, slow, fast in cases:
+                slow_bytes = renderer.render(slow())
+                fast_bytes = renderer.render(fast())
+                if slow_bytes != fast_bytes:
+                    raise CommandError(f'{name}: fast path output differs from serializer output')
+                self.stdout.write(self.style.SUCCESS(f'{name}: output identical ({len(fast_bytes)} bytes)'))
+
+                slow_time = self.measure(lambda: renderer.render(slow()), clear_cache=True)
+                cached_time = self.measure(lambda: renderer.render(slow()))
+                fast_time = self.measure(lambda: renderer.render(fast()))
+                self.stdout.write(f'  serializer (cold cache): {slow_time * 1000:8.1f} ms')
+                self.stdout.write(f'  serializer (warm cache): {cached_time * 1000:8.1f} ms')
+                self.stdout.write(f'  fast path:               {fast_time * 1000:8.1f} ms')
+                self.stdout.write(f'  speedup vs cold: {slow_time / fast_time:.1f}x')
+
+            transaction.set_rollback(True)
+
+    def measure(self, func, clear_cache=False):
+        best = None
+        for _ in range(self.repeat):
+            if clear_cache:
+                cache.clear()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def seed(self, product_count, order_count, items_per_order):
+        user = User.objects.create_user(username='benchmark-seller')
+        seller = Seller.objects.create(user=user, name='ร้านทดสอบ', phone='0800000000', address='กรุงเทพ')
+        category = Category.objects.create(name='หมวดทดสอบ')
+        Product.objects.bulk_create([
+            Product(
+                name=f'สินค้าทดสอบ {i}', description='ผ้าไหมทอมือลายดั้งเดิม สีสวยงาม คุณภาพเยี่ยม ' * 5,
+                price=Decimal(i % 1000) + Decimal('0.50'), image=f'products/{i}.jpg' if i % 2 else '',
+                category=category, seller=seller, category_name=category.name, seller_name=seller.name, stock=i % 50,
+            )
+            for i in range(product_count)
+        ])
+        product_ids = list(Product.objects.filter(seller=seller).values_list('id', flat=True))
+        orders = Order.objects.bulk_create([
+            Order(
+                customer_name=f'ลูกค้า {i}', customer_email=f'c{i}@example.com', total_amount=Decimal('150.00'),
+                shipping_address='ศรีสะเกษ', payment_method='cod',
+            )
+            for i in range(order_count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_ids[(order.pk + n) % len(product_ids)], quantity=n + 1, price=Decimal('50.00'))
+            for order in orders
+            for n in range(items_per_order)
+        ])
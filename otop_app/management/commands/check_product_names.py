@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from otop_app.denormalize import DENORMALIZED_FIELDS, drifted_products, repair_product_names
+from otop_app.models import Category, Product, Seller
+from otop_app.cache import invalidate_products
+from otop_app.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'ตรวจ (และซ่อมด้วย --repair) ชื่อหมวดหมู่/ผู้ขายที่สำเนาไว้บนสินค้า'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='แก้แถวที่ไม่ตรงด้วย UPDATE ครั้งเดียวต่อ field')
+
+    def handle(self, *args, **options):
+        drifted_ids = set()
+        for field, relation, _ in DENORMALIZED_FIELDS:
+            ids = list(drifted_products(Product, field, relation).values_list('pk', flat=True))
+            drifted_ids.update(ids)
+            style = self.style.WARNING if ids else self.style.SUCCESS
+            self.stdout.write(style(f'{field}: {len(ids)} drifted'))
+
+        if not drifted_ids or not options['repair']:
+            return
+
+        repaired = repair_product_names(Product, {'Category': Category, 'Seller': Seller})
+        invalidate_products(drifted_ids)
+        index_products(Product.objects.filter(pk__in=drifted_ids).only('id', 'name', 'description', 'category_name'))
+        for field, count in repaired.items():
+            self.stdout.write(self.style.SUCCESS(f'{field}: repaired {count}'))
@@ -0,0 +1,35 @@
+"""
+รวม InventoryMovement ใหม่เข้า InventorySnapshot แล้วตรวจว่า Product.stock ตรงกับสมุด
+
+รันด้วย: python manage.py compact_inventory            (เหมาะกับ cron ทุกชั่วโมง / ทุกคืน)
+หรือ:    python manage.py compact_inventory --check    (ตรวจอย่างเดียว ไม่เขียน snapshot)
+รันซ้อนกันได้ (snapshot ของแต่ละ batch ถูกล็อกก่อนรวม)
+จบด้วย CommandError (exit code 1) ถ้าพบสินค้าที่ยอดไม่ตรง
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from otop_app.ledger import COMPACT_SETTLE_SECONDS, compact_snapshots, find_drift
+
+
+class Command(BaseCommand):
+    help = 'รวม movement ของ stock เข้า snapshot และตรวจยอดกับ Product.stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='จำนวนสินค้าต่อ transaction')
+        parser.add_argument(
+            '--settle', type=int, default=COMPACT_SETTLE_SECONDS,
+            help='ไม่รวม movement ที่ใหม่กว่ากี่วินาที (รอ transaction ที่ยังไม่ commit)',
+        )
+        parser.add_argument('--check', action='store_true', help='ตรวจยอดอย่างเดียว')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            written = compact_snapshots(batch_size=max(options['batch_size'], 1), settle_seconds=options['settle'])
+            self.stdout.write(f'Compacted {written} snapshots')
+
+        drift = find_drift()
+        for pk, stock, ledger in drift:
+            self.stderr.write(f'product {pk}: stock {stock} != ledger {ledger}')
+        if drift:
+            raise CommandError(f'{len(drift)} products out of balance')
+        self.stdout.write(self.style.SUCCESS('Stock matches ledger'))
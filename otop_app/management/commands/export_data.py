@@ -0,0 +1,61 @@
+"""
+ส่งออกออร์เดอร์หรือสินค้าเป็น CSV / NDJSON (stream ลงไฟล์ หน่วยความจำคงที่)
+
+รันด้วย: python manage.py export_data orders --format csv --from 2026-01-01 --to 2026-03-31 --output q1.csv
+หรือ:    python manage.py export_data products --format ndjson --seller 3 > products.ndjson
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from otop_app.archive import ranged_order_rows
+from otop_app.exports import (
+    EXPORT_CHUNK_SIZE, EXPORT_CONTENT_TYPES, ORDER_STATUSES, PRODUCT_STATUSES, ExportFilterError,
+    apply_export_filters, export_orders, export_products, parse_export_filters,
+)
+from otop_app.models import ArchivedOrder, Order, Product
+
+
+class Command(BaseCommand):
+    help = 'ส่งออกออร์เดอร์หรือสินค้าเป็น CSV / NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['orders', 'products'])
+        parser.add_argument('--format', dest='fmt', choices=sorted(EXPORT_CONTENT_TYPES), default='csv')
+        parser.add_argument('--from', dest='created_from', help='ตั้งแต่วันที่ (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='created_to', help='ถึงวันที่ (YYYY-MM-DD รวมวันนั้น)')
+        parser.add_argument('--status', help='สถานะออร์เดอร์ หรือ active / inactive สำหรับสินค้า')
+        parser.add_argument('--seller', type=int, help='เฉพาะของร้านนี้ (id ของ Seller)')
+        parser.add_argument('--output', help='ไฟล์ปลายทาง (ค่าเริ่มต้น = stdout)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        statuses = ORDER_STATUSES if options['kind'] == 'orders' else PRODUCT_STATUSES
+        try:
+            filters = parse_export_filters(options, statuses)
+        except ExportFilterError as e:
+            raise CommandError(str(e))
+
+        chunk_size = max(options['chunk_size'], 1)
+        if options['kind'] == 'orders':
+            orders = Order.objects.order_by('-pk')
+            archived = ArchivedOrder.objects.all()
+            if options['seller'] is not None:
+                orders = orders.filter(seller_links__seller_id=options['seller'])
+                archived = archived.filter(seller_links__seller_id=options['seller'])
+            lines = export_orders(ranged_order_rows(orders, archived, filters), options['fmt'], chunk_size)
+        else:
+            products = Product.objects.order_by('-created_at')
+            if options['seller'] is not None:
+                products = products.filter(seller_id=options['seller'])
+            products = apply_export_filters(products, filters, status_field='is_active')
+            lines = export_products(products, options['fmt'], chunk_size)
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for line in lines:
+                out.write(line)
+                count += 1
+        self.stderr.write(f'Wrote {count} lines to {options["output"]}')
@@ -0,0 +1,46 @@
+"""
+นำเข้าออร์เดอร์จากไฟล์ NDJSON หรือ CSV (ดูรูปแบบใน otop_app/importer.py)
+
+รันด้วย: python manage.py import_orders orders.ndjson --report errors.ndjson
+         python manage.py import_orders shopee.csv --format csv --chunk-size 1000
+รายงานข้อผิดพลาดเป็น NDJSON หนึ่งบรรทัดต่อแถวที่ไม่ผ่าน ({"row": ..., "errors": ...})
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from otop_app.importer import IMPORT_CHUNK_SIZE, OrderImporter, read_orders
+
+
+class Command(BaseCommand):
+    help = 'นำเข้าออร์เดอร์จำนวนมากจากไฟล์ NDJSON / CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="ไฟล์ที่จะนำเข้า ('-' = stdin)")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default=None, help='ค่าเริ่มต้นดูจากนามสกุลไฟล์')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--report', help='ไฟล์สำหรับเขียนรายงานข้อผิดพลาด (ค่าเริ่มต้น stderr)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        report = open(options['report'], 'w', encoding='utf-8') if options['report'] else self.stderr
+
+        def write_error(row, errors):
+            report.write(json.dumps({'row': row, 'errors': errors}, ensure_ascii=False, default=str) + '\n')
+
+        try:
+            source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f'เปิดไฟล์ไม่ได้: {e}')
+        try:
+            importer = OrderImporter(chunk_size=max(options['chunk_size'], 1), on_error=write_error)
+            importer.run(read_orders(source, fmt))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+            if options['report']:
+                report.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Created {importer.created} orders, {importer.failed} failed'))
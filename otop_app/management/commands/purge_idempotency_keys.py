@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from otop_app.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'ลบ Idempotency-Key ที่หมดอายุแล้ว (ตั้ง cron รันวันละครั้ง)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired keys'))
@@ -0,0 +1,86 @@
+"""
+worker ของคิวงานเบื้องหลัง (otop_app/jobs.py)
+
+รันด้วย: python manage.py run_jobs --threads 4
+หรือ:    python manage.py run_jobs --once   (ทำงานที่ค้างให้หมดแล้วจบ เหมาะกับ cron)
+ระหว่างรันจะลบงาน done / failed ที่เก่ากว่า JOB_RETENTION_DAYS ทุก --purge-interval วินาที
+รันหลาย process พร้อมกันได้ แต่ละงานถูกจองโดย worker เดียว
+"""
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from otop_app.jobs import (
+    WorkerMetrics, claim_jobs, purge_finished_jobs, queue_stats, requeue_stale_jobs, run_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'รันงานเบื้องหลังจากคิว (Job) ด้วย thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOB_WORKER_THREADS)
+        parser.add_argument('--batch', type=int, default=None, help='จำนวนงานที่จองต่อรอบ (ค่าเริ่มต้น threads x 2)')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--stats-interval', type=float, default=60.0)
+        parser.add_argument('--purge-interval', type=float, default=3600.0, help='ลบงานที่จบแล้วและเก่าทุกกี่วินาที')
+        parser.add_argument('--once', action='store_true', help='ทำงานที่ถึงเวลาให้หมดแล้วจบ')
+
+    def handle(self, *args, **options):
+        threads = max(options['threads'], 1)
+        batch = options['batch'] or threads * 2
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.metrics = WorkerMetrics()
+        last_stats = time.monotonic()
+        last_purge = None
+
+        # --threads 1 รันใน thread หลักเลย
+        pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        try:
+            while True:
+                requeue_stale_jobs()
+                if last_purge is None or time.monotonic() - last_purge >= options['purge_interval']:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+                jobs = claim_jobs(worker_id, batch)
+                if jobs:
+                    list(pool.map(self.run_in_thread, jobs) if pool else map(self.run_one, jobs))
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+
+                if time.monotonic() - last_stats >= options['stats_interval']:
+                    self.report()
+                    last_stats = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown()
+        self.report()
+
+    def run_one(self, job):
+        start = time.perf_counter()
+        result = run_job(job)
+        self.metrics.record(job, result, time.perf_counter() - start)
+
+    def run_in_thread(self, job):
+        try:
+            self.run_one(job)
+        finally:
+            close_old_connections()
+
+    def report(self):
+        summary = self.metrics.summary()
+        self.stdout.write(
+            f"processed {summary['processed']} (ok {summary['succeeded']}, retry {summary['retried']}, "
+            f"failed {summary['failed']}) {summary['jobs_per_sec']:.1f} jobs/sec, "
+            f"avg run {summary['avg_run_ms']:.1f} ms, avg wait {summary['avg_wait_ms']:.1f} ms, "
+            f"queue {queue_stats()}"
+        )
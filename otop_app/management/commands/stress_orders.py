@@ -0,0 +1,93 @@
+"""
+ยิง POST /api/orders/create/ พร้อมกันหลาย thread ใส่สินค้าชิ้นเดียว (จำลอง flash sale)
+
+ตรวจว่าไม่ขายเกิน stock (จำนวนที่ขายได้ + stock ที่เหลือ = stock ตั้งต้น และ stock ไม่ติดลบ)
+แล้วรายงานจำนวนออร์เดอร์ต่อวินาที ข้อมูลที่สร้างจะถูกลบเมื่อจบ
+ควรรันกับ PostgreSQL (SQLite ล็อกทั้งไฟล์ ตัวเลขจึงไม่สะท้อน production)
+
+รันด้วย: python manage.py stress_orders --threads 16 --orders 500 --stock 200
+"""
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.models import Sum
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from otop_app.models import Category, Order, OrderItem, Product, Seller
+
+STRESS_NAME = 'stress-orders'
+
+
+def run_stress(threads, orders, stock, quantity=1):
+    """คืน dict ผลลัพธ์ (created, rejected, errors, sold, remaining, seconds)"""
+    user = User.objects.create_user(username=STRESS_NAME)
+    seller = Seller.objects.create(user=user, name=STRESS_NAME, phone='0800000000', address='กรุงเทพ')
+    category = Category.objects.create(name=STRESS_NAME)
+    product = Product.objects.create(
+        name=STRESS_NAME, description='', price='10.00', stock=stock, category=category, seller=seller,
+    )
+    url = reverse('otop_api:create-order')
+    payload = {
+        'customer_name': STRESS_NAME,
+        'shipping_address': 'กรุงเทพ',
+        'payment_method': 'cod',
+        'items': [{'product_id': product.pk, 'quantity': quantity, 'price': '10.00'}],
+    }
+
+    def place_order(_):
+        try:
+            return APIClient(HTTP_HOST='localhost').post(url, payload, format='json').status_code
+        finally:
+            connections.close_all()
+
+    try:
+        # view พิมพ์ log ทุกออร์เดอร์ ปิดไว้ระหว่างวัด
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                statuses = list(pool.map(place_order, range(orders)))
+            seconds = time.perf_counter() - start
+        close_old_connections()
+
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        return {
+            'created': statuses.count(201),
+            'rejected': statuses.count(400),
+            'errors': len(statuses) - statuses.count(201) - statuses.count(400),
+            'sold': sold,
+            'remaining': product.stock,
+            'seconds': seconds,
+        }
+    finally:
+        Order.objects.filter(items__product=product).delete()
+        product.delete()
+        category.delete()
+        user.delete()
+
+
+class Command(BaseCommand):
+    help = 'ทดสอบการสั่งซื้อพร้อมกันหลาย thread ว่าไม่ขายเกิน stock และวัด orders/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def handle(self, *args, **options):
+        result = run_stress(options['threads'], options['orders'], options['stock'], options['quantity'])
+        self.stdout.write(
+            f"created {result['created']}, rejected {result['rejected']}, errors {result['errors']} "
+            f"in {result['seconds']:.2f}s ({result['created'] / result['seconds']:.1f} orders/sec)"
+        )
+        self.stdout.write(f"sold {result['sold']}, remaining stock {result['remaining']}")
+        if result['remaining'] < 0 or result['sold'] + result['remaining'] != options['stock']:
+            raise CommandError('oversold: stock and order items do not add up')
+        self.stdout.write(self.style.SUCCESS('no oversell'))
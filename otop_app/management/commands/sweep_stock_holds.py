@@ -0,0 +1,30 @@
+"""
+ลบ stock hold ที่หมดอายุ (hold ที่หมดอายุไม่ถูกนับอยู่แล้ว คำสั่งนี้แค่ทำให้ตารางเล็ก)
+
+รันด้วย: python manage.py sweep_stock_holds             (ครั้งเดียว เหมาะกับ cron)
+หรือ:    python manage.py sweep_stock_holds --interval 60 (วนทุก 60 วินาที)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from otop_app.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'ลบ stock hold ที่หมดอายุเป็น batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=0, help='วนซ้ำทุกกี่วินาที (0 = ครั้งเดียว)')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = release_expired_holds(batch_size=options['batch_size'])
+            self.stdout.write(f'Released {deleted} expired holds')
+            if not options['interval']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
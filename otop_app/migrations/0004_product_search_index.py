@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:34
+
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# tokenizer ณ ตอนสร้าง migration นี้ (คัดลอกจาก otop_app.search เพื่อไม่ให้ผลขึ้นกับโค้ดปัจจุบัน)
+THAI_RE = re.compile(r'[\u0e00-\u0e7f]+')
+WORD_RE = re.compile(r'[\u0e00-\u0e7f]+|[^\W_\u0e00-\u0e7f]+')
+MAX_TOKEN_LENGTH = 32
+MIN_PREFIX_LENGTH = 2
+FIELD_WEIGHTS = {'name': 3, 'category': 2, 'description': 1}
+
+
+def tokenize(text):
+    tokens = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        if THAI_RE.fullmatch(word):
+            if len(word) < 2:
+                tokens.add(word)
+            else:
+                tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            word = word[:MAX_TOKEN_LENGTH]
+            tokens.add(word)
+            for end in range(MIN_PREFIX_LENGTH, len(word)):
+                tokens.add(word[:end])
+    return tokens
+
+
+def product_token_weights(name, description, category_name):
+    weights = defaultdict(int)
+    for field, text in (('name', name), ('category', category_name), ('description', description)):
+        for token in tokenize(text):
+            weights[token] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def build_index(apps, schema_editor):
+    Product = apps.get_model('otop_app', 'Product')
+    SearchToken = apps.get_model('otop_app', 'SearchToken')
+    rows = []
+    for count, product in enumerate(Product.objects.select_related('category').iterator(chunk_size=1000), 1):
+        weights = product_token_weights(product.name, product.description, product.category.name)
+        rows.extend(
+            SearchToken(product_id=product.pk, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+        # เขียนทีละ 1000 สินค้า ไม่สะสม token ของทั้ง catalog ไว้ในหน่วยความจำ
+        if count % 1000 == 0:
+            SearchToken.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    SearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0003_remove_product_image_url_product_image_productreview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='otop_app.product')),
+            ],
+            options={
+                'unique_together': {('token', 'product')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:42
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_names(apps, schema_editor):
+    Product = apps.get_model('otop_app', 'Product')
+    for field, relation, source in (('category_name', 'category', 'Category'), ('seller_name', 'seller', 'Seller')):
+        Source = apps.get_model('otop_app', source)
+        name = Subquery(Source.objects.filter(pk=OuterRef(f'{relation}_id')).values('name')[:1])
+        Product.objects.update(**{field: name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0006_catalog_and_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='category_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='seller_name',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:54
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def format_order_number(day, value):
+    return f'OTOP-{day:%Y%m%d}-{value:06d}'
+
+
+def number_existing_orders(apps, schema_editor):
+    Order = apps.get_model('otop_app', 'Order')
+    OrderSequence = apps.get_model('otop_app', 'OrderSequence')
+    counters = {}
+    batch = []
+    for order in Order.objects.order_by('id').only('id', 'created_at').iterator(chunk_size=1000):
+        day = timezone.localdate(order.created_at)
+        counters[day] = counters.get(day, 0) + 1
+        order.order_number = format_order_number(day, counters[day])
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, ['order_number'])
+            batch = []
+    Order.objects.bulk_update(batch, ['order_number'])
+    OrderSequence.objects.bulk_create([OrderSequence(day=day, next_value=value) for day, value in counters.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('next_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_orders, migrations.RunPython.noop),
+    ]
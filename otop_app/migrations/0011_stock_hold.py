@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0010_order_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='otop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='hold_product_expires_idx'), models.Index(fields=['expires_at'], name='hold_expires_idx')],
+                'unique_together': {('token', 'product')},
+            },
+        ),
+    ]
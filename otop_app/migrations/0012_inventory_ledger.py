@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """ยอดยกมา: stock ปัจจุบันของทุกสินค้าเป็น movement แรกในสมุด"""
+    Product = apps.get_model('otop_app', 'Product')
+    InventoryMovement = apps.get_model('otop_app', 'InventoryMovement')
+    batch = []
+    for pk, stock in Product.objects.filter(stock__gt=0).order_by('id').values_list('id', 'stock').iterator(chunk_size=1000):
+        batch.append(InventoryMovement(product_id=pk, quantity=stock, reason='adjustment', reference='opening balance'))
+        if len(batch) >= 1000:
+            InventoryMovement.objects.bulk_create(batch)
+            batch = []
+    InventoryMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0011_stock_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory_snapshot', serialize=False, to='otop_app.product')),
+                ('stock', models.IntegerField(default=0)),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('reason', models.CharField(choices=[('sale', 'ขาย'), ('cancel', 'ยกเลิกออร์เดอร์'), ('restock', 'เติมสินค้า'), ('adjustment', 'ปรับยอด')], max_length=10)),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movements', to='otop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='movement_product_id_idx'), models.Index(fields=['product', 'created_at'], name='movement_product_created_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_existing_orders(apps, schema_editor):
+    OrderItem = apps.get_model('otop_app', 'OrderItem')
+    OrderSeller = apps.get_model('otop_app', 'OrderSeller')
+    rows = (
+        OrderItem.objects
+        .values_list('order_id', 'product__seller_id', 'order__created_at', 'order__status')
+        .distinct().order_by('order_id')
+    )
+    batch = []
+    for order_id, seller_id, created_at, status in rows.iterator(chunk_size=1000):
+        batch.append(OrderSeller(order_id=order_id, seller_id=seller_id, created_at=created_at, status=status))
+        if len(batch) >= 1000:
+            OrderSeller.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    OrderSeller.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0012_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSeller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'รอดำเนินการ'), ('confirmed', 'ยืนยันแล้ว'), ('shipped', 'จัดส่งแล้ว'), ('delivered', 'ส่งถึงแล้ว'), ('cancelled', 'ยกเลิก')], max_length=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_links', to='otop_app.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_links', to='otop_app.seller')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', '-created_at', '-order'], name='order_seller_created_idx')],
+                'unique_together': {('order', 'seller')},
+            },
+        ),
+        migrations.RunPython(link_existing_orders, migrations.RunPython.noop),
+    ]
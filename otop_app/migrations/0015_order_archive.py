@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0014_order_customer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order_number', models.CharField(blank=True, max_length=32, null=True, unique=True)),
+                ('customer_name', models.CharField(max_length=200)),
+                ('customer_phone', models.CharField(blank=True, max_length=20)),
+                ('customer_email', models.EmailField(blank=True, max_length=254)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('shipping_address', models.TextField()),
+                ('payment_method', models.CharField(choices=[('transfer', 'โอนเงิน'), ('cod', 'เก็บเงินปลายทาง')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'รอดำเนินการ'), ('confirmed', 'ยืนยันแล้ว'), ('shipped', 'จัดส่งแล้ว'), ('delivered', 'ส่งถึงแล้ว'), ('cancelled', 'ยกเลิก')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('product_name', models.CharField(max_length=200)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='otop_app.archivedorder')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='otop_app.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderSeller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'รอดำเนินการ'), ('confirmed', 'ยืนยันแล้ว'), ('shipped', 'จัดส่งแล้ว'), ('delivered', 'ส่งถึงแล้ว'), ('cancelled', 'ยกเลิก')], max_length=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_links', to='otop_app.archivedorder')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_order_links', to='otop_app.seller')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer', 'created_at'], name='archived_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderseller',
+            index=models.Index(fields=['seller', '-created_at', '-order'], name='archived_seller_created_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedorderseller',
+            unique_together={('order', 'seller')},
+        ),
+    ]
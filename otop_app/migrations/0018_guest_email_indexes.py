@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('otop_app', '0017_idempotency_key_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(condition=models.Q(('customer__isnull', True)), fields=['customer_email'], name='archived_guest_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('customer__isnull', True)), fields=['customer_email'], name='order_guest_email_idx'),
+        ),
+    ]
@@ -1,9 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # ETag ของ /api/categories/ ใช้ COUNT + MAX(updated_at)
+            models.Index(fields=['updated_at'], name='category_updated_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -13,6 +23,7 @@ class Seller(models.Model):
     phone = models.CharField(max_length=20)
     address = models.TextField()
     is_verified = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
         return self.name
 
@@ -23,13 +34,31 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     seller = models.ForeignKey(Seller, on_delete=models.CASCADE)
+    # สำเนาชื่อไว้ที่สินค้าเพื่อให้ list ไม่ต้อง join (signals.py ดูแลให้ตรงกันเสมอ)
+    category_name = models.CharField(max_length=100, blank=True, editable=False)
+    seller_name = models.CharField(max_length=200, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # หน้ารายการสินค้า: WHERE is_active ORDER BY created_at/price (+ id สำหรับ cursor)
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True), name='product_active_created_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True), name='product_active_price_idx'),
+            # สินค้าของผู้ขาย
+            models.Index(fields=['seller', 'created_at'], name='product_seller_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # signals.lock_stock_edit ล็อกแถวอ่านยอดปัจจุบัน ต้องอยู่ใน transaction เดียวกับ UPDATE
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'รอดำเนินการ'),
@@ -42,18 +71,40 @@ class Order(models.Model):
         ('transfer', 'โอนเงิน'),
         ('cod', 'เก็บเงินปลายทาง'),
     ]
+    # เลขออร์เดอร์สำหรับคน เช่น OTOP-20261018-000123 (ดู otop_app/order_numbers.py)
+    order_number = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
     customer_name = models.CharField(max_length=200, default='Customer')
     customer_phone = models.CharField(max_length=20, blank=True)
     customer_email = models.EmailField(blank=True)
+    # บัญชีลูกค้า (ออร์เดอร์ของแขกเป็น NULL) ออร์เดอร์เก่าเติมด้วย manage.py backfill_order_customers
+    customer = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders', db_index=False,
+    )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.TextField()
     payment_method = models.CharField(max_length=10, choices=PAYMENT_CHOICES)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+            # ออร์เดอร์แขกที่รอผูกกับบัญชีตอนสมัคร (customers.link_guest_orders) index เฉพาะแถวที่ยังไม่มีเจ้าของ
+            models.Index(fields=['customer_email'], condition=models.Q(customer__isnull=True), name='order_guest_email_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+class OrderSequence(models.Model):
+    """ตัวนับเลขออร์เดอร์รายวัน แต่ละ process จองเลขทีละ block (hi-lo)"""
+    day = models.DateField(unique=True)
+    next_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.next_value}"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -62,9 +113,224 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
+class OrderSeller(models.Model):
+    """
+    ผู้ขายที่มีสินค้าอยู่ในออร์เดอร์ (สำเนาจาก OrderItem -> Product.seller เขียนตอนสร้างออร์เดอร์)
+    หน้ารายการออร์เดอร์ของผู้ขายจึงไล่ index (seller, created_at) ได้เลย ไม่ต้อง join 3 ตาราง + DISTINCT
+    created_at / status สำเนาจาก Order (status ถูกอัปเดตพร้อมกันใน order_status.py และ signals.py)
+    """
+    order = models.ForeignKey(Order, related_name='seller_links', on_delete=models.CASCADE)
+    seller = models.ForeignKey(Seller, related_name='order_links', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+
+    class Meta:
+        unique_together = ('order', 'seller')
+        indexes = [
+            # ออร์เดอร์ของผู้ขาย ใหม่สุดก่อน (+ order_id สำหรับ cursor)
+            models.Index(fields=['seller', '-created_at', '-order'], name='order_seller_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} - seller {self.seller_id}"
+
+# ---------- Archive (ออร์เดอร์ที่ปิดแล้วและเก่ากว่า ORDER_ARCHIVE_AFTER_DAYS ดู otop_app/archive.py) ----------
+class ArchivedOrder(models.Model):
+    """สำเนาของ Order ที่ถูกย้ายออกจากตารางหลัก (id เดิม) ไม่มีการแก้ไขหลังย้าย"""
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.CharField(max_length=32, unique=True, null=True, blank=True)
+    customer_name = models.CharField(max_length=200)
+    customer_phone = models.CharField(max_length=20, blank=True)
+    customer_email = models.EmailField(blank=True)
+    customer = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_orders', db_index=False,
+    )
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    shipping_address = models.TextField()
+    payment_method = models.CharField(max_length=10, choices=Order.PAYMENT_CHOICES)
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='archived_customer_created_idx'),
+            models.Index(fields=['created_at'], name='archived_order_created_idx'),
+            models.Index(fields=['customer_email'], condition=models.Q(customer__isnull=True), name='archived_guest_email_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.customer_name}"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    # สินค้าอาจถูกลบภายหลัง จึงไม่มี constraint และเก็บชื่อสินค้าไว้ตอนย้าย
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False)
+    product_name = models.CharField(max_length=200)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+class ArchivedOrderSeller(models.Model):
+    """OrderSeller ของออร์เดอร์ใน archive (หน้ารายการย้อนหลังของผู้ขาย)"""
+    order = models.ForeignKey(ArchivedOrder, related_name='seller_links', on_delete=models.CASCADE)
+    seller = models.ForeignKey(Seller, related_name='archived_order_links', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+
+    class Meta:
+        unique_together = ('order', 'seller')
+        indexes = [
+            models.Index(fields=['seller', '-created_at', '-order'], name='archived_seller_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.order_id} - seller {self.seller_id}"
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.PositiveIntegerField(default=5)
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='review_product_created_idx'),
+        ]
+
+class StockHold(models.Model):
+    """สินค้าที่ถูกกันไว้ในตะกร้าชั่วคราว (ดู otop_app/inventory.py) หมดอายุแล้วไม่นับ"""
+    token = models.CharField(max_length=64)
+    # token ผูกกับผู้ที่สร้าง คนอื่นแก้ / ดู / ใช้ checkout ไม่ได้ (NULL = hold ก่อนมี field นี้ หมดอายุไปเอง)
+    user = models.ForeignKey(User, related_name='stock_holds', on_delete=models.CASCADE, null=True)
+    product = models.ForeignKey(Product, related_name='holds', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('token', 'product')
+        indexes = [
+            # SUM(quantity) ของ hold ที่ยังไม่หมดอายุต่อสินค้า
+            models.Index(fields=['product', 'expires_at'], name='hold_product_expires_idx'),
+            # sweeper ลบ hold ที่หมดอายุ
+            models.Index(fields=['expires_at'], name='hold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token}: {self.product_id} x {self.quantity}"
+
+class InventoryMovement(models.Model):
+    """
+    สมุดบัญชี stock แบบเพิ่มแถวอย่างเดียว (ดู otop_app/ledger.py)
+    quantity เป็นค่าเปลี่ยนแปลง (ขาย = ติดลบ) ไม่มี FK constraint เพื่อให้ประวัติอยู่ต่อแม้ลบสินค้า
+    """
+    REASON_CHOICES = [
+        ('sale', 'ขาย'),
+        ('cancel', 'ยกเลิกออร์เดอร์'),
+        ('restock', 'เติมสินค้า'),
+        ('adjustment', 'ปรับยอด'),
+    ]
+    product = models.ForeignKey(
+        Product, related_name='movements', on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    # เลขออร์เดอร์ หรือผู้แก้ไข เช่น admin:somchai
+    reference = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # movement หลัง snapshot ล่าสุดของสินค้า (WHERE product_id = ? AND id > ?)
+            models.Index(fields=['product', 'id'], name='movement_product_id_idx'),
+            # ตรวจสอบย้อนหลังตามช่วงเวลา
+            models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.quantity:+d} ({self.reason})"
+
+class InventorySnapshot(models.Model):
+    """ยอด stock ของสินค้าที่รวม movement จนถึง last_movement_id แล้ว (manage.py compact_inventory)"""
+    product = models.OneToOneField(Product, primary_key=True, related_name='inventory_snapshot', on_delete=models.CASCADE)
+    stock = models.IntegerField(default=0)
+    last_movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock} @ {self.last_movement_id}"
+
+class SearchToken(models.Model):
+    """Inverted index ของสินค้า (ดู otop_app/search.py)"""
+    token = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, related_name='search_tokens', on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('token', 'product')
+
+
+class IdempotencyKey(models.Model):
+    """คำตอบที่บันทึกไว้ของ request ที่มี Idempotency-Key (ดู otop_app/idempotency.py)"""
+    STATUS_CHOICES = [
+        ('processing', 'กำลังประมวลผล'),
+        ('completed', 'เสร็จแล้ว'),
+    ]
+    key = models.CharField(max_length=255)
+    # key แยกตามผู้ใช้ (NULL = แขก)
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE, null=True, db_index=False)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'], condition=models.Q(user__isnull=False), name='idempotency_user_key_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(user__isnull=True), name='idempotency_guest_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class Job(models.Model):
+    """งานเบื้องหลังในคิว (ดู otop_app/jobs.py และ manage.py run_jobs)"""
+    STATUS_CHOICES = [
+        ('queued', 'รอทำงาน'),
+        ('running', 'กำลังทำงาน'),
+        ('done', 'เสร็จแล้ว'),
+        ('failed', 'ล้มเหลว'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
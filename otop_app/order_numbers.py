@@ -0,0 +1,79 @@
+"""
+เลขออร์เดอร์สำหรับคน เช่น OTOP-20261018-000123 (เริ่มนับใหม่ทุกวัน)
+
+ไม่ใช้ MAX()+1 หรือ UPDATE ตัวนับทุกออร์เดอร์ เพราะจะทำให้ checkout ทุกรายการต่อคิวกันที่แถวเดียว
+แต่ละ process จองเลขทีละ block (ORDER_NUMBER_BLOCK_SIZE) จาก OrderSequence ของวันนั้น
+แล้วแจกเลขใน block จากหน่วยความจำ แถวตัวนับจึงถูกแตะแค่ครั้งเดียวต่อ block
+เลขไม่ซ้ำแน่นอน (มี unique constraint กันอีกชั้น) แต่อาจข้ามได้เมื่อ process restart
+และลำดับเลขระหว่าง process ไม่จำเป็นต้องตรงกับลำดับเวลา
+
+ควรเรียก allocate_order_number() นอก transaction ของออร์เดอร์
+เพื่อให้การจอง block commit ทันทีและไม่ถือ lock ของแถวตัวนับนาน
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderSequence
+
+ORDER_NUMBER_PREFIX = 'OTOP'
+
+
+def format_order_number(day, value):
+    return f'{ORDER_NUMBER_PREFIX}-{day:%Y%m%d}-{value:06d}'
+
+
+def reserve_block(day, size):
+    """จองช่วง [start, start + size) ของวัน day คืน start (เริ่มที่ 1)"""
+    with transaction.atomic():
+        # UPDATE ก่อนแล้วค่อยอ่าน จึงได้ค่าของตัวเองภายใต้ write lock เดียวกัน
+        if not OrderSequence.objects.filter(day=day).update(next_value=F('next_value') + size):
+            try:
+                with transaction.atomic():
+                    OrderSequence.objects.create(day=day, next_value=size)
+                return 1
+            except IntegrityError:
+                OrderSequence.objects.filter(day=day).update(next_value=F('next_value') + size)
+        return OrderSequence.objects.get(day=day).next_value - size + 1
+
+
+class OrderNumberAllocator:
+    """แจกเลขจาก block ที่จองไว้ (thread-safe หนึ่งตัวต่อ process)"""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.day = None
+        self.next = self.limit = 0
+
+    def allocate_many(self, count):
+        day = timezone.localdate()
+        block_size = self.block_size or settings.ORDER_NUMBER_BLOCK_SIZE
+        numbers = []
+        with self.lock:
+            while len(numbers) < count:
+                if self.day != day or self.next >= self.limit:
+                    size = max(block_size, count - len(numbers))
+                    self.day, self.next = day, reserve_block(day, size)
+                    self.limit = self.next + size
+                take = min(count - len(numbers), self.limit - self.next)
+                numbers.extend(format_order_number(day, value) for value in range(self.next, self.next + take))
+                self.next += take
+        return numbers
+
+    def allocate(self):
+        return self.allocate_many(1)[0]
+
+
+allocator = OrderNumberAllocator()
+
+
+def allocate_order_number():
+    return allocator.allocate()
+
+
+def allocate_order_numbers(count):
+    return allocator.allocate_many(count)
@@ -0,0 +1,122 @@
+"""
+เปลี่ยนสถานะออร์เดอร์ (ทีละออร์เดอร์หรือทีละหลายสิบออร์เดอร์ของผู้ขาย)
+
+    pending -> confirmed -> shipped -> delivered
+    pending / confirmed -> cancelled   (ส่งของออกไปแล้วยกเลิกไม่ได้)
+
+ทั้ง batch ใช้ query จำนวนคงที่:
+- SELECT เดียวอ่านสถานะปัจจุบัน + สิทธิ์ของผู้ขาย (EXISTS ใน OrderSeller) ของทุก id
+- UPDATE หนึ่งคำสั่งต่อสถานะปลายทาง (มีเงื่อนไข status IN สถานะต้นทางที่อนุญาตซ้ำอีกชั้น)
+  และ UPDATE สำเนา status ใน OrderSeller
+- ยกเลิก: รวมจำนวนสินค้าของทุกออร์เดอร์ที่ยกเลิกด้วย GROUP BY แล้วคืน stock ด้วย UPDATE เดียว
+  และบันทึก movement 'cancel' รายออร์เดอร์
+- แจ้งลูกค้าและผู้ขายหลัง commit (events.py) SELECT ผู้ขายของออร์เดอร์ที่เปลี่ยนอีกหนึ่งครั้ง
+ออร์เดอร์ที่เปลี่ยนไม่ได้ถูกรายงานเป็นรายตัว ส่วนที่เหลือยังถูกเปลี่ยนตามปกติ
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
+from django.utils import timezone
+
+from .events import order_status_changed
+from .inventory import adjust_stock, merge_quantities
+from .ledger import record_movements
+from .models import Order, OrderItem, OrderSeller
+
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+class OrderStatusConflict(Exception):
+    """สถานะของออร์เดอร์ถูกเปลี่ยนโดย request อื่นระหว่างอ่านกับเขียน (เฉพาะฐานข้อมูลที่ไม่มี row lock)"""
+
+
+def allowed_sources(target):
+    return sorted(source for source, targets in TRANSITIONS.items() if target in targets)
+
+
+def transition_error(current, target):
+    """ข้อความ error ถ้าเปลี่ยนจาก current เป็น target ไม่ได้ (None = เปลี่ยนได้)"""
+    if target not in TRANSITIONS[current]:
+        return f'เปลี่ยนสถานะจาก "{STATUS_LABELS[current]}" เป็น "{STATUS_LABELS[target]}" ไม่ได้'
+    return None
+
+
+def restock_orders(order_ids):
+    """
+    คืน stock ของทุกรายการในออร์เดอร์ที่ยกเลิก
+    SELECT ... GROUP BY (ออร์เดอร์, สินค้า) -> UPDATE เดียว -> movement รายออร์เดอร์ด้วย INSERT เดียว
+    """
+    rows = list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values('order_id', 'order__order_number', 'product_id').annotate(total=Sum('quantity')).order_by()
+        .values_list('product_id', 'total', 'order__order_number')
+    )
+    quantities = merge_quantities((pk, total) for pk, total, _ in rows)
+    adjust_stock(quantities, sign=1, guard=False, ledger=False)
+    record_movements('cancel', [(pk, total, number or '') for pk, total, number in rows])
+
+
+def change_order_status(seller, changes):
+    """
+    เปลี่ยนสถานะตาม changes {order_id: สถานะใหม่} เฉพาะออร์เดอร์ที่มีสินค้าของ seller (None = staff ทุกออร์เดอร์)
+    คืน (updated, errors)
+        updated = {order_id: สถานะ} รวมออร์เดอร์ที่อยู่ในสถานะนั้นอยู่แล้ว
+        errors  = {order_id: (code, message)} code เป็น 'not_found' / 'forbidden' / 'invalid_transition'
+    """
+    ids = sorted(changes)
+    if seller is None:
+        owned = Value(True, output_field=BooleanField())
+    else:
+        owned = Exists(OrderSeller.objects.filter(order=OuterRef('pk'), seller=seller))
+    orders = Order.objects.filter(pk__in=ids).annotate(owned=owned).order_by('pk')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            orders = orders.select_for_update()
+        rows = list(orders.values_list('pk', 'status', 'owned', 'order_number', 'customer_id'))
+        current = {pk: (value, is_owner) for pk, value, is_owner, _, _ in rows}
+        numbers = {pk: (number, customer_id) for pk, _, _, number, customer_id in rows}
+
+        updated = {}
+        errors = {}
+        by_target = defaultdict(list)
+        for pk in ids:
+            target = changes[pk]
+            if pk not in current:
+                errors[pk] = ('not_found', 'ไม่พบออร์เดอร์')
+                continue
+            value, is_owner = current[pk]
+            if not is_owner:
+                errors[pk] = ('forbidden', 'ไม่มีสิทธิ์แก้ไขออร์เดอร์นี้')
+            elif value == target:
+                updated[pk] = target
+            elif transition_error(value, target):
+                errors[pk] = ('invalid_transition', transition_error(value, target))
+            else:
+                by_target[target].append(pk)
+
+        now = timezone.now()
+        for target, pks in by_target.items():
+            count = Order.objects.filter(pk__in=pks, status__in=allowed_sources(target)).update(
+                status=target, updated_at=now,
+            )
+            if count != len(pks):
+                raise OrderStatusConflict(target)
+            OrderSeller.objects.filter(order_id__in=pks).update(status=target)
+            updated.update(dict.fromkeys(pks, target))
+        if by_target.get('cancelled'):
+            restock_orders(by_target['cancelled'])
+        order_status_changed(
+            (pk, numbers[pk][0], target, numbers[pk][1]) for target, pks in by_target.items() for pk in pks
+        )
+
+    return updated, errors
@@ -0,0 +1,158 @@
+"""
+Pagination ของ API
+
+HybridPagination ยังเป็น PageNumberPagination ตามเดิม (?page=) แต่ถ้ามี ?cursor=
+(หรือ ?pagination=cursor สำหรับหน้าแรก) จะสลับเป็น keyset pagination
+ที่กรองด้วย (field, id) แทน OFFSET และไม่ COUNT ทั้งตาราง
+หน้าลึก ๆ จึงใช้เวลาเท่ากับหน้าแรก
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination บน (field, id)
+    field ที่ใช้ได้มาจาก view.cursor_ordering_fields หรือ view.ordering_fields
+    view.cursor_field_lookups แปลงชื่อ field เป็น lookup ที่ใช้เรียง/กรองจริง
+    เช่น {'created_at': 'seller_links__created_at'} ให้ seek บน index ของตารางที่ join มา
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_param = api_settings.ORDERING_PARAM
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_allowed_fields(self, view):
+        return getattr(view, 'cursor_ordering_fields', None) or getattr(view, 'ordering_fields', None) or ['created_at']
+
+    def get_ordering(self, request, view):
+        ordering = request.query_params.get(self.ordering_param, '')
+        if ordering.lstrip('-') in self.get_allowed_fields(view):
+            return ordering
+        return getattr(view, 'cursor_default_ordering', self.default_ordering)
+
+    def decode_cursor(self, request, view, model):
+        """
+        (ordering, ค่า field ที่แปลงเป็นชนิดของ model แล้ว, id) จาก ?cursor=
+        cursor ที่แก้มือ / เสีย ทุกแบบได้ 404 (invalid_cursor_message) ไม่หลุดไปถึงฐานข้อมูล
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            ordering, value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, binascii.Error, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(ordering, str) or ordering.lstrip('-') not in self.get_allowed_fields(view):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(pk, int) or isinstance(pk, bool) or value is None:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            value = model._meta.get_field(ordering.lstrip('-')).to_python(value)
+        except (FieldDoesNotExist, ValidationError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return ordering, value, pk
+
+    def encode_cursor(self, ordering, row):
+        field = ordering.lstrip('-')
+        payload = [ordering, _encode_value(_row_value(row, field)), _row_value(row, 'id')]
+        return base64.urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = self.decode_cursor(request, view, queryset.model)
+        self.ordering = cursor[0] if cursor else self.get_ordering(request, view)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        lookups = getattr(view, 'cursor_field_lookups', {})
+        lookup, id_lookup = lookups.get(field, field), lookups.get('id', 'id')
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(prefix + lookup, prefix + id_lookup)
+        if cursor:
+            _, value, pk = cursor
+            op = 'lt' if descending else 'gt'
+            # เงื่อนไข field <= value ซ้ำซ้อนแต่ทำให้ฐานข้อมูล seek เข้า index ได้ตรงตำแหน่ง
+            queryset = queryset.filter(**{f'{lookup}__{op}e': value}).filter(
+                Q(**{f'{lookup}__{op}': value}) | Q(**{lookup: value, f'{id_lookup}__{op}': pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(self.ordering, rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.ordering_param, self.ordering)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HybridPagination(PageNumberPagination):
+    """PageNumberPagination ที่สลับเป็น KeysetPagination เมื่อ client ขอ"""
+    keyset_class = KeysetPagination
+    mode_query_param = 'pagination'
+
+    def use_keyset(self, request):
+        return (
+            self.keyset_class.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_class() if self.use_keyset(request) else None
+        if self.keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
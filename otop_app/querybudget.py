@@ -0,0 +1,98 @@
+"""
+งบจำนวน query ต่อ endpoint และตัวจับ N+1
+
+ทุก view ประกาศงบด้วย @query_budget(n) ทั้ง function view, class view และ view จาก library
+ใส่งบแยกตาม method ได้ เช่น @query_budget(2, patch=5, delete=10)
+งบต้องไม่ขึ้นกับจำนวนแถวในหน้า (รวม query หา user ของ JWT แล้ว)
+query_budget(None) = ไม่จำกัด สำหรับงานแบบ batch ที่จำนวน query โตตามข้อมูล (ยังตรวจ N+1)
+
+QueryBudgetMiddleware นับ query ของทุก request ผ่าน connection.execute_wrapper:
+- เกินงบ -> log warning
+- SQL รูปเดียวกัน (ค่า parameter ต่างกันได้) รันซ้ำตั้งแต่ QUERY_DUPLICATE_THRESHOLD ครั้ง
+  -> log warning เป็น N+1 พร้อม SQL นั้น
+- QUERY_COUNT_HEADER=True (ค่าเริ่มต้นตาม DEBUG) ใส่ X-Query-Count / X-Query-Budget ใน response
+query ที่เกิดตอน stream response (StreamingHttpResponse) ไม่ถูกนับ
+
+QueryBudgetTest ใน tests.py เรียกทุก URL ใน otop_app/urls.py แล้วตรวจด้วย header และ log เดียวกัน
+"""
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+IGNORED_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def query_budget(limit, **methods):
+    """กำหนดงบ query ของ view (limit = ค่าเริ่มต้น, methods = งบของ method นั้น ๆ)"""
+    def decorate(view):
+        view.query_budget = {'default': limit, **{method.upper(): value for method, value in methods.items()}}
+        return view
+    return decorate
+
+
+def get_query_budgets(view_func):
+    """งบที่ view ประกาศไว้ (None = ยังไม่ประกาศ)"""
+    budgets = getattr(view_func, 'query_budget', None)
+    if budgets is None:
+        budgets = getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+    return budgets
+
+
+def get_query_budget(view_func, method):
+    budgets = get_query_budgets(view_func) or {}
+    return budgets.get(method, budgets.get('default'))
+
+
+def sql_shape(sql):
+    """SQL ที่ไม่สนจำนวน parameter ใน IN (...) ใช้จับ query ที่ถูกรันซ้ำต่อแถว"""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryCounter:
+    """execute_wrapper ที่นับ query แยกตามรูปของ SQL"""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(IGNORED_SQL):
+            self.count += 1
+            self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def duplicates(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.query_budget = None
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.report(request, response, counter)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func, request.method)
+
+    def report(self, request, response, counter):
+        budget = request.query_budget
+        for shape, count in counter.duplicates(settings.QUERY_DUPLICATE_THRESHOLD):
+            logger.warning('%s %s: same SQL ran %d times (N+1?): %s', request.method, request.path, count, shape)
+        if budget is not None and counter.count > budget:
+            logger.warning('%s %s: %d queries over budget of %d', request.method, request.path, counter.count, budget)
+        if settings.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = str(counter.count)
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
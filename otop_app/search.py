@@ -0,0 +1,152 @@
+"""
+Inverted index สำหรับค้นหาสินค้า (รองรับภาษาไทย)
+
+ภาษาไทยไม่มีช่องว่างระหว่างคำ จึงตัดข้อความไทยเป็น character bigram
+(เช่น "หอมแดง" -> หอ, อม, มแ, แด, ดง) ซึ่งค้นหาคำย่อยได้ทุกตำแหน่ง
+โดยไม่ต้องพึ่งพจนานุกรม ส่วนคำภาษาอังกฤษ/ตัวเลขเก็บเป็น prefix (edge n-gram)
+เพื่อให้ค้นหาระหว่างพิมพ์ได้
+
+ตาราง SearchToken มี index (token, product) ทำให้การค้นหาเป็น index lookup
+ทั้งบน SQLite และ PostgreSQL การจัดอันดับ (GROUP BY) ทำเฉพาะสินค้าที่มี token ที่พบน้อยที่สุดของคำค้น
+จึงไม่โตตาม posting list ของ bigram/prefix ที่พบบ่อย
+"""
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Subquery, Sum
+from rest_framework import filters
+
+THAI_RE = re.compile(r'[\u0e00-\u0e7f]+')
+WORD_RE = re.compile(r'[\u0e00-\u0e7f]+|[^\W_\u0e00-\u0e7f]+')
+
+MAX_TOKEN_LENGTH = 32
+MIN_PREFIX_LENGTH = 2
+
+# น้ำหนักของแต่ละ field ใช้จัดอันดับผลลัพธ์
+FIELD_WEIGHTS = {
+    'name': 3,
+    'category': 2,
+    'description': 1,
+}
+
+
+def _thai_bigrams(run):
+    if len(run) < 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text):
+    """แปลงข้อความเป็น token สำหรับเก็บลง index"""
+    tokens = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        if THAI_RE.fullmatch(word):
+            tokens.update(_thai_bigrams(word))
+        else:
+            word = word[:MAX_TOKEN_LENGTH]
+            tokens.add(word)
+            for end in range(MIN_PREFIX_LENGTH, len(word)):
+                tokens.add(word[:end])
+    return tokens
+
+
+def tokenize_query(text):
+    """แปลงคำค้นเป็น token (คำอังกฤษใช้ทั้งคำเพราะ index เก็บ prefix ไว้แล้ว)"""
+    tokens = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        if THAI_RE.fullmatch(word):
+            tokens.update(_thai_bigrams(word))
+        else:
+            tokens.add(word[:MAX_TOKEN_LENGTH])
+    return tokens
+
+
+def product_token_weights(name, description, category_name):
+    weights = defaultdict(int)
+    for field, text in (('name', name), ('category', category_name), ('description', description)):
+        for token in tokenize(text):
+            weights[token] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def index_products(products):
+    """สร้าง index ใหม่ให้สินค้าที่ส่งเข้ามา (ลบของเดิมแล้ว bulk insert)"""
+    from .models import SearchToken
+
+    products = list(products)
+    if not products:
+        return
+    rows = []
+    for product in products:
+        weights = product_token_weights(product.name, product.description, product.category_name)
+        rows.extend(
+            SearchToken(product_id=product.pk, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+    with transaction.atomic():
+        SearchToken.objects.filter(product_id__in=[p.pk for p in products]).delete()
+        SearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+def rebuild_index(batch_size=500):
+    """
+    สร้าง index ใหม่ทีละ batch บนระบบที่เปิดใช้งานอยู่ได้: ไม่ลบ token ทั้งตารางก่อน
+    index_products แทน token ของแต่ละ batch ใน transaction เดียว (token ของสินค้าที่ถูกลบหายไปเองด้วย CASCADE)
+    """
+    from .models import Product
+
+    queryset = Product.objects.order_by('pk')
+    batch = []
+    total = 0
+    for product in queryset.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            index_products(batch)
+            total += len(batch)
+            batch = []
+    index_products(batch)
+    return total + len(batch)
+
+
+def search_products(queryset, query):
+    """
+    กรองและจัดอันดับสินค้าจาก index
+    คืนค่า None ถ้าคำค้นสั้นเกินกว่าจะใช้ index ได้ (ให้ผู้เรียก fallback เอง)
+    """
+    tokens = tokenize_query(query)
+    if not tokens or any(len(token) < MIN_PREFIX_LENGTH for token in tokens):
+        return None
+    from .models import SearchToken
+
+    # เริ่มจากสินค้าที่มี token ที่พบน้อยที่สุด (นับบน index (token, product) อย่างเดียว)
+    # GROUP BY ด้านล่างจึงทำแค่กับสินค้าชุดนั้น ไม่ใช่ posting ทั้งหมดของ token ที่พบบ่อย
+    rarest = (
+        SearchToken.objects.filter(token__in=tokens)
+        .values('token').annotate(postings=Count('product_id')).order_by('postings', 'token')
+        .values('token')[:1]
+    )
+    candidates = SearchToken.objects.filter(token=Subquery(rarest)).values('product_id')
+    return (
+        queryset
+        .filter(pk__in=candidates, search_tokens__token__in=tokens)
+        .annotate(search_hits=Count('search_tokens'), search_rank=Sum('search_tokens__weight'))
+        .filter(search_hits=len(tokens))
+        .order_by('-search_rank', '-created_at', '-pk')
+    )
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter ที่ใช้ inverted index แทน icontains
+    ผลลัพธ์เรียงตามคะแนน (OrderingFilter ที่ตามมายัง override ได้ด้วย ?ordering=)
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        results = search_products(queryset, query)
+        if results is None:
+            return super().filter_queryset(request, queryset, view)
+        return results
@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import models, transaction
 from rest_framework import serializers
-from .models import Product, Category, Seller, Order, OrderItem, ProductReview
+from .cache import get_product_payloads, set_product_payloads
+from .customers import link_guest_orders
+from .denormalize import link_order_sellers
+from .inventory import merge_quantities, reserve_stock
+from .jobs import enqueue
+from .models import Product, Category, Seller, Order, OrderItem, OrderSeller, ProductReview
+from .sparse import SparseFieldsSerializerMixin
 
 
 # ---------------- Category ----------------
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['updated_at']
 
 # ---------------- Seller ----------------
 class SellerSerializer(serializers.ModelSerializer):
@@ -16,39 +24,94 @@ class SellerSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'phone', 'is_verified']
 
 # ---------------- Product ----------------
-class ProductSerializer(serializers.ModelSerializer):
-    category_name = serializers.CharField(source='category.name', read_only=True)
-    seller_name = serializers.CharField(source='seller.name', read_only=True)
+class ProductListSerializer(serializers.ListSerializer):
+    """ประกอบรายการสินค้าจาก payload ใน cache (get_many ครั้งเดียว)"""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(items)
+        if self.child.sparse_fields is not None:
+            # payload ใน cache เป็นแบบเต็ม ส่วน instance ที่โหลดด้วย .only() สร้างแบบเต็มไม่ได้
+            return [self.child.to_representation(item) for item in items]
+        cached = get_product_payloads([item.pk for item in items])
+        missing = {}
+        result = []
+        for item in items:
+            payload = cached.get(item.pk)
+            if payload is None:
+                payload = missing[item.pk] = self.child.build_payload(item)
+            result.append(self.child.with_image_url(payload))
+        set_product_payloads(missing)
+        return result
+
+
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    category_name = serializers.CharField(read_only=True)
+    seller_name = serializers.CharField(read_only=True)
+
+    sparse_sources = {
+        'id': ['id'],
+        'category_name': ['category_name'],
+        'seller_name': ['seller_name'],
+        'name': ['name'],
+        'description': ['description'],
+        'price': ['price'],
+        'image': ['image'],
+        'stock': ['stock'],
+        'created_at': ['created_at'],
+        'updated_at': ['updated_at'],
+        'category': ['category_id', 'category_name'],
+        'seller': ['seller_id', 'seller_name'],
+        'is_available': ['is_active'],
+    }
+    sparse_field_names = {'is_available': 'is_active'}
     
     class Meta:
         model = Product
         fields = '__all__'
         read_only_fields = ['seller']
+        list_serializer_class = ProductListSerializer
     
     def to_representation(self, instance):
-        """แปลง output ให้เหมาะกับ Flutter"""
-        data = super().to_representation(instance)
+        """แปลง output ให้เหมาะกับ Flutter (ใช้ payload จาก cache ถ้ามี)"""
+        if self.sparse_fields is not None:
+            return self.with_image_url(self.build_payload(instance))
+        payload = get_product_payloads([instance.pk]).get(instance.pk)
+        if payload is None:
+            payload = self.build_payload(instance)
+            set_product_payloads({instance.pk: payload})
+        return self.with_image_url(payload)
+
+    def build_payload(self, instance):
+        """payload ที่ไม่ขึ้นกับ request (image ยังเป็น path) สำหรับเก็บใน cache"""
+        data = dict(super().to_representation(instance))
         
         # เปลี่ยน category จาก ID เป็น name
-        data['category'] = instance.category.name if instance.category else None
+        if 'category' in data:
+            data['category'] = instance.category_name
         
         # เปลี่ยน seller จาก ID เป็น name  
-        data['seller'] = instance.seller.name if instance.seller else None
+        if 'seller' in data:
+            data['seller'] = instance.seller_name
         
         # แปลง is_active เป็น is_available
-        data['is_available'] = data.pop('is_active', True)
+        if 'is_active' in data:
+            data['is_available'] = data.pop('is_active')
         
+        if 'image' in data:
+            data['image'] = instance.image.url if instance.image else None
+        return data
+
+    def with_image_url(self, payload):
         # จัดการ image URL - ให้ full URL
-        if instance.image:
+        data = dict(payload)
+        if data.get('image'):
             request = self.context.get('request')
             if request:
-                data['image'] = request.build_absolute_uri(instance.image.url)
+                data['image'] = request.build_absolute_uri(data['image'])
             else:
                 # Fallback สำหรับกรณีไม่มี request context
-                data['image'] = f"http://127.0.0.1:8000{instance.image.url}" if instance.image.url else None
-        else:
-            data['image'] = None
-            
+                data['image'] = f"http://127.0.0.1:8000{data['image']}"
         return data
 
 # ---------------- OrderItem ----------------
@@ -60,15 +123,32 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 class CreateOrderItemSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
     price = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 # ---------------- Order ----------------
-class OrderSerializer(serializers.ModelSerializer):
+def order_items_prefetch():
+    return models.Prefetch(
+        'items',
+        queryset=OrderItem.objects.select_related('product').only(
+            'id', 'order_id', 'product_id', 'product__name', 'quantity', 'price'
+        ).order_by('id'),
+    )
+
+class OrderSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
+
+    sparse_sources = {
+        name: [name]
+        for name in ['id', 'customer_name', 'customer_phone', 'customer_email', 'total_amount',
+                     'shipping_address', 'payment_method', 'status', 'created_at', 'order_number']
+    }
+    # items ส่งมาเสมอถ้าไม่ระบุ ?fields= ถ้าระบุแล้วต้องขอเอง (?fields=...&expand=items)
+    sparse_prefetch = {'items': order_items_prefetch}
+
     class Meta:
         model = Order
-        fields = ['id','customer_name','customer_phone','customer_email','total_amount','shipping_address','payment_method','status','created_at','items']
+        fields = ['id','order_number','customer_name','customer_phone','customer_email','total_amount','shipping_address','payment_method','status','created_at','items']
 
 class CreateOrderSerializer(serializers.Serializer):
     customer_name = serializers.CharField(max_length=200, default='Customer')
@@ -77,30 +157,67 @@ class CreateOrderSerializer(serializers.Serializer):
     shipping_address = serializers.CharField()
     payment_method = serializers.ChoiceField(choices=Order.PAYMENT_CHOICES)
     items = CreateOrderItemSerializer(many=True)
+    # token ของตะกร้าที่ hold สินค้าไว้ (POST /api/cart/holds/)
+    hold_token = serializers.CharField(max_length=64, required=False, write_only=True)
 
     def create(self, validated_data):
+        """
+        สร้างออร์เดอร์ด้วยจำนวน query คงที่ไม่ว่าจะมีกี่รายการ:
+        ตัด stock (UPDATE เดียว + INSERT movement) -> โหลดสินค้า (in_bulk) -> INSERT order -> bulk_create items
+        -> INSERT ผู้ขายของออร์เดอร์ -> INSERT job
+        ต้องเรียกภายใน transaction.atomic() สินค้าไม่พอจะ raise InsufficientStock
+        """
         print(f"Creating order with validated data: {validated_data}")
         items_data = validated_data.pop('items')
-        total_amount = 0
-        order_items = []
-
-        for item_data in items_data:
-            try:
-                product = Product.objects.get(id=item_data['product_id'])
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Product with id {item_data['product_id']} does not exist")
-            quantity = item_data['quantity']
-            price = float(item_data['price'])
-            total_amount += price * quantity
-            order_items.append({'product': product,'quantity': quantity,'price': price})
+        hold_token = validated_data.pop('hold_token', None)
+        reserve_stock(
+            merge_quantities((item['product_id'], item['quantity']) for item in items_data),
+            hold_token, reference=validated_data.get('order_number') or '',
+        )
+        products = Product.objects.in_bulk([item['product_id'] for item in items_data])
 
+        total_amount = sum(item['price'] * item['quantity'] for item in items_data)
         order = Order.objects.create(total_amount=total_amount, **validated_data)
-        for item_data in order_items:
-            OrderItem.objects.create(order=order, **item_data)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[item['product_id']], quantity=item['quantity'], price=item['price'])
+            for item in items_data
+        ])
+        link_order_sellers(OrderSeller, [(order, seller_id) for seller_id in sorted({p.seller_id for p in products.values()})])
+        # งานหลังสร้างออร์เดอร์ทำใน worker (manage.py run_jobs) ไม่ทำใน request
+        enqueue('order.created', {'order_id': order.id})
         
         print(f"Order created successfully: {order.id}")
         return order
 
+class OrderStatusChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    orders = OrderStatusChangeSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_orders(self, value):
+        ids = [change['id'] for change in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('มี id ออร์เดอร์ซ้ำกัน')
+        return value
+
+# ---------------- Cart (stock hold) ----------------
+class HoldItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class PlaceHoldSerializer(serializers.Serializer):
+    token = serializers.CharField(max_length=64, required=False)
+    items = HoldItemSerializer(many=True, allow_empty=False, max_length=settings.STOCK_HOLD_MAX_ITEMS)
+
+    def validate_items(self, value):
+        # รวมรายการสินค้าซ้ำก่อนเทียบเพดานต่อรายการ
+        quantities = merge_quantities((item['product_id'], item['quantity']) for item in value)
+        if max(quantities.values()) > settings.STOCK_HOLD_MAX_QUANTITY:
+            raise serializers.ValidationError(f'กันสินค้าได้ไม่เกิน {settings.STOCK_HOLD_MAX_QUANTITY} ชิ้นต่อรายการ')
+        return value
+
 # ---------------- User ----------------
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, min_length=6)
@@ -122,11 +239,14 @@ class RegisterSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         print(f"Creating user with validated data: {validated_data}")
         try:
-            user = User.objects.create_user(
-                username=validated_data['username'], 
-                email=validated_data.get('email', ''), 
-                password=validated_data['password']
-            )
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=validated_data['username'], 
+                    email=validated_data.get('email', ''), 
+                    password=validated_data['password']
+                )
+                # ออร์เดอร์ที่สั่งแบบแขกด้วยอีเมลนี้ก่อนสมัคร ให้เห็นในประวัติทันที
+                link_guest_orders(user)
             print(f"User created successfully: {user.username}")
             return user
         except Exception as e:
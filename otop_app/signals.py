@@ -0,0 +1,140 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_products
+from .ledger import record_movements
+from .denormalize import link_order_sellers
+from .events import order_status_changed
+from .models import Category, Order, OrderItem, OrderSeller, Product, Seller
+from .search import index_products
+
+PRODUCT_SEARCH_FIELDS = ('name', 'description', 'category_name')
+PRODUCT_PARENT_FIELDS = ('category_id', 'seller_id')
+
+
+def _snapshot(instance, fields):
+    # อ่านจาก __dict__ เพื่อไม่ให้ field ที่ถูก defer ไปยิง query เพิ่ม
+    return tuple(instance.__dict__.get(field) for field in fields)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_fields(sender, instance, **kwargs):
+    instance._search_snapshot = _snapshot(instance, PRODUCT_SEARCH_FIELDS)
+    instance._parent_snapshot = _snapshot(instance, PRODUCT_PARENT_FIELDS)
+    instance._stock_snapshot = instance.__dict__.get('stock')
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._status_snapshot = instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=Seller)
+def remember_name(sender, instance, **kwargs):
+    instance._name_snapshot = instance.__dict__.get('name')
+
+
+# ---------- Denormalized names ----------
+@receiver(pre_save, sender=Product)
+def copy_parent_names(sender, instance, **kwargs):
+    snapshot = _snapshot(instance, PRODUCT_PARENT_FIELDS)
+    if instance._state.adding or snapshot != instance._parent_snapshot:
+        instance.category_name = instance.category.name
+        instance.seller_name = instance.seller.name
+    instance._parent_snapshot = snapshot
+
+
+@receiver(post_save, sender=Category)
+def propagate_category_name(sender, instance, created, **kwargs):
+    if not created and instance.name != instance._name_snapshot:
+        # UPDATE ครั้งเดียวทั้งหมวด และขยับ updated_at ให้ ETag ของสินค้าเปลี่ยนตาม
+        products = Product.objects.filter(category=instance)
+        products.update(category_name=instance.name, updated_at=timezone.now())
+        index_products(products.only('id', 'name', 'description', 'category_name'))
+    instance._name_snapshot = instance.name
+
+
+@receiver(post_save, sender=Seller)
+def propagate_seller_name(sender, instance, created, **kwargs):
+    if not created and instance.name != instance._name_snapshot:
+        Product.objects.filter(seller=instance).update(seller_name=instance.name, updated_at=timezone.now())
+    instance._name_snapshot = instance.name
+
+
+# ---------- Order <-> Seller ----------
+@receiver(post_save, sender=Order)
+def copy_order_status(sender, instance, created, **kwargs):
+    # แก้สถานะผ่าน save() (เช่น admin list_editable) ให้สำเนาใน OrderSeller ตรงกัน
+    if not created and instance.status != instance._status_snapshot:
+        OrderSeller.objects.filter(order=instance).update(status=instance.status)
+        order_status_changed([(instance.pk, instance.order_number, instance.status, instance.customer_id)])
+    instance._status_snapshot = instance.status
+
+
+@receiver(post_save, sender=OrderItem)
+def link_item_seller(sender, instance, created, **kwargs):
+    # รายการที่เพิ่มทีละแถว (admin inline) ตอนสร้างออร์เดอร์ใช้ bulk_create แล้วสร้าง OrderSeller เอง
+    if created:
+        link_order_sellers(OrderSeller, [(instance.order, instance.product.seller_id)])
+
+
+# ---------- Inventory ledger ----------
+@receiver(pre_save, sender=Product)
+def lock_stock_edit(sender, instance, **kwargs):
+    """
+    แก้ stock ผ่าน save() (admin list_editable, API ของผู้ขาย) เป็นการตั้งยอดตามที่กรอก (absolute)
+    ล็อกแถว (Product.save อยู่ใน transaction) อ่านยอดปัจจุบัน แล้วบันทึก ยอดใหม่ - ยอดปัจจุบัน ลงสมุด
+    ถ้าไม่ได้แก้ stock ใช้ยอดปัจจุบันแทนค่าที่โหลดไว้ ไม่เขียนทับยอดที่ออร์เดอร์ตัดไประหว่างเปิดฟอร์ม
+    """
+    instance._stock_delta = 0
+    if instance._state.adding or instance._stock_snapshot is None or not isinstance(instance.stock, int):
+        return
+    current = Product.objects.select_for_update().filter(pk=instance.pk).values_list('stock', flat=True).first()
+    if current is None:
+        return
+    if instance.stock == instance._stock_snapshot:
+        instance.stock = current
+    else:
+        instance._stock_delta = instance.stock - current
+
+
+@receiver(post_save, sender=Product)
+def record_stock_edit(sender, instance, created, **kwargs):
+    reference = getattr(instance, '_stock_reference', '')
+    if created:
+        record_movements('restock', [(instance.pk, instance.stock, reference)])
+    elif instance._stock_delta:
+        reason = 'restock' if instance._stock_delta > 0 else 'adjustment'
+        record_movements(reason, [(instance.pk, instance._stock_delta, reference)])
+        instance._stock_delta = 0
+    instance._stock_snapshot = instance.stock
+
+
+# ---------- Search index ----------
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, created, **kwargs):
+    snapshot = _snapshot(instance, PRODUCT_SEARCH_FIELDS)
+    if created or snapshot != instance._search_snapshot:
+        index_products([instance])
+    instance._search_snapshot = snapshot
+
+
+# ---------- Product payload cache ----------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_payload(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_payloads(sender, instance, **kwargs):
+    invalidate_products(Product.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def invalidate_seller_payloads(sender, instance, **kwargs):
+    invalidate_products(Product.objects.filter(seller_id=instance.pk).values_list('pk', flat=True))
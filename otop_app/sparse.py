@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets: ?fields=id,name,price,image,stock และ ?expand=items
+
+field ที่ไม่ได้ขอจะถูกตัดออกจาก serializer และไม่ถูก SELECT ด้วย
+serializer บอกว่าแต่ละ field ใช้ column ไหน (sparse_sources) และต้อง prefetch อะไร
+(sparse_prefetch) แล้ว view แปลงเป็น .only() / prefetch_related() ให้
+ถ้าไม่ส่ง ?fields= จะได้ output เต็มเหมือนเดิม
+"""
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def parse_sparse_fields(request):
+    """คืน set ของ field ที่ขอ (รวม ?expand=) หรือ None ถ้าไม่ได้ส่ง ?fields="""
+    params = getattr(request, 'query_params', request.GET)
+    if FIELDS_PARAM not in params:
+        return None
+    return _split(params.get(FIELDS_PARAM)) | _split(params.get(EXPAND_PARAM))
+
+
+def apply_sparse_fields(serializer_class, queryset, fields, columns=('id',)):
+    """ตัด column ด้วย .only() และ prefetch เฉพาะ relation ที่ถูกขอ"""
+    prefetch = getattr(serializer_class, 'sparse_prefetch', {})
+    for name in sorted(prefetch):
+        if fields is None or name in fields:
+            queryset = queryset.prefetch_related(prefetch[name]())
+    if fields is None:
+        return queryset
+
+    columns = set(columns)
+    for name in fields:
+        columns.update(serializer_class.sparse_sources.get(name, ()))
+    return queryset.only(*sorted(columns))
+
+
+def trim_fields(payloads, fields):
+    """ตัด key ที่ไม่ได้ขอออกจาก dict ที่สร้างเอง (fast path / archive) ให้ตรงกับ serializer"""
+    if fields is None:
+        return payloads
+    keep = fields | {'id'}
+    return [{name: value for name, value in payload.items() if name in keep} for payload in payloads]
+
+
+class SparseFieldsSerializerMixin:
+    """ตัด field ที่ไม่ได้ขอ (context['fields']) ออกจาก serializer"""
+    # ชื่อ field ใน output -> column ของ model ที่ต้องโหลด
+    sparse_sources = {}
+    # ชื่อ field ใน output -> callable คืน Prefetch
+    sparse_prefetch = {}
+    # ชื่อใน output ที่ไม่ตรงกับชื่อ field ของ serializer
+    sparse_field_names = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = self.context.get('fields')
+        if self.sparse_fields is None:
+            return
+        keep = {self.sparse_field_names.get(name, name) for name in self.sparse_fields} | {'id'}
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class SparseFieldsViewMixin:
+    """อ่าน ?fields= / ?expand= แล้วส่งต่อให้ serializer และ queryset"""
+    # column ที่ต้องโหลดเสมอ (เช่น field ที่ pagination ใช้ทำ cursor)
+    sparse_columns = ('id', 'created_at')
+
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = parse_sparse_fields(self.request)
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return apply_sparse_fields(self.get_serializer_class(), queryset, self.get_sparse_fields(), self.sparse_columns)
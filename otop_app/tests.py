@@ -1,13 +1,1617 @@
+import asyncio
+import base64
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
 from rest_framework import status
-from django.contrib.auth.models import User
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import check_cache, get_product_payloads
+from .denormalize import backfill_order_sellers
+from .events import RedisSubscription, check_broker, event_stream, get_broker
+from .facets import compute_facets
+from .inventory import InsufficientStock, reserve_stock
+from .importer import import_storage
+from .jobs import claim_jobs, handlers, job_handler, requeue_stale_jobs, run_job
+from .ledger import compact_snapshots, find_drift, record_movements
+from .management.commands.stress_orders import run_stress
+from .models import (
+    Category, Seller, Product, Order, OrderItem, ProductReview, SearchToken, IdempotencyKey, Job, StockHold,
+    InventoryMovement, InventorySnapshot, OrderSeller, ArchivedOrder, ArchivedOrderItem, ArchivedOrderSeller,
+)
+from .order_numbers import OrderNumberAllocator, allocate_order_number, format_order_number
+from .pagination import KeysetPagination
+from .querybudget import get_query_budgets
+from .search import tokenize
+from .views import CartHoldThrottle, events_channels
+
+def create_catalog(test):
+    """สร้างข้อมูลตัวอย่างที่ test หลายตัวใช้ร่วมกัน"""
+    test.category = Category.objects.create(name='อาหารแปรรูป')
+    test.seller_user = User.objects.create_user(username='seller', password='test1234', email='seller@example.com')
+    test.seller = Seller.objects.create(user=test.seller_user, name='วิไลเกษตรกร', phone='0812345678', address='ศรีสะเกษ')
+    test.shallot = Product.objects.create(
+        name='หอมแดงศรีสะเกษ', description='หอมแดงคุณภาพดี รสหวานกรอบ', price='45.00',
+        category=test.category, seller=test.seller, stock=50,
+    )
+    test.garlic = Product.objects.create(
+        name='กระเทียมไทย', description='กระเทียมสดใหม่ กลิ่นหอมแดงไม่มี', price='80.00',
+        category=test.category, seller=test.seller, stock=30,
+    )
+    test.coffee = Product.objects.create(
+        name='Doi Chang Coffee', description='คั่วกลาง', price='250.00',
+        category=test.category, seller=test.seller, stock=10,
+    )
+
 
 class ProductAPITest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='test', password='test1234')
 
     def test_product_list(self):
-        url = reverse('product-list')
+        url = reverse('otop_api:product-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.url = reverse('otop_api:product-list')
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['name'] for row in response.data['results']]
+
+    def test_tokenize_thai_and_latin(self):
+        tokens = tokenize('หอมแดง Coffee')
+        self.assertTrue({'หอ', 'อม', 'มแ', 'แด', 'ดง'} <= tokens)
+        self.assertTrue({'co', 'cof', 'coffee'} <= tokens)
+
+    def test_thai_substring_ranked_by_field_weight(self):
+        # ชื่อสินค้ามีน้ำหนักมากกว่าคำอธิบาย
+        self.assertEqual(self.search('หอมแดง'), ['หอมแดงศรีสะเกษ', 'กระเทียมไทย'])
+
+    def test_prefix_search_while_typing(self):
+        self.assertEqual(self.search('coff'), ['Doi Chang Coffee'])
+
+    def test_unknown_token_matches_nothing(self):
+        self.assertEqual(self.search('หอมแดง zzz'), [])
+
+    def test_index_follows_product_and_category_changes(self):
+        self.coffee.name = 'Arabica'
+        self.coffee.save()
+        self.assertEqual(self.search('coff'), [])
+        self.category.name = 'ของฝาก'
+        self.category.save()
+        self.assertEqual(len(self.search('ของฝาก')), 3)
+
+    def test_deleted_product_leaves_index(self):
+        self.coffee.delete()
+        self.assertFalse(SearchToken.objects.filter(product_id=self.coffee.pk).exists())
+
+    def test_ordering_param_overrides_rank(self):
+        self.assertEqual(self.search('หอมแดง', ordering='-price'), ['กระเทียมไทย', 'หอมแดงศรีสะเกษ'])
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        for i in range(45):
+            Product.objects.create(
+                name=f'สินค้า {i}', description='-', price=f'{i % 7}.00',
+                category=self.category, seller=self.seller, stock=1,
+            )
+        self.url = reverse('otop_api:product-list')
+
+    def walk(self, **params):
+        ids = []
+        response = self.client.get(self.url, {'pagination': 'cursor', **params})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(response.data['next'])
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_walks_created_at_order_without_gaps(self):
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_walks_price_order_with_ties(self):
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk(ordering='price'), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_payloads(self):
+        payloads = [
+            [1, 'x', 1], ['-created_at', 'garbage', 1], ['-created_at', None, 1], ['-created_at', '2026-01-01T00:00:00+07:00', 'x'],
+            ['price', 'abc', 1], ['price', [1], 1], ['name', 'x', 1], {'a': 1},
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                cursor = base64.urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_unchanged(self):
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.data['count'], 48)
+        self.assertEqual(len(response.data['results']), 20)
+
+
+class ProductPayloadCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        create_catalog(self)
+        self.url = reverse('otop_api:product-list')
+
+    def names(self):
+        return {row['id']: row['seller'] for row in self.client.get(self.url).data['results']}
+
+    def test_list_served_from_cache(self):
+        first = self.client.get(self.url).data['results']
+        self.assertEqual(len(get_product_payloads([self.shallot.pk, self.garlic.pk, self.coffee.pk])), 3)
+        self.assertEqual(self.client.get(self.url).data['results'], first)
+        self.assertTrue(first[0]['image'] is None)
+
+    def test_seller_rename_invalidates(self):
+        self.names()
+        self.seller.name = 'ร้านใหม่'
+        self.seller.save()
+        self.assertEqual(set(self.names().values()), {'ร้านใหม่'})
+
+    def test_product_save_invalidates(self):
+        self.client.get(reverse('otop_api:product-detail', args=[self.coffee.pk]))
+        self.coffee.price = '199.00'
+        self.coffee.save()
+        response = self.client.get(reverse('otop_api:product-detail', args=[self.coffee.pk]))
+        self.assertEqual(response.data['price'], '199.00')
+
+
+    def test_production_requires_shared_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            with self.assertRaises(ImproperlyConfigured):
+                check_cache()
+        with override_settings(DEBUG=True, CACHES=locmem):
+            check_cache()
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+
+    def revalidate(self, url, **params):
+        first = self.client.get(url, params)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        return first, second, ctx
+
+    def test_product_list_not_modified(self):
+        first, second, ctx = self.revalidate(reverse('otop_api:product-list'), search='หอมแดง')
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+        # COUNT ของ page number + หน้าแบบ id/updated_at เท่านั้น
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_product_list_etag_changes_with_catalog(self):
+        url = reverse('otop_api:product-list')
+        etag = self.client.get(url)['ETag']
+        self.category.name = 'ของฝาก'
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.coffee.delete()
+        self.assertNotEqual(self.client.get(url)['ETag'], response['ETag'])
+
+    def test_product_detail_last_modified(self):
+        url = reverse('otop_api:product-detail', args=[self.coffee.pk])
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(reverse('otop_api:product-detail', args=[999])).status_code, 404)
+
+    def test_category_list_not_modified(self):
+        first, second, ctx = self.revalidate(reverse('otop_api:category-list'))
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn('updated_at', first.data['results'][0])
+
+
+class FastPathSerializerTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.coffee.image = 'products/coffee.jpg'
+        self.coffee.save()
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        for n in range(3):
+            order = Order.objects.create(
+                customer=self.customer, customer_email='buyer@example.com', total_amount='125.00',
+                shipping_address='ศรีสะเกษ', payment_method='cod',
+            )
+            OrderItem.objects.create(order=order, product=self.shallot, quantity=n + 1, price='45.00')
+            OrderItem.objects.create(order=order, product=self.garlic, quantity=1, price='80.00')
+
+    def assertSameBytes(self, url, **params):
+        slow = self.client.get(url, params)
+        with self.settings(FAST_LIST_SERIALIZERS=True):
+            fast = self.client.get(url, params)
+        self.assertEqual(slow.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_product_list_identical(self):
+        self.assertSameBytes(reverse('otop_api:product-list'))
+        self.assertSameBytes(reverse('otop_api:product-list'), search='หอมแดง', pagination='cursor')
+
+    def test_order_list_identical(self):
+        self.client.force_authenticate(self.customer)
+        self.assertSameBytes(reverse('otop_api:order-list'))
+
+
+class FacetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        create_catalog(self)
+        self.other_category = Category.objects.create(name='หัตถกรรม')
+        Product.objects.create(
+            name='ผ้าไหมไทยแท้', description='ผ้าไหมทอมือ', price='1200.00',
+            category=self.other_category, seller=self.seller, stock=15,
+        )
+        self.url = reverse('otop_api:product-list')
+
+    def test_facets_over_whole_result_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            facets = compute_facets(Product.objects.filter(is_active=True))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([(row['name'], row['count']) for row in facets['category']], [('อาหารแปรรูป', 3), ('หัตถกรรม', 1)])
+        self.assertEqual(facets['seller'][0]['count'], 4)
+        self.assertEqual([(row['key'], row['count']) for row in facets['price']], [('0-100', 2), ('100-500', 1), ('1000+', 1)])
+
+    def test_facets_follow_search_and_ignore_page(self):
+        response = self.client.get(self.url, {'search': 'หอมแดง', 'facets': '1', 'ordering': 'price', 'page_size': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['facets']['category'], [{'id': self.category.pk, 'name': 'อาหารแปรรูป', 'count': 2}])
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url, {'search': 'หอมแดง', 'facets': '1', 'page': 1})
+        self.assertEqual(cached.data['facets'], response.data['facets'])
+        self.assertFalse(any('CASE WHEN' in q['sql'] for q in ctx.captured_queries))
+
+    def test_no_facets_by_default(self):
+        self.assertNotIn('facets', self.client.get(self.url).data)
+
+
+
+class QueryPlanTest(APITestCase):
+    """
+    รัน endpoint จริงแล้ว EXPLAIN ทุก SELECT ที่เกิดขึ้น
+    fail ถ้ามี full table scan หรือ sort ด้วย temp B-tree (ต้องมี index รองรับ)
+    """
+
+    def setUp(self):
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        order = Order.objects.create(
+            customer=self.customer, customer_email='buyer@example.com', total_amount='45.00',
+            shipping_address='ศรีสะเกษ', payment_method='cod',
+        )
+        OrderItem.objects.create(order=order, product=self.shallot, quantity=1, price='45.00')
+        ProductReview.objects.create(product=self.shallot, user=self.customer, rating=5)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # ตารางใน test เล็กมาก ต้องปิด seq scan / sort ไม่งั้น planner เลือกเองเสมอ
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def bad_plan_lines(self, sql, plan):
+        if connection.vendor == 'postgresql':
+            pattern = re.compile(r'Seq Scan|(?<!Incremental )\bSort\b')
+            return [line for line in plan.splitlines() if pattern.search(line)]
+        bad = []
+        for line in plan.splitlines():
+            if 'USE TEMP B-TREE' in line:
+                bad.append(line)
+            scan = re.search(r'\bSCAN (\S+)$', line)
+            # SQLite แสดงการไล่ตาม primary key (rowid) พร้อม LIMIT เป็น "SCAN table" เฉย ๆ
+            if scan and not re.search(rf'ORDER BY "{scan.group(1)}"."id" (ASC|DESC) LIMIT', sql):
+                bad.append(line)
+        return bad
+
+    def assertIndexedEndpoint(self, url, user=None, **params):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertEqual(self.bad_plan_lines(sql, plan), [], f'{url} {params}\n{sql}\n{plan}')
+        return response
+
+    def test_product_list(self):
+        url = reverse('otop_api:product-list')
+        self.assertIndexedEndpoint(url)
+        self.assertIndexedEndpoint(url, ordering='price')
+        for ordering in ('-created_at', 'price', '-price'):
+            first = self.client.get(url, {'pagination': 'cursor', 'ordering': ordering})
+            cursor = KeysetPagination().encode_cursor(ordering, Product.objects.get(pk=first.data['results'][0]['id']))
+            self.assertIndexedEndpoint(url, cursor=cursor)
+
+    def test_product_detail_and_reviews(self):
+        self.assertIndexedEndpoint(reverse('otop_api:product-detail', args=[self.shallot.pk]))
+        self.assertIndexedEndpoint(reverse('otop_api:product-review-list-create', args=[self.shallot.pk]), self.customer)
+
+    def test_categories(self):
+        self.assertIndexedEndpoint(reverse('otop_api:category-list'))
+
+    def test_seller_products(self):
+        self.assertIndexedEndpoint(reverse('otop_api:seller-product-list'), self.seller_user)
+
+    def test_customer_orders(self):
+        self.assertIndexedEndpoint(reverse('otop_api:order-list'), self.customer)
+        self.assertIndexedEndpoint(reverse('otop_api:my-order-list'), self.customer)
+        self.assertIndexedEndpoint(reverse('otop_api:get-orders'), self.customer)
+
+    def test_seller_orders(self):
+        # อ่านผ่าน OrderSeller (seller, created_at) ไม่ต้อง join OrderItem / Product + DISTINCT
+        url = reverse('otop_api:seller-order-list')
+        self.assertIndexedEndpoint(url, self.seller_user)
+        self.assertIndexedEndpoint(url, self.seller_user, status='pending')
+        first = self.client.get(url, {'pagination': 'cursor'})
+        cursor = KeysetPagination().encode_cursor('-created_at', Order.objects.get(pk=first.data['results'][0]['id']))
+        self.assertIndexedEndpoint(url, self.seller_user, cursor=cursor)
+        self.assertIndexedEndpoint(reverse('otop_api:order-list'), self.seller_user, cursor=cursor)
+
+
+class ProductBatchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        create_catalog(self)
+        self.coffee.is_active = False
+        self.coffee.save()
+        self.url = reverse('otop_api:product-batch')
+
+    def test_batch_in_request_order_with_one_query(self):
+        ids = f'{self.garlic.pk},999,{self.coffee.pk},{self.shallot.pk}'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'ids': ids})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([row['id'] for row in response.data['data']], [self.garlic.pk, self.shallot.pk])
+        self.assertEqual(response.data['inactive'], [self.coffee.pk])
+        self.assertEqual(response.data['missing'], [999])
+        detail = self.client.get(reverse('otop_api:product-detail', args=[self.garlic.pk]))
+        self.assertEqual(response.data['data'][0], detail.data)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {'ids': ids})
+        self.assertEqual(len(ctx.captured_queries), 1)  # เหลือแค่ id 999 ที่ไม่มีใน cache
+
+    def test_limits(self):
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        ids = ','.join(str(n) for n in range(1, 52))
+        self.assertEqual(self.client.get(self.url, {'ids': ids}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DenormalizedNameTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+
+    def test_names_copied_on_create_and_move(self):
+        self.assertEqual((self.coffee.category_name, self.coffee.seller_name), ('อาหารแปรรูป', 'วิไลเกษตรกร'))
+        other = Category.objects.create(name='เครื่องดื่ม')
+        self.coffee.category = other
+        self.coffee.save()
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).category_name, 'เครื่องดื่ม')
+
+    def test_rename_is_one_bulk_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.seller.name = 'ร้านใหม่'
+            self.seller.save()
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "otop_app_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Product.objects.values_list('seller_name', flat=True)), {'ร้านใหม่'})
+
+    def test_product_list_reads_one_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('otop_api:product-list'))
+        self.assertEqual(response.data['results'][0]['category'], 'อาหารแปรรูป')
+        self.assertFalse(any('JOIN' in q['sql'] for q in ctx.captured_queries))
+
+    def test_check_command_repairs_drift(self):
+        Product.objects.filter(pk=self.garlic.pk).update(category_name='ผิด', seller_name='ผิด')
+        out = StringIO()
+        call_command('check_product_names', stdout=out)
+        self.assertIn('category_name: 1 drifted', out.getvalue())
+        call_command('check_product_names', '--repair', stdout=out)
+        self.garlic.refresh_from_db()
+        self.assertEqual((self.garlic.category_name, self.garlic.seller_name), ('อาหารแปรรูป', 'วิไลเกษตรกร'))
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        order = Order.objects.create(
+            customer=self.customer, customer_email='buyer@example.com', total_amount='45.00',
+            shipping_address='ศรีสะเกษ', payment_method='cod',
+        )
+        OrderItem.objects.create(order=order, product=self.shallot, quantity=1, price='45.00')
+        self.client.force_authenticate(self.customer)
+
+    def test_product_grid_skips_description_column(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('otop_api:product-list'), {'fields': 'id,name,price,image,stock,is_available'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price', 'image', 'stock', 'is_available'})
+        self.assertFalse(any('"description"' in q['sql'] for q in ctx.captured_queries))
+        self.assertIsNone(get_product_payloads([self.shallot.pk]).get(self.shallot.pk))  # ไม่เก็บ payload บางส่วนลง cache
+
+    def test_product_without_fields_unchanged(self):
+        response = self.client.get(reverse('otop_api:product-detail', args=[self.coffee.pk]))
+        self.assertIn('description', response.data)
+        sparse = self.client.get(reverse('otop_api:product-detail', args=[self.coffee.pk]), {'fields': 'name,category'})
+        self.assertEqual(sparse.data, {'id': self.coffee.pk, 'name': 'Doi Chang Coffee', 'category': 'อาหารแปรรูป'})
+
+    def test_order_items_only_when_expanded(self):
+        url = reverse('otop_api:order-list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'fields': 'id,status'})
+        self.assertEqual(response.data['results'][0], {'id': Order.objects.get().pk, 'status': 'pending'})
+        self.assertFalse(any('otop_app_orderitem' in q['sql'] for q in ctx.captured_queries))
+
+        response = self.client.get(url, {'fields': 'id', 'expand': 'items'})
+        self.assertEqual(response.data['results'][0]['items'][0]['product_name'], 'หอมแดงศรีสะเกษ')
+        self.assertIn('items', self.client.get(url).data['results'][0])
+
+
+class StockReservationTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.url = reverse('otop_api:create-order')
+
+    def order(self, *items):
+        return self.client.post(self.url, {
+            'shipping_address': 'ศรีสะเกษ',
+            'payment_method': 'cod',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': str(product.price)} for product, quantity in items],
+        }, format='json')
+
+    def test_all_lines_decremented_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.order((self.shallot, 2), (self.garlic, 3), (self.shallot, 1))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "otop_app_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Product.objects.get(pk=self.shallot.pk).stock, 47)
+        self.assertEqual(Product.objects.get(pk=self.garlic.pk).stock, 27)
+
+    def test_shortage_rolls_back_every_line(self):
+        response = self.order((self.shallot, 5), (self.coffee, 11))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'สินค้า "Doi Chang Coffee" มีไม่เพียงพอ (เหลือ 10 ชิ้น)')
+        self.assertEqual(Product.objects.get(pk=self.shallot.pk).stock, 50)
+        self.assertFalse(Order.objects.exists())
+
+    def test_fifty_line_order_in_constant_queries(self):
+        products = Product.objects.bulk_create([
+            Product(name=f'สินค้า {n}', price='10.00', stock=5, category=self.category, seller=self.seller)
+            for n in range(50)
+        ])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.order(*[(product, 2) for product in products])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['data']['items']), 50)
+        self.assertEqual(response.data['data']['total_amount'], '1000.00')
+        queries = [
+            q['sql'] for q in ctx.captured_queries
+            if not q['sql'].startswith(('SAVEPOINT', 'RELEASE')) and 'otop_app_ordersequence' not in q['sql']
+        ]
+        # (ล็อกแถว) UPDATE stock, INSERT movement, SELECT สินค้า, INSERT order, INSERT items,
+        # INSERT ผู้ขายของออร์เดอร์, INSERT job, SELECT items สำหรับ response
+        self.assertEqual(len(queries), 8 + connection.features.has_select_for_update, queries)
+        self.assertEqual(set(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('stock', flat=True)), {3})
+
+    def test_missing_product(self):
+        with self.assertRaises(InsufficientStock) as ctx:
+            reserve_stock({999: 1})
+        self.assertEqual(ctx.exception.shortages, [(999, None, None)])
+
+
+class StockContentionTest(APITransactionTestCase):
+    def test_concurrent_orders_never_oversell(self):
+        result = run_stress(threads=8, orders=40, stock=15)
+        if connection.vendor != 'sqlite':
+            # SQLite ในหน่วยความจำของ test ตอบ "table is locked" แทนการรอ lock
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['remaining'], 0)
+        self.assertEqual(result['created'], result['sold'])
+        self.assertEqual(result['sold'] + result['remaining'], 15)
+        self.assertGreaterEqual(result['remaining'], 0)
+        self.assertGreater(result['created'] / result['seconds'], 0)
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.url = reverse('otop_api:create-order')
+        self.payload = {
+            'shipping_address': 'ศรีสะเกษ',
+            'payment_method': 'cod',
+            'items': [{'product_id': self.shallot.pk, 'quantity': 2, 'price': '45.00'}],
+        }
+
+    def post(self, payload, key='order-key-1'):
+        return self.client.post(self.url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post(self.payload)
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.post(self.payload)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(any('otop_app_product' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.shallot.pk).stock, 48)
+
+    def test_same_key_different_body(self):
+        self.post(self.payload)
+        other = dict(self.payload, shipping_address='กรุงเทพ')
+        self.assertEqual(self.post(other).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_duplicate_during_first_request_gets_retry_after(self):
+        first = self.post(self.payload)
+        record = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.update(status='processing', response_status=None, response_body=None)
+
+        busy = self.post(self.payload)
+        self.assertEqual(busy.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(busy['Retry-After'], str(settings.IDEMPOTENCY_RETRY_AFTER))
+
+        IdempotencyKey.objects.update(
+            status='completed', response_status=record.response_status, response_body=record.response_body,
+        )
+        retry = self.post(self.payload)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.post(self.payload)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertNotIn('Idempotent-Replayed', self.post(self.payload))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_response_stored_with_order(self):
+        # process ตายหลัง view จบ (หลัง commit ออร์เดอร์): คำตอบต้องถูกบันทึกไปพร้อมออร์เดอร์แล้ว
+        with mock.patch('otop_app.idempotency.store_response', side_effect=RuntimeError('crash')):
+            first = self.post(self.payload)
+        retry = self.post(self.payload)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_stolen_lease_rolls_back_order(self):
+        # ทำงานนานจน lease หมด และ retry จอง key ไปใหม่ระหว่างทาง: ออร์เดอร์ของ request แรกต้อง rollback
+        def retry_steals_lease():
+            stale = IdempotencyKey.objects.get()
+            stale.delete()
+            stale.pk, stale.expires_at = None, timezone.now() + timedelta(seconds=60)
+            stale.save()
+            return allocate_order_number()
+
+        with mock.patch('otop_app.views.allocate_order_number', side_effect=retry_steals_lease):
+            response = self.post(self.payload)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(Product.objects.get(pk=self.shallot.pk).stock, 50)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'processing')
+
+    def test_keys_scoped_by_user(self):
+        buyer = User.objects.create_user(username='buyer', password='test1234')
+        other = User.objects.create_user(username='other', password='test1234')
+        for user in (buyer, other, None):
+            self.client.force_authenticate(user)
+            response = self.post(self.payload)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 3)
+        self.client.force_authenticate(buyer)
+        self.assertEqual(self.post(self.payload)['Idempotent-Replayed'], 'true')
+
+
+class JobQueueTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+
+    def tearDown(self):
+        handlers.pop('test.flaky', None)
+
+    def test_order_created_enqueued_with_order(self):
+        response = self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': self.shallot.pk, 'quantity': 1, 'price': '45.00'}],
+        }, format='json')
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('order.created', {'order_id': response.data['data']['id']}))
+
+        # สินค้าไม่พอ -> rollback ทั้งออร์เดอร์และงาน
+        self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': self.coffee.pk, 'quantity': 99, 'price': '250.00'}],
+        }, format='json')
+        self.assertEqual(Job.objects.count(), 1)
+
+        out = StringIO()
+        call_command('run_jobs', '--once', '--threads', '1', stdout=out)
+        self.assertEqual(Job.objects.get().status, 'done')
+        self.assertIn('processed 1 (ok 1', out.getvalue())
+
+    def test_claimed_job_not_claimed_twice(self):
+        Job.objects.create(name='order.created', payload={'order_id': 1})
+        self.assertEqual(len(claim_jobs('a', 10)), 1)
+        self.assertEqual(claim_jobs('b', 10), [])
+
+    def test_retry_with_backoff_then_failed(self):
+        calls = []
+
+        @job_handler('test.flaky')
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError('webhook down')
+
+        Job.objects.create(name='test.flaky', max_attempts=2)
+        call_command('run_jobs', '--once', '--threads', '1', stdout=StringIO())
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('webhook down', job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        call_command('run_jobs', '--once', '--threads', '1', stdout=StringIO())
+        self.assertEqual(Job.objects.get().status, 'failed')
+        self.assertEqual(len(calls), 2)
+
+    def test_worker_crash_counts_as_attempt(self):
+        Job.objects.create(name='order.created', payload={'order_id': 1}, max_attempts=2)
+        stale = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1)
+        for expected in ('queued', 'failed'):
+            self.assertEqual(len(claim_jobs('crashing', 10)), 1)  # worker ตายระหว่างรัน
+            Job.objects.update(locked_at=stale)
+            self.assertEqual(requeue_stale_jobs(), 1)
+            self.assertEqual(Job.objects.get().status, expected)
+        self.assertEqual(claim_jobs('next', 10), [])
+
+    def test_stale_worker_does_not_overwrite_reclaimed_job(self):
+        Job.objects.create(name='test.flaky')
+        slow = claim_jobs('slow', 10)[0]
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1))
+        requeue_stale_jobs()
+        fresh = claim_jobs('fresh', 10)[0]
+
+        handlers['test.flaky'] = lambda payload: None
+        with self.assertLogs('otop_app.jobs', 'WARNING'):
+            run_job(slow)
+        self.assertEqual(Job.objects.get().status, 'running')
+        self.assertEqual(run_job(fresh), 'done')
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_worker_purges_old_finished_jobs(self):
+        old = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS + 1)
+        for status_ in ('done', 'failed'):
+            Job.objects.create(name='order.created', status=status_, finished_at=old)
+        recent = Job.objects.create(name='order.created', status='done', finished_at=timezone.now())
+        pending = Job.objects.create(name='order.created', run_at=timezone.now() + timedelta(hours=1))
+        call_command('run_jobs', '--once', '--threads', '1', stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {recent.pk, pending.pk})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OrderImportTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.admin = User.objects.create_user(username='admin', password='test1234', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('otop_api:order-import')
+
+    def run_import(self, body, content_type, query=''):
+        """อัปโหลดแล้วรันงาน orders.import แบบ worker คืนผลจาก endpoint สถานะ"""
+        response = self.client.post(self.url + query, body, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        run_job(claim_jobs('test', 1)[0])
+        return self.client.get(reverse('otop_api:order-import-status', args=[response.data['job_id']]))
+
+    def ndjson_line(self, product, quantity, **extra):
+        return json.dumps({
+            'customer_name': 'ลูกค้า Shopee', 'shipping_address': 'ศรีสะเกษ', 'payment_method': 'transfer',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': str(product.price)}], **extra,
+        }, ensure_ascii=False)
+
+    def test_ndjson_chunks_with_per_row_errors(self):
+        lines = [self.ndjson_line(self.garlic, 1) for _ in range(20)]
+        lines[3] = '{broken'
+        lines[5] = self.ndjson_line(self.coffee, 11)
+        lines[7] = self.ndjson_line(self.shallot, 1, payment_method='bitcoin')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.run_import('\n'.join(lines).encode('utf-8'), 'application/x-ndjson', '?chunk_size=10')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual((response.data['created'], response.data['failed']), (17, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 8, 6])
+        self.assertIn('Doi Chang Coffee', response.data['errors'][2]['errors']['items'][0])
+        self.assertEqual(Product.objects.get(pk=self.garlic.pk).stock, 13)
+        self.assertEqual(Job.objects.filter(name='order.created').count(), 17)
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "otop_app_orderitem"')]
+        self.assertEqual(len(inserts), 2)  # หนึ่งครั้งต่อ chunk
+
+    def test_csv_rows_grouped_by_order_ref(self):
+        body = (
+            'order_ref,customer_name,shipping_address,payment_method,product_id,quantity,price\n'
+            f'A1,สมชาย,อุบล,cod,{self.shallot.pk},2,45.00\n'
+            f'A1,สมชาย,อุบล,cod,{self.garlic.pk},1,80.00\n'
+            f'A2,สมหญิง,ยโสธร,cod,{self.shallot.pk},1,45.00\n'
+        )
+        response = self.run_import(body.encode('utf-8'), 'text/csv')
+        self.assertEqual(response.data['created'], 2)
+        first = Order.objects.get(customer_name='สมชาย')
+        self.assertEqual((first.items.count(), first.total_amount), (2, Decimal('170.00')))
+        self.assertEqual(Product.objects.get(pk=self.shallot.pk).stock, 47)
+
+    @override_settings(ORDER_IMPORT_ERROR_SAMPLE=2)
+    def test_errors_capped_with_full_report(self):
+        lines = [self.ndjson_line(self.coffee, 11) for _ in range(5)]
+        response = self.run_import('\n'.join(lines).encode('utf-8'), 'application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (0, 5))
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+        storage = import_storage()
+        with storage.open(response.data['report']) as report:
+            self.assertEqual(len(report.readlines()), 5)
+        job = Job.objects.get(name='orders.import')
+        self.assertFalse(storage.exists(job.payload['path']))  # ไฟล์ที่อัปโหลดถูกลบหลังนำเข้า
+        self.assertEqual(job.max_attempts, 1)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.seller_user)
+        self.assertEqual(self.client.post(self.url, b'', content_type='text/csv').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_error_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'orders.ndjson')
+            report = os.path.join(tmp, 'errors.ndjson')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write(self.ndjson_line(self.garlic, 1) + '\n' + self.ndjson_line(self.garlic, 999) + '\n')
+            out = StringIO()
+            call_command('import_orders', source, '--report', report, stdout=out)
+            with open(report, encoding='utf-8') as f:
+                errors = [json.loads(line) for line in f]
+        self.assertIn('Created 1 orders, 1 failed', out.getvalue())
+        self.assertEqual(errors[0]['row'], 2)
+
+
+class OrderNumberTest(APITestCase):
+    def test_block_touches_counter_once(self):
+        allocator = OrderNumberAllocator(block_size=10)
+        with CaptureQueriesContext(connection) as ctx:
+            numbers = [allocator.allocate() for _ in range(10)]
+        self.assertEqual(len([q for q in ctx.captured_queries if 'otop_app_ordersequence' in q['sql']]), 2)
+        today = timezone.localdate()
+        self.assertEqual(numbers[0], format_order_number(today, 1))
+        self.assertEqual(numbers[-1], f'OTOP-{today:%Y%m%d}-000010')
+
+        # process อื่นได้ block ถัดไป
+        self.assertEqual(OrderNumberAllocator(block_size=10).allocate(), format_order_number(today, 11))
+        self.assertEqual(allocator.allocate(), format_order_number(today, 21))
+
+    def test_create_order_returns_number(self):
+        create_catalog(self)
+        response = self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': self.shallot.pk, 'quantity': 1, 'price': '45.00'}],
+        }, format='json')
+        self.assertRegex(response.data['data']['order_number'], r'^OTOP-\d{8}-\d{6}$')
+        self.assertEqual(Order.objects.get().order_number, response.data['data']['order_number'])
+
+
+class OrderNumberConcurrencyTest(APITransactionTestCase):
+    def test_parallel_processes_never_collide(self):
+        # 4 allocator = 4 process, แต่ละตัวมี 4 thread
+        allocators = [OrderNumberAllocator(block_size=7) for _ in range(4)]
+
+        def allocate_with_retry(allocator):
+            # SQLite ในหน่วยความจำของ test ตอบ "table is locked" ทันทีแทนการรอ lock (busy timeout)
+            while True:
+                try:
+                    return allocator.allocate()
+                except OperationalError:
+                    time.sleep(0.001)
+
+        def allocate(index):
+            try:
+                return [allocate_with_retry(allocators[index % 4]) for _ in range(25)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            numbers = [number for batch in pool.map(allocate, range(16)) for number in batch]
+        self.assertEqual(len(numbers), 400)
+        self.assertEqual(len(set(numbers)), 400)
+
+
+class StockHoldTest(APITestCase):
+    def setUp(self):
+        cache.clear()  # นับ throttle ใน cache
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234')
+        self.client.force_authenticate(self.customer)
+        self.holds_url = reverse('otop_api:cart-hold-create')
+
+    def hold(self, product, quantity, token=None):
+        data = {'items': [{'product_id': product.pk, 'quantity': quantity}]}
+        if token:
+            data['token'] = token
+        return self.client.post(self.holds_url, data, format='json')
+
+    def order(self, product, quantity, **extra):
+        return self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': str(product.price)}], **extra,
+        }, format='json')
+
+    def test_hold_reserves_stock_until_checkout(self):
+        response = self.hold(self.coffee, 8)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        token = response.data['data']['token']
+        self.assertEqual(response.data['data']['items'], [{'product_id': self.coffee.pk, 'quantity': 8, 'available': 2}])
+
+        other = self.order(self.coffee, 3)
+        self.assertEqual(other.data['message'], 'สินค้า "Doi Chang Coffee" มีไม่เพียงพอ (เหลือ 2 ชิ้น)')
+        self.assertEqual(self.order(self.coffee, 2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.hold(self.coffee, 1).status_code, status.HTTP_400_BAD_REQUEST)
+
+        with CaptureQueriesContext(connection) as ctx:
+            checkout = self.order(self.coffee, 8, hold_token=token)
+        self.assertEqual(checkout.status_code, status.HTTP_201_CREATED)
+        update = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "otop_app_product"')]
+        self.assertNotIn('otop_app_stockhold', update[0])  # ไม่เช็คแถวที่แย่งกันซ้ำ
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_stock_edited_below_hold_rejects_checkout(self):
+        token = self.hold(self.coffee, 8).data['data']['token']
+        self.coffee.refresh_from_db()
+        self.coffee.stock = 5
+        self.coffee.save()
+        checkout = self.order(self.coffee, 8, hold_token=token)
+        self.assertEqual(checkout.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(checkout.data['message'], 'สินค้า "Doi Chang Coffee" มีไม่เพียงพอ (เหลือ 5 ชิ้น)')
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 5)
+        self.assertTrue(StockHold.objects.filter(token=token).exists())
+
+    def test_update_and_release_hold(self):
+        token = self.hold(self.shallot, 5).data['data']['token']
+        self.assertEqual(self.hold(self.shallot, 20, token=token).status_code, status.HTTP_201_CREATED)
+        detail = self.client.get(reverse('otop_api:cart-hold-detail', args=[token]))
+        self.assertEqual(detail.data['data']['items'][0]['available'], 30)
+        self.client.delete(reverse('otop_api:cart-hold-detail', args=[token]))
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_expired_holds_ignored_and_swept(self):
+        self.hold(self.coffee, 10)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.order(self.coffee, 4).status_code, status.HTTP_201_CREATED)
+        out = StringIO()
+        call_command('sweep_stock_holds', '--batch-size', '1', stdout=out)
+        self.assertIn('Released 1 expired holds', out.getvalue())
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_token_bound_to_owner(self):
+        token = self.hold(self.coffee, 5).data['data']['token']
+        self.client.force_authenticate(None)
+        self.assertEqual(self.hold(self.coffee, 1).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.order(self.coffee, 5, hold_token=token).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(User.objects.create_user(username='other', password='test1234'))
+        self.assertEqual(self.hold(self.coffee, 5, token=token).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('otop_api:cart-hold-detail', args=[token])).data['data']['items'], [])
+        self.client.delete(reverse('otop_api:cart-hold-detail', args=[token]))
+        self.assertEqual(self.order(self.coffee, 5, hold_token=token).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(StockHold.objects.get().user, self.customer)
+
+    @override_settings(STOCK_HOLD_MAX_QUANTITY=5, STOCK_HOLD_MAX_ITEMS=2, STOCK_HOLD_MAX_CARTS=2)
+    def test_hold_limits_and_throttle(self):
+        self.assertEqual(self.hold(self.shallot, 6).status_code, status.HTTP_400_BAD_REQUEST)
+        token = self.hold(self.shallot, 5).data['data']['token']
+        self.assertEqual(self.hold(self.garlic, 5, token=token).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.hold(self.coffee, 1, token=token).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.hold(self.coffee, 1).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.hold(self.coffee, 1).status_code, status.HTTP_400_BAD_REQUEST)  # ตะกร้าที่ 3
+
+        with mock.patch.object(CartHoldThrottle, 'THROTTLE_RATES', {'cart_holds': '1/min'}):
+            cache.clear()
+            self.hold(self.shallot, 1, token=token)
+            self.assertEqual(self.hold(self.shallot, 1, token=token).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class OrderStatusTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.client.force_authenticate(self.seller_user)
+        self.orders = [self.place_order(self.coffee, 2) for _ in range(3)]
+
+    def place_order(self, product, quantity):
+        response = self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': str(product.price)}],
+        }, format='json')
+        return response.data['data']['id']
+
+    def bulk(self, changes):
+        return self.client.post(reverse('otop_api:seller-order-status'), {
+            'orders': [{'id': pk, 'status': value} for pk, value in changes],
+        }, format='json')
+
+    def test_bulk_transitions_one_update_per_status(self):
+        first, second, third = self.orders
+        Order.objects.filter(pk=third).update(status='confirmed')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk([(first, 'confirmed'), (second, 'confirmed'), (third, 'shipped')])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['success'])
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "otop_app_order"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            dict(Order.objects.values_list('pk', 'status')),
+            {first: 'confirmed', second: 'confirmed', third: 'shipped'},
+        )
+
+    def test_invalid_transition_and_ownership_reported_per_order(self):
+        first, second, third = self.orders
+        Order.objects.filter(pk=second).update(status='shipped')
+        other_user = User.objects.create_user(username='other', password='test1234')
+        other = Seller.objects.create(user=other_user, name='ร้านอื่น', phone='0800000000', address='-')
+        foreign = Order.objects.create(total_amount='10.00', shipping_address='-', payment_method='cod')
+        OrderItem.objects.create(
+            order=foreign, quantity=1, price='10.00',
+            product=Product.objects.create(name='ผ้าไหม', price='10.00', category=self.category, seller=other, stock=1),
+        )
+        response = self.bulk([(first, 'shipped'), (second, 'cancelled'), (third, 'confirmed'), (foreign.pk, 'confirmed')])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['updated'], [{'id': third, 'status': 'confirmed'}])
+        self.assertEqual(
+            [(error['id'], error['code']) for error in response.data['errors']],
+            [(first, 'invalid_transition'), (second, 'invalid_transition'), (foreign.pk, 'forbidden')],
+        )
+        self.assertEqual(Order.objects.get(pk=first).status, 'pending')
+
+    def test_cancellation_returns_stock(self):
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 4)
+        response = self.bulk([(pk, 'cancelled') for pk in self.orders[:2]])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 8)
+        # ยกเลิกซ้ำไม่คืน stock อีก
+        self.bulk([(self.orders[0], 'cancelled')])
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 8)
+
+    def test_single_order_endpoint_uses_state_machine(self):
+        url = reverse('otop_api:order-status-update', args=[self.orders[0]])
+        self.assertEqual(self.client.patch(url, {'status': 'delivered'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.patch(url, {'status': 'confirmed'}, format='json').status_code, status.HTTP_200_OK)
+        missing = reverse('otop_api:order-status-update', args=[999999])
+        self.assertEqual(self.client.patch(missing, {'status': 'confirmed'}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_admin_actions_use_state_machine(self):
+        admin_user = User.objects.create_superuser(username='admin', password='test1234', email='admin@example.com')
+        self.client.force_login(admin_user)
+        url = reverse('admin:otop_app_order_changelist')
+        first, second, _ = self.orders
+        Order.objects.filter(pk=second).update(status='shipped')
+        self.client.post(url, {'action': 'mark_cancelled', '_selected_action': [first, second]})
+        self.assertEqual(dict(Order.objects.filter(pk__in=[first, second]).values_list('pk', 'status')),
+                         {first: 'cancelled', second: 'shipped'})
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 6)
+
+class InventoryLedgerTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.client.force_authenticate(self.seller_user)
+
+    def order(self, product, quantity):
+        return self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': str(product.price)}],
+        }, format='json').data['data']
+
+    def movements(self, product):
+        return list(InventoryMovement.objects.filter(product=product).order_by('id').values_list('reason', 'quantity'))
+
+    def test_every_stock_change_is_recorded(self):
+        order = self.order(self.coffee, 3)
+        self.client.post(reverse('otop_api:seller-order-status'), {
+            'orders': [{'id': order['id'], 'status': 'cancelled'}],
+        }, format='json')
+        self.client.patch(reverse('otop_api:seller-product-manage', args=[self.coffee.pk]), {'stock': 4}, format='json')
+        self.assertEqual(self.movements(self.coffee), [('restock', 10), ('sale', -3), ('cancel', 3), ('adjustment', -6)])
+        self.assertEqual(
+            InventoryMovement.objects.filter(reason__in=['sale', 'cancel']).values_list('reference', flat=True).distinct().get(),
+            order['order_number'],
+        )
+        self.assertEqual(find_drift(), [])
+
+    def test_stock_edit_is_absolute_after_concurrent_sale(self):
+        product = Product.objects.get(pk=self.coffee.pk)  # เปิดฟอร์มตอน stock = 10
+        self.order(self.coffee, 4)
+        product.stock = 15
+        product.save()
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 15)
+        self.assertEqual(self.movements(self.coffee)[-1], ('restock', 9))
+
+        # ไม่ได้แก้ stock: ยอดที่ออร์เดอร์ตัดไประหว่างเปิดฟอร์มไม่ถูกเขียนทับ
+        product = Product.objects.get(pk=self.coffee.pk)
+        self.order(self.coffee, 2)
+        product.price = '240.00'
+        product.save()
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 13)
+        self.assertEqual(find_drift(), [])
+
+    def test_stock_edit_below_concurrent_sale(self):
+        Product.objects.filter(pk=self.coffee.pk).update(stock=5)
+        record_movements('adjustment', [(self.coffee.pk, -5, '')])
+        product = Product.objects.get(pk=self.coffee.pk)  # เปิดฟอร์มตอน stock = 5
+        self.order(self.coffee, 2)
+        product.stock = 0
+        product.save()
+        self.assertEqual(Product.objects.get(pk=self.coffee.pk).stock, 0)
+        self.assertEqual(self.movements(self.coffee)[-1], ('adjustment', -3))
+        self.assertEqual(find_drift(), [])
+
+    def test_compaction_folds_movements_into_snapshot(self):
+        self.order(self.shallot, 5)
+        self.assertEqual(compact_snapshots(batch_size=1, settle_seconds=0), 3)
+        self.assertEqual(InventorySnapshot.objects.get(product=self.shallot).stock, 45)
+        self.order(self.shallot, 5)
+        self.assertEqual(compact_snapshots(settle_seconds=0), 1)
+        self.assertEqual(InventorySnapshot.objects.get(product=self.shallot).stock, 40)
+        self.assertEqual(InventoryMovement.objects.filter(product=self.shallot).count(), 3)
+
+        Product.objects.filter(pk=self.garlic.pk).update(stock=1)  # แก้ตรงโดยไม่ผ่านสมุด
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 products out of balance'):
+            call_command('compact_inventory', '--check', stdout=out, stderr=out)
+        self.assertIn(f'product {self.garlic.pk}: stock 1 != ledger 30', out.getvalue())
+
+
+@override_settings(QUERY_COUNT_HEADER=True, MEDIA_ROOT=tempfile.mkdtemp())
+class QueryBudgetTest(APITestCase):
+    """
+    ทุก URL ใน otop_app/urls.py ต้องประกาศงบ query (otop_app/querybudget.py)
+    และต้องไม่เกินงบ / ไม่มี SQL ซ้ำต่อแถว (N+1) กับข้อมูลหลายแถว
+    """
+
+    def setUp(self):
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        self.admin = User.objects.create_superuser(username='admin', password='test1234', email='admin@example.com')
+        self.orders = []
+        for _ in range(3):
+            order = Order.objects.create(
+                customer=self.customer, customer_email='buyer@example.com', total_amount='375.00',
+                shipping_address='ศรีสะเกษ', payment_method='cod',
+            )
+            for product in (self.shallot, self.garlic, self.coffee):
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            self.orders.append(order)
+        for n in range(3):
+            user = User.objects.create_user(username=f'reviewer{n}', password='test1234')
+            ProductReview.objects.create(product=self.shallot, user=user, rating=5)
+        self.import_job = Job.objects.create(
+            name='orders.import', status='done', result={'created': 3, 'failed': 0, 'errors': [], 'report': ''},
+        )
+
+    def order_body(self):
+        return {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': product.pk, 'quantity': 1, 'price': str(product.price)}
+                      for product in (self.shallot, self.garlic, self.coffee)],
+        }
+
+    def requests(self):
+        """(ชื่อ URL, args, method, user, data) อย่างน้อยหนึ่งรายการต่อทุก URL"""
+        self.client.force_authenticate(self.customer)
+        hold = self.client.post(reverse('otop_api:cart-hold-create'), {
+            'items': [{'product_id': self.garlic.pk, 'quantity': 1}],
+        }, format='json').data['data']['token']
+        shallot, order = self.shallot.pk, self.orders[0].pk
+        return [
+            ('product-list', [], 'get', None, None),
+            ('product-batch', [], 'get', None, {'ids': f'{self.shallot.pk},{self.garlic.pk},{self.coffee.pk}'}),
+            ('product-export', ['ndjson'], 'get', self.seller_user, None),
+            ('product-detail', [shallot], 'get', None, None),
+            ('product-review-list-create', [shallot], 'get', self.customer, None),
+            ('product-review-list-create', [shallot], 'post', self.customer, {'rating': 4, 'comment': 'ดี'}),
+            ('category-list', [], 'get', None, None),
+            ('category-manage', [self.category.pk], 'get', self.customer, None),
+            ('order-list', [], 'get', self.customer, None),
+            ('create-order', [], 'post', None, self.order_body()),
+            ('create_order_v2', [], 'post', None, {'customer_email': 'buyer@example.com', 'total_amount': '10.00'}),
+            ('order-import', [], 'post', self.admin, None),
+            ('order-import-status', [self.import_job.pk], 'get', self.admin, None),
+            ('order-export', ['csv'], 'get', self.admin, {'status': 'pending'}),
+            ('get-orders', [], 'get', self.customer, None),
+            ('order-events', [], 'get', self.customer, None),
+            ('order-detail', [order], 'get', self.customer, None),
+            ('order-status-update', [order], 'patch', self.seller_user, {'status': 'confirmed'}),
+            ('my-order-list', [], 'get', self.customer, None),
+            ('cart-hold-create', [], 'post', self.customer, {'items': [{'product_id': self.shallot.pk, 'quantity': 2}]}),
+            ('cart-hold-detail', [hold], 'get', self.customer, None),
+            ('cart-hold-detail', [hold], 'delete', self.customer, None),
+            ('seller-detail', [], 'get', self.seller_user, None),
+            ('seller-product-list', [], 'get', self.seller_user, None),
+            ('seller-product-list', [], 'post', self.seller_user, {
+                'name': 'ข้าวหอมมะลิ', 'description': 'ข้าวใหม่', 'price': '60.00', 'category': self.category.pk, 'stock': 5,
+            }),
+            ('seller-product-manage', [shallot], 'get', self.seller_user, None),
+            ('seller-product-manage', [shallot], 'patch', self.seller_user, {'stock': 60}),
+            ('seller-order-list', [], 'get', self.seller_user, None),
+            ('seller-order-status', [], 'post', self.seller_user, {
+                'orders': [{'id': pk, 'status': 'cancelled'} for pk in [o.pk for o in self.orders[1:]]],
+            }),
+            ('seller_dashboard', [], 'get', self.seller_user, None),
+            ('register', [], 'post', None, {
+                'username': 'newbie', 'password': 'test1234', 'password2': 'test1234', 'email': 'new@example.com',
+            }),
+            ('user-profile', [], 'get', self.customer, None),
+            ('token_obtain_pair', [], 'post', None, {'username': 'buyer', 'password': 'test1234'}),
+            ('token_refresh', [], 'post', None, {'refresh': 'invalid'}),
+            ('seller-product-manage', [self.coffee.pk], 'delete', self.seller_user, None),
+            ('category-manage', [self.category.pk], 'delete', self.customer, None),
+        ]
+
+    def send(self, name, args, method, user, data):
+        self.client.force_authenticate(user)
+        url = reverse(f'otop_api:{name}', args=args)
+        if name == 'order-import':
+            body = '\n'.join(json.dumps(self.order_body()) for _ in range(3))
+            return self.client.post(url, body, content_type='application/x-ndjson')
+        if method == 'get':
+            return self.client.get(url, data)
+        if name == 'create-order':
+            return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='budget-test-key')
+        return getattr(self.client, method)(url, data, format='json')
+
+    def test_every_url_declares_budget(self):
+        from . import urls
+        for pattern in urls.urlpatterns:
+            self.assertIsNotNone(get_query_budgets(pattern.callback), pattern.name)
+
+    def test_every_url_within_budget(self):
+        from . import urls
+        requests = self.requests()
+        self.assertEqual({name for name, *_ in requests}, {pattern.name for pattern in urls.urlpatterns})
+        for name, args, method, user, data in requests:
+            with self.subTest(name=name, method=method):
+                with self.assertNoLogs('otop_app.querybudget', 'WARNING'):
+                    response = self.send(name, args, method, user, data)
+                self.assertLess(response.status_code, 500)
+                self.assertLessEqual(int(response['X-Query-Count']), int(response['X-Query-Budget']))
+
+    def test_n_plus_one_is_logged(self):
+        self.client.force_authenticate(self.customer)
+        url = reverse('otop_api:product-review-list-create', args=[self.shallot.pk])
+        with mock.patch('otop_app.views.ProductReviewListCreateView.get_queryset',
+                        lambda view: ProductReview.objects.filter(product_id=self.shallot.pk).order_by('-created_at')):
+            with self.assertLogs('otop_app.querybudget', 'WARNING') as logs:
+                response = self.client.get(url)
+        self.assertIn('same SQL ran 3 times (N+1?)', logs.output[0])
+        self.assertIn('"auth_user"', logs.output[0])
+        self.assertEqual(response['X-Query-Count'], '5')
+
+
+class OrderSellerLinkTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        other_user = User.objects.create_user(username='other', password='test1234')
+        other = Seller.objects.create(user=other_user, name='ร้านอื่น', phone='0800000000', address='-')
+        self.silk = Product.objects.create(name='ผ้าไหม', price='10.00', category=self.category, seller=other, stock=100)
+        self.mine = []
+        for n in range(25):
+            order = Order.objects.create(total_amount='10.00', shipping_address='-', payment_method='cod')
+            OrderItem.objects.create(order=order, product=self.silk, quantity=1, price='10.00')
+            if n % 5:
+                # สองรายการจากร้านเดียวกันต้องได้ออร์เดอร์เดียว
+                OrderItem.objects.create(order=order, product=self.shallot, quantity=1, price='45.00')
+                OrderItem.objects.create(order=order, product=self.garlic, quantity=1, price='80.00')
+                self.mine.append(order.pk)
+        self.client.force_authenticate(self.seller_user)
+        self.url = reverse('otop_api:seller-order-list')
+
+    def walk(self, **params):
+        ids = []
+        response = self.client.get(self.url, {'pagination': 'cursor', **params})
+        while True:
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walk_over_link_table(self):
+        expected = list(Order.objects.filter(pk__in=self.mine).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+        self.assertEqual(self.client.get(self.url).data['count'], 20)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in ctx.captured_queries))
+
+    def test_status_copied_to_link(self):
+        changed = self.mine[:3]
+        self.client.post(reverse('otop_api:seller-order-status'), {
+            'orders': [{'id': pk, 'status': 'confirmed'} for pk in changed],
+        }, format='json')
+        order = Order.objects.get(pk=self.mine[3])
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(sorted(self.walk(status='confirmed')), sorted(changed))
+        self.assertEqual(self.walk(status='cancelled'), [self.mine[3]])
+
+    def test_backfill_existing_orders(self):
+        OrderSeller.objects.all().delete()
+        self.assertEqual(backfill_order_sellers(OrderItem, OrderSeller, batch_size=7), 45)
+        self.assertEqual(len(self.walk()), 20)
+
+
+class OrderCustomerTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+
+    def place_order(self, **extra):
+        return self.client.post(reverse('otop_api:create-order'), {
+            'shipping_address': 'ศรีสะเกษ', 'payment_method': 'cod',
+            'items': [{'product_id': self.shallot.pk, 'quantity': 1, 'price': '45.00'}],
+            **extra,
+        }, format='json')
+
+    def test_new_orders_linked_to_account(self):
+        guest = self.place_order(customer_email='buyer@example.com').data['data']['id']
+        stranger = self.place_order(customer_email='someone@example.com').data['data']['id']
+        self.client.force_authenticate(self.customer)
+        mine = self.place_order(customer_email='other@example.com').data['data']['id']
+        self.assertEqual(Order.objects.get(pk=guest).customer, self.customer)
+        self.assertIsNone(Order.objects.get(pk=stranger).customer)
+
+        # เปลี่ยนอีเมลแล้วประวัติออร์เดอร์ยังอยู่
+        self.customer.email = 'new@example.com'
+        self.customer.save()
+        response = self.client.get(reverse('otop_api:my-order-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [mine, guest])
+
+    def test_register_links_earlier_guest_orders(self):
+        guest = self.place_order(customer_email='new@example.com').data['data']['id']
+        self.place_order(customer_email='someone@example.com')
+        response = self.client.post(reverse('otop_api:register'), {
+            'username': 'newbie', 'password': 'test1234', 'password2': 'test1234', 'email': 'new@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(User.objects.get(username='newbie'))
+        response = self.client.get(reverse('otop_api:my-order-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [guest])
+
+    def test_backfill_in_id_batches(self):
+        orders = [
+            Order.objects.create(customer_email=email, total_amount='45.00', shipping_address='-', payment_method='cod')
+            for email in ['buyer@example.com', '', 'someone@example.com', 'buyer@example.com', 'buyer@example.com']
+        ]
+        first, last = orders[0].pk, orders[-1].pk
+        out = StringIO()
+        call_command('backfill_order_customers', '--batch-size', '2', '--end-id', str(first + 1), stdout=out)
+        self.assertIn(f'resume with --start-id {first + 2}', out.getvalue())
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 1)
+
+        call_command('backfill_order_customers', '--batch-size', '2', '--start-id', str(first + 2), stdout=out)
+        self.assertEqual(
+            list(Order.objects.filter(customer=self.customer).values_list('pk', flat=True).order_by('pk')),
+            [first, first + 3, last],
+        )
+        out = StringIO()
+        call_command('backfill_order_customers', stdout=out)
+        self.assertIn('Linked 0 orders', out.getvalue())
+
+
+class ExportTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.admin = User.objects.create_superuser(username='admin', password='test1234', email='admin@example.com')
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        other_user = User.objects.create_user(username='other', password='test1234')
+        other = Seller.objects.create(user=other_user, name='ร้านอื่น', phone='0800000000', address='-')
+        silk = Product.objects.create(name='ผ้าไหม', price='10.00', category=self.category, seller=other, stock=100)
+        self.orders = []
+        for n, product in enumerate([self.shallot, self.garlic, silk, self.shallot, silk]):
+            order = Order.objects.create(
+                customer_name=f'ลูกค้า {n}', total_amount='45.00', shipping_address='ศรีสะเกษ, อ.เมือง',
+                payment_method='cod', status='delivered' if n % 2 else 'pending',
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            self.orders.append(order)
+        OrderItem.objects.create(order=self.orders[0], product=self.garlic, quantity=2, price='80.00')
+        old = timezone.now() - timedelta(days=40)
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=old)
+        OrderSeller.objects.filter(order=self.orders[0]).update(created_at=old)
+
+    def download(self, user, name='order-export', fmt='csv', **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse(f'otop_api:{name}', args=[fmt]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_admin_csv_one_row_per_item(self):
+        body = self.download(self.admin)
+        self.assertTrue(body.startswith('﻿id,order_number,'))
+        rows = list(csv.DictReader(StringIO(body.lstrip('﻿'))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['id'] for row in rows[-2:]], [str(self.orders[0].pk)] * 2)
+        self.assertEqual(rows[-1]['product_name'], self.garlic.name)
+        self.assertEqual(rows[-1]['shipping_address'], 'ศรีสะเกษ, อ.เมือง')
+
+    def test_seller_ndjson_with_filters(self):
+        lines = self.download(self.seller_user, fmt='ndjson').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [o.pk for o in (self.orders[3], self.orders[1], self.orders[0])])
+        # รูปแบบเดียวกับ API list
+        detail = self.client.get(reverse('otop_api:order-detail', args=[self.orders[3].pk])).data
+        self.assertEqual(json.loads(lines[0])['items'], json.loads(json.dumps(detail['items'])))
+
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        lines = self.download(self.seller_user, fmt='ndjson', created_from=since).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.orders[3].pk, self.orders[1].pk])
+        lines = self.download(self.seller_user, fmt='ndjson', status='pending').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.orders[0].pk])
+
+    def test_products_and_errors(self):
+        body = self.download(self.seller_user, 'product-export', 'csv', status='active')
+        self.assertEqual(len(body.splitlines()), 4)
+        self.client.force_authenticate(self.seller_user)
+        url = reverse('otop_api:order-export', args=['csv'])
+        self.assertEqual(self.client.get(url, {'created_from': '2026-13-01'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'status': 'lost'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('otop_api:order-export', args=['xlsx'])).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_streams_in_chunks(self):
+        path = os.path.join(tempfile.mkdtemp(), 'orders.ndjson')
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('export_data', 'orders', '--format', 'ndjson', '--chunk-size', '2', '--output', path, stderr=StringIO())
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 5)
+        item_queries = [q for q in ctx.captured_queries if 'otop_app_orderitem' in q['sql']]
+        self.assertEqual(len(item_queries), 3)  # หนึ่ง query ต่อ chunk ของออร์เดอร์
+
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'orders', '--from', '2026-02-30')
+
+
+class OrderEventsTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        self.order = Order.objects.create(
+            customer=self.customer, total_amount='45.00', shipping_address='ศรีสะเกษ', payment_method='cod',
+        )
+        OrderItem.objects.create(order=self.order, product=self.shallot, quantity=1, price='45.00')
+        self.url = reverse('otop_api:order-events')
+
+    def test_status_changes_published_after_commit(self):
+        broker = get_broker()
+        event = {'id': self.order.pk, 'order_number': None, 'status': 'confirmed'}
+        with mock.patch.object(broker, 'publish') as publish:
+            self.client.force_authenticate(self.seller_user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('otop_api:seller-order-status'), {
+                    'orders': [{'id': self.order.pk, 'status': 'confirmed'}],
+                }, format='json')
+            publish.assert_called_once_with([f'seller:{self.seller.pk}', f'customer:{self.customer.pk}'], event)
+
+            self.order.refresh_from_db()
+            self.order.status = 'shipped'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order.save()
+            self.assertEqual(publish.call_args.args[1]['status'], 'shipped')
+            self.assertEqual(publish.call_count, 2)
+
+    def test_publish_failure_does_not_fail_committed_change(self):
+        broker = get_broker()
+        self.client.force_authenticate(self.seller_user)
+        with mock.patch.object(broker, 'publish', side_effect=ConnectionError):
+            with self.assertLogs('otop_app.events', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(reverse('otop_api:seller-order-status'), {
+                        'orders': [{'id': self.order.pk, 'status': 'confirmed'}],
+                    }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+
+    def test_requires_asgi_and_token(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_stream_delivers_own_events(self):
+        anonymous = await self.async_client.get(self.url)
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        token = str(AccessToken.for_user(self.customer))
+        with override_settings(ORDER_EVENTS_HEARTBEAT=0.2):
+            response = await self.async_client.get(self.url, headers={'authorization': f'Bearer {token}'})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await asyncio.wait_for(anext(stream), 1), b'retry: 5000\n\n')
+
+            broker = get_broker()
+            broker.publish([f'customer:{self.customer.pk + 1}'], {'id': 0, 'status': 'shipped'})
+            broker.publish([f'customer:{self.customer.pk}'], {'id': self.order.pk, 'status': 'shipped'})
+            chunk = await asyncio.wait_for(anext(stream), 1)
+            self.assertEqual(chunk.decode(), f'event: order.status\ndata: {{"id": {self.order.pk}, "status": "shipped"}}\n\n')
+            self.assertEqual(await asyncio.wait_for(anext(stream), 1), b': keepalive\n\n')
+
+            # client หลุด: ASGI handler ยกเลิกการอ่าน stream แล้วผู้ฟังต้องถูกถอดออก
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            pending.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+        self.assertEqual(broker.subscribers, {})
+
+    def test_auth_releases_db_connection(self):
+        token = AccessToken.for_user(self.customer)
+        request = RequestFactory().get(self.url, headers={'authorization': f'Bearer {token}'})
+        with mock.patch('otop_app.views.connection') as conn:
+            self.assertEqual(events_channels(request), ([f'customer:{self.customer.pk}'], token['exp']))
+        conn.close.assert_called_once_with()
+
+    async def test_stream_closes_when_token_expires(self):
+        stream = event_stream(['customer:1'], heartbeat=0.05, expires_at=time.time() + 0.12)
+        chunks = [chunk async for chunk in stream]
+        self.assertEqual(chunks[0], 'retry: 5000\n\n')
+        self.assertEqual(chunks[-1], 'event: token.expired\ndata: {}\n\n')
+        self.assertEqual(get_broker().subscribers, {})
+
+    async def test_redis_subscription_waits_inside_redis_client(self):
+        pubsub = mock.Mock()
+        pubsub.get_message = mock.AsyncMock(side_effect=[None, {'data': b'{"id": 1}'}])
+        subscription = RedisSubscription(pubsub)
+        self.assertEqual(await subscription.get(5), {'id': 1})
+        self.assertTrue(all(0 < call.kwargs['timeout'] <= 5 for call in pubsub.get_message.call_args_list))
+        pubsub.get_message = mock.AsyncMock(return_value=None)
+        self.assertIsNone(await subscription.get(0.05))
+
+    def test_split_processes_require_redis_broker(self):
+        with override_settings(DEBUG=False, ORDER_EVENTS_BACKEND='otop_app.events.LocalBroker'):
+            with self.assertRaises(ImproperlyConfigured):
+                check_broker()
+        with override_settings(DEBUG=True, ORDER_EVENTS_BACKEND='otop_app.events.LocalBroker'):
+            check_broker()
+        with override_settings(DEBUG=False, ORDER_EVENTS_BACKEND='otop_app.events.RedisBroker'):
+            check_broker()
+
+
+@override_settings(ORDER_ARCHIVE_AFTER_DAYS=180)
+class ArchiveTest(APITestCase):
+    def setUp(self):
+        create_catalog(self)
+        self.admin = User.objects.create_superuser(username='admin', password='test1234', email='admin@example.com')
+        self.customer = User.objects.create_user(username='buyer', password='test1234', email='buyer@example.com')
+        other_user = User.objects.create_user(username='other', password='test1234')
+        self.other = Seller.objects.create(user=other_user, name='ร้านอื่น', phone='0800000000', address='-')
+        silk = Product.objects.create(name='ผ้าไหม', price='10.00', category=self.category, seller=self.other, stock=100)
+
+        def order(days, order_status, *products):
+            order = Order.objects.create(
+                customer=self.customer, customer_name='ลูกค้า', total_amount='45.00',
+                shipping_address='ศรีสะเกษ', payment_method='cod', status=order_status,
+            )
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            created = timezone.now() - timedelta(days=days)
+            Order.objects.filter(pk=order.pk).update(created_at=created)
+            OrderSeller.objects.filter(order=order).update(created_at=created)
+            return order.pk
+
+        self.old_delivered = order(400, 'delivered', self.shallot, self.garlic)
+        self.old_pending = order(350, 'pending', self.shallot)
+        self.old_multi = order(300, 'cancelled', self.garlic, silk)
+        self.recent = order(1, 'delivered', self.coffee)
+        out = StringIO()
+        call_command('archive_orders', '--batch-size', '1', stdout=out)
+        self.output = out.getvalue()
+
+    def ids(self, name, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse(f'otop_api:{name}'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_moves_closed_old_orders_with_items_and_links(self):
+        self.assertIn('Archived 2 orders', self.output)
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), {self.old_delivered, self.old_multi})
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.old_pending, self.recent})
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_delivered).exists())
+        self.assertEqual(
+            list(ArchivedOrderItem.objects.filter(order_id=self.old_delivered).values_list('product_name', flat=True)),
+            [self.shallot.name, self.garlic.name],
+        )
+        self.assertEqual(ArchivedOrderSeller.objects.filter(order_id=self.old_multi).count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('archive_orders', '--days', '30', stdout=StringIO())
+
+    def test_lists_read_archive_only_for_old_ranges(self):
+        self.assertEqual(self.ids('my-order-list', self.customer), [self.recent, self.old_pending])
+        everything = [self.recent, self.old_multi, self.old_pending, self.old_delivered]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.ids('my-order-list', self.customer, created_from='2000-01-01'), everything)
+        self.assertEqual(sum('UNION' in q['sql'] for q in ctx.captured_queries), 2)  # count + page
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse('otop_api:my-order-list'), {'created_to': '2000-01-01', 'fields': 'status'})
+        self.assertEqual(response.data['results'], [])
+        rows = self.client.get(reverse('otop_api:order-list'), {'created_from': '2000-01-01', 'fields': 'status'}).data['results']
+        self.assertEqual(rows[1], {'id': self.old_multi, 'status': 'cancelled'})
+        orders = self.client.get(reverse('otop_api:get-orders'), {'created_from': '2000-01-01', 'status': 'delivered'}).data['orders']
+        self.assertEqual([row['id'] for row in orders], [self.recent, self.old_delivered])
+        self.assertEqual([item['product_name'] for item in orders[1]['items']], [self.shallot.name, self.garlic.name])
+
+    def test_seller_range_and_detail_fallback(self):
+        old = (timezone.localdate() - timedelta(days=200)).isoformat()
+        self.assertEqual(self.ids('seller-order-list', self.seller_user, created_to=old), [self.old_multi, self.old_pending, self.old_delivered])
+        self.assertEqual(self.ids('order-list', self.other.user, created_to=old), [self.old_multi])
+        self.assertEqual(self.ids('seller-order-list', self.seller_user, created_to=old, status='cancelled'), [self.old_multi])
+
+        self.client.force_authenticate(self.customer)
+        detail = self.client.get(reverse('otop_api:order-detail', args=[self.old_delivered]))
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(detail.data['status'], 'delivered')
+        self.assertEqual(len(detail.data['items']), 2)
+        self.client.force_authenticate(self.other.user)
+        self.assertEqual(self.client.get(reverse('otop_api:order-detail', args=[self.old_delivered])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_reaches_archive(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('otop_api:order-export', args=['ndjson']), {'created_from': '2000-01-01'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.recent, self.old_multi, self.old_pending, self.old_delivered])
+        out = StringIO()
+        call_command('export_data', 'orders', '--format', 'ndjson', '--seller', str(self.other.pk), '--from', '2000-01-01', stdout=out)
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()], [self.old_multi])
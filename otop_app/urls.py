@@ -1,12 +1,15 @@
 from django.urls import path
 from . import views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .querybudget import query_budget
 
 app_name = "otop_api"
 
 urlpatterns = [
     # Product
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/batch/', views.product_batch, name='product-batch'),
+    path('products/export.<str:fmt>', views.products_export, name='product-export'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:product_id>/reviews/', views.ProductReviewListCreateView.as_view(), name='product-review-list-create'),
 
@@ -20,16 +23,25 @@ urlpatterns = [
 path('orders/', views.OrderListView.as_view(), name='order-list'),  # ✅ GET list
 path('orders/create/', views.create_order, name='create-order'),    # ✅ POST create
 path('orders/create/v2/', views.create_order_v2, name='create_order_v2'),
+path('orders/import/', views.import_orders, name='order-import'),
+path('orders/import/<int:pk>/', views.import_orders_status, name='order-import-status'),
+path('orders/export.<str:fmt>', views.orders_export, name='order-export'),
 path('orders/my-orders/', views.get_orders, name='get-orders'),
+path('orders/events/', views.order_events, name='order-events'),
 path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
 path('orders/<int:pk>/status/', views.OrderStatusUpdateView.as_view(), name='order-status-update'),
 path('my-orders/', views.MyOrderListView.as_view(), name='my-order-list'),
 
+    # Cart (กันสินค้าชั่วคราว)
+    path('cart/holds/', views.place_cart_holds, name='cart-hold-create'),
+    path('cart/holds/<str:token>/', views.cart_holds, name='cart-hold-detail'),
+
     # Seller
     path('seller/', views.SellerDetailView.as_view(), name='seller-detail'),
     path('seller/products/', views.SellerProductListView.as_view(), name='seller-product-list'),
     path('seller/products/<int:pk>/', views.ProductManageView.as_view(), name='seller-product-manage'),
     path('seller/orders/', views.SellerOrderListView.as_view(), name='seller-order-list'),
+    path('seller/orders/status/', views.bulk_update_order_status, name='seller-order-status'),
     path('seller/dashboard/', views.seller_dashboard, name='seller_dashboard'),
 
     # User
@@ -37,6 +49,6 @@ path('my-orders/', views.MyOrderListView.as_view(), name='my-order-list'),
     path('profile/', views.UserProfileView.as_view(), name='user-profile'),
 
     # JWT
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', query_budget(2)(TokenObtainPairView.as_view()), name='token_obtain_pair'),
+    path('token/refresh/', query_budget(2)(TokenRefreshView.as_view()), name='token_refresh'),
 ]
\ No newline at end of file
@@ -1,52 +1,169 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, prefetch_related_objects
 from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
 from django.utils.decorators import method_decorator
+from asgiref.sync import sync_to_async
 from rest_framework import generics, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.throttling import UserRateThrottle
 from rest_framework.views import APIView
-from .models import Product, Category, Order, Seller, ProductReview
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Product, Category, Order, Seller, ProductReview, StockHold, ArchivedOrder, Job
+from .cache import get_product_payloads, set_product_payloads
+from .archive import ranged_order_rows, reaches_archive
+from .conditional import ConditionalGetMixin, make_etag
+from .events import event_stream, user_channels
+from .customers import order_customer_id
+from .exports import (
+    EXPORT_CONTENT_TYPES, ORDER_STATUSES, PRODUCT_STATUSES, ExportFilterError, apply_export_filters,
+    export_orders, export_products, parse_export_filters,
+)
+from .facets import get_facets
+from .fastpath import ORDER_VALUES, PRODUCT_VALUES, serialize_orders, serialize_products
+from .idempotency import idempotent, store_response
+from .importer import IMPORT_CHUNK_SIZE, import_storage, save_import_upload
+from .inventory import InsufficientStock, available_stock, merge_quantities, place_holds, release_holds
+from .jobs import enqueue
+from .order_numbers import allocate_order_number
+from .order_status import OrderStatusConflict, change_order_status
+from .pagination import HybridPagination
+from .querybudget import query_budget
+from .search import ProductSearchFilter
+from .sparse import SparseFieldsViewMixin, apply_sparse_fields, parse_sparse_fields, trim_fields
 from .serializers import (
     ProductSerializer, CategorySerializer, OrderSerializer, 
     CreateOrderSerializer, SellerSerializer, RegisterSerializer, 
-    UserProfileSerializer, ProductReviewSerializer
+    UserProfileSerializer, ProductReviewSerializer, PlaceHoldSerializer, BulkOrderStatusSerializer,
+    order_items_prefetch
 )
 import logging
+import uuid
 import cloudinary.uploader  # ✅ import cloudinary
 
 logger = logging.getLogger(__name__)
 
 # ---------- Products ----------
-class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.filter(is_active=True).select_related('category','seller')
+@query_budget(5)
+class ProductListView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListAPIView):
+    queryset = Product.objects.filter(is_active=True).order_by('-created_at')
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name','description','category__name']
+    pagination_class = HybridPagination
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
+    search_fields = ['name','description','category_name']
     ordering_fields = ['price','created_at']
+    sparse_columns = ('id', 'created_at', 'price')
     permission_classes = [AllowAny]
 
-class ProductDetailView(generics.RetrieveAPIView):
+    def get_facets(self):
+        """facet counts เมื่อ client ขอด้วย ?facets=1 (คำนวณครั้งเดียวต่อ request)"""
+        if not self.request.query_params.get('facets'):
+            return None
+        if not hasattr(self, '_facets'):
+            self._facets = get_facets(self.filter_queryset(self.get_queryset()), self.request)
+        return self._facets
+
+    def get_validators(self, request, *args, **kwargs):
+        # ใช้หน้าเดียวกับที่จะตอบ แต่ดึงแค่ id + updated_at (โหมด cursor จึงไม่มี COUNT)
+        rows = self.paginate_queryset(self.filter_queryset(self.get_queryset()).values(
+            'id', 'created_at', 'price', 'updated_at'
+        ))
+        count = None if self.paginator.keyset else self.paginator.page.paginator.count
+        versions = [(row['id'], row['updated_at']) for row in rows]
+        return make_etag(request.get_full_path(), count, versions, self.get_facets()), None
+
+    def list(self, request, *args, **kwargs):
+        if settings.FAST_LIST_SERIALIZERS and self.get_sparse_fields() is None:
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).values(*PRODUCT_VALUES))
+            response = self.get_paginated_response(serialize_products(page, request))
+        else:
+            response = super().list(request, *args, **kwargs)
+        facets = self.get_facets()
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
+
+@query_budget(3)
+class ProductDetailView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
+    def get_validators(self, request, *args, **kwargs):
+        rows = self.get_queryset().filter(pk=kwargs['pk']).values_list('updated_at', flat=True)[:1]
+        if not rows:
+            return None
+        last_modified = rows[0]
+        return make_etag(request.get_full_path(), last_modified), last_modified
+
+PRODUCT_BATCH_LIMIT = 50
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_batch(request):
+    """ดึงสินค้าหลายชิ้นในครั้งเดียว (?ids=1,2,3) สำหรับหน้าตะกร้า / wishlist"""
+    try:
+        ids = list(dict.fromkeys(int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'ids ต้องเป็นตัวเลขคั่นด้วย ,'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if not ids or len(ids) > PRODUCT_BATCH_LIMIT:
+        return Response({
+            'success': False,
+            'message': f'ระบุ ids ได้ 1-{PRODUCT_BATCH_LIMIT} รายการ'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ProductSerializer(context={'request': request})
+    payloads = get_product_payloads(ids)
+    missing_ids = [pk for pk in ids if pk not in payloads]
+    if missing_ids:
+        products = Product.objects.in_bulk(missing_ids)
+        built = {pk: serializer.build_payload(product) for pk, product in products.items()}
+        set_product_payloads(built)
+        payloads.update(built)
+
+    return Response({
+        'success': True,
+        'data': [serializer.with_image_url(payloads[pk]) for pk in ids if pk in payloads and payloads[pk]['is_available']],
+        'inactive': [pk for pk in ids if pk in payloads and not payloads[pk]['is_available']],
+        'missing': [pk for pk in ids if pk not in payloads],
+    })
+
 # ---------- Categories ----------
-class CategoryListView(generics.ListAPIView):
-    queryset = Category.objects.all()
+@query_budget(4)
+class CategoryListView(ConditionalGetMixin, generics.ListAPIView):
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
+    def get_validators(self, request, *args, **kwargs):
+        stats = Category.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+        return make_etag(request.get_full_path(), stats['count'], stats['last']), None
+
+@query_budget(2, put=3, patch=3, delete=12)
 class CategoryManageView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
     queryset = Category.objects.all()
 
 # ---------- Orders (เวอร์ชันเดิม) ----------
+@query_budget(13)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def create_order(request):
     """สร้างออร์เดอร์ใหม่"""
     print(f"Create order request data: {request.data}")
@@ -60,42 +177,39 @@ def create_order(request):
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    hold_token = serializer.validated_data.get('hold_token')
+    if hold_token and (not request.user.is_authenticated or foreign_holds(hold_token, request.user)):
+        return Response({
+            'success': False,
+            'message': 'ไม่พบสินค้าที่กันไว้ (hold_token)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
     try:
+        # จองเลขออร์เดอร์นอก transaction (ดู otop_app/order_numbers.py)
+        order_number = allocate_order_number()
         with transaction.atomic():
-            items_data = serializer.validated_data['items']
-            products_to_update = []
-            
-            for item in items_data:
-                product = get_object_or_404(Product, id=item['product_id'])
-                if product.stock < item['quantity']:
-                    return Response({
-                        'success': False,
-                        'message': f'สินค้า "{product.name}" มีไม่เพียงพอ (เหลือ {product.stock} ชิ้น)'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                products_to_update.append({
-                    'product': product,
-                    'quantity': item['quantity']
-                })
-            
-            # สร้างออร์เดอร์
-            order = serializer.save()
-            
-            # ลด stock
-            for item in products_to_update:
-                product = item['product']
-                product.stock -= item['quantity']
-                product.save()
+            # สร้างออร์เดอร์และตัด stock (UPDATE เดียวแบบมีเงื่อนไข stock >= จำนวน ไม่ขายเกิน)
+            order = serializer.save(
+                order_number=order_number,
+                customer_id=order_customer_id(request.user, serializer.validated_data.get('customer_email')),
+            )
             
-            # Serialize order เพื่อส่งข้อมูลเต็มกลับไป
+            # Serialize order เพื่อส่งข้อมูลเต็มกลับไป (ดึง items + ชื่อสินค้าด้วย query เดียว)
+            prefetch_related_objects([order], order_items_prefetch())
             order_serializer = OrderSerializer(order)
             
-            return Response({
+            # บันทึกคำตอบของ Idempotency-Key ใน transaction เดียวกับออร์เดอร์
+            return store_response(request, Response({
                 'success': True,
                 'message': 'สั่งซื้อสำเร็จ',
                 'data': order_serializer.data
-            }, status=status.HTTP_201_CREATED)
+            }, status=status.HTTP_201_CREATED))
             
+    except InsufficientStock as e:
+        return Response({
+            'success': False,
+            'message': e.message
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         print(f"Order creation error: {str(e)}")
         return Response({
@@ -104,27 +218,33 @@ def create_order(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # ---------- Orders (เวอร์ชันใหม่ v2) ----------
+@query_budget(6)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def create_order_v2(request):
     """สร้างออร์เดอร์ใหม่ (เวอร์ชัน v2 - return order data)"""
     try:
-        order = Order.objects.create(
-            customer_email=request.data.get('customer_email'),
-            total_amount=request.data.get('total_amount', 0),
-            status='pending'
-        )
-        
-        return Response({
-            'success': True,
-            'message': 'Order created successfully',
-            'data': {
-                'id': order.id,
-                'order_number': getattr(order, 'order_number', None),
-                'status': order.status,
-                'total': str(order.total_amount),
-            }
-        }, status=201)
+        order_number = allocate_order_number()
+        with transaction.atomic():
+            order = Order.objects.create(
+                order_number=order_number,
+                customer_email=request.data.get('customer_email'),
+                customer_id=order_customer_id(request.user, request.data.get('customer_email')),
+                total_amount=request.data.get('total_amount', 0),
+                status='pending'
+            )
+            enqueue('order.created', {'order_id': order.id})
+            return store_response(request, Response({
+                'success': True,
+                'message': 'Order created successfully',
+                'data': {
+                    'id': order.id,
+                    'order_number': order.order_number,
+                    'status': order.status,
+                    'total': str(order.total_amount),
+                }
+            }, status=201))
     
     except Exception as e:
         return Response({
@@ -132,16 +252,74 @@ def create_order_v2(request):
             'message': str(e)
         }, status=400)
 
+# ---------- Orders (นำเข้าจำนวนมาก) ----------
+@query_budget(2)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_orders(request):
+    """
+    รับ body แบบ NDJSON หรือ CSV (Content-Type: text/csv) เก็บลง storage แบบ stream
+    แล้วนำเข้าในงานเบื้องหลัง orders.import ตอบ 202 พร้อม id ของงาน (ดูผลที่ GET /api/orders/import/{id}/)
+    """
+    stream = request.stream
+    if stream is None:
+        return Response({
+            'success': False,
+            'message': 'ไม่มีข้อมูลให้นำเข้า'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    try:
+        chunk_size = int(request.query_params.get('chunk_size', IMPORT_CHUNK_SIZE))
+    except ValueError:
+        chunk_size = IMPORT_CHUNK_SIZE
+    path = save_import_upload(stream, fmt)
+    # รันครั้งเดียว: chunk ที่ commit ไปแล้วจะถูกนำเข้าซ้ำถ้าลองใหม่
+    job = enqueue('orders.import', {'path': path, 'format': fmt, 'chunk_size': max(chunk_size, 1)}, max_attempts=1)
+
+    return Response({
+        'success': True,
+        'message': 'ได้รับไฟล์แล้ว กำลังนำเข้าในเบื้องหลัง',
+        'job_id': job.pk,
+    }, status=status.HTTP_202_ACCEPTED)
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def import_orders_status(request, pk):
+    """สถานะและผลของงานนำเข้า (ข้อผิดพลาดรายแถวแค่ส่วนต้น ที่เหลืออยู่ในไฟล์รายงาน report_url)"""
+    job = get_object_or_404(Job, pk=pk, name='orders.import')
+    data = {'success': job.status != 'failed', 'job_id': job.pk, 'status': job.status, **job.result}
+    if job.result.get('report'):
+        data['report_url'] = import_storage().url(job.result['report'])
+    if job.status == 'failed':
+        data['message'] = 'นำเข้าไม่สำเร็จ ออร์เดอร์ของ chunk ที่เสร็จก่อนหน้ายังคงอยู่'
+    return Response(data)
+
 # ---------- Orders (อื่น ๆ) ----------
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_orders(request):
     try:
-        orders = Order.objects.filter(customer_email=request.user.email).order_by('-created_at')
-        serializer = OrderSerializer(orders, many=True)
+        filters = parse_export_filters(request.query_params, ORDER_STATUSES)
+    except ExportFilterError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fields = parse_sparse_fields(request)
+        orders = Order.objects.filter(customer=request.user).order_by('-created_at')
+        if reaches_archive(filters):
+            rows = ranged_order_rows(orders, ArchivedOrder.objects.filter(customer=request.user), filters)
+            data = trim_fields(serialize_orders(rows), fields)
+        else:
+            orders = apply_sparse_fields(OrderSerializer, apply_export_filters(orders, filters), fields)
+            data = OrderSerializer(orders, many=True, context={'fields': fields}).data
         return Response({
             'success': True,
-            'orders': serializer.data
+            'orders': data
         })
     except Exception as e:
         return Response({
@@ -149,69 +327,342 @@ def get_orders(request):
             'message': f'ไม่สามารถดึงข้อมูลได้: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class OrderListView(generics.ListAPIView):
+# ออร์เดอร์ของผู้ขายอ่านผ่าน OrderSeller: ไล่ index (seller, created_at) ไม่ต้อง join OrderItem / Product + DISTINCT
+# เรียงและทำ cursor ด้วยคอลัมน์ของ OrderSeller (สำเนาจาก Order) ผ่าน annotation ที่ใช้ join เดียวกับ filter
+SELLER_ORDER_CURSOR_LOOKUPS = {'created_at': 'link_created_at', 'id': 'link_order_id'}
+SELLER_ORDER_RANGE_FIELDS = ('link_created_at', 'link_status')
+
+def seller_orders(seller):
+    return Order.objects.filter(seller_links__seller=seller).annotate(
+        link_created_at=F('seller_links__created_at'),
+        link_order_id=F('seller_links__order_id'),
+        link_status=F('seller_links__status'),
+    ).order_by('-link_created_at', '-link_order_id')
+
+def archived_seller_orders(seller):
+    # กรองช่วงเวลาผ่าน annotation (join เดียวกับ filter ผู้ขาย) ไม่ให้ออร์เดอร์หลายร้านซ้ำจาก join ที่สอง
+    return ArchivedOrder.objects.filter(seller_links__seller=seller).annotate(
+        link_created_at=F('seller_links__created_at'),
+        link_status=F('seller_links__status'),
+    )
+
+class OrderRangeMixin:
+    """
+    ?created_from / ?created_to (YYYY-MM-DD) / ?status กรองรายการออร์เดอร์
+    ช่วงที่ย้อนไปถึงออร์เดอร์ที่ย้ายไป archive แล้ว (archive.py) อ่านสองตารางด้วย UNION ALL
+    และแบ่งหน้าด้วย ?page= เท่านั้น (ไม่มี cursor) ไม่ส่งช่วงเวลา = อ่านเฉพาะตารางหลักเหมือนเดิม
+    """
+    range_fields = ('created_at', 'status')
+
+    def get_archived_queryset(self):
+        raise NotImplementedError
+
+    def get_range_filters(self):
+        if not hasattr(self, '_range_filters'):
+            try:
+                self._range_filters = parse_export_filters(self.request.query_params, ORDER_STATUSES)
+            except ExportFilterError as e:
+                raise ParseError(str(e))
+        return self._range_filters
+
+    def reads_archive(self):
+        return reaches_archive(self.get_range_filters())
+
+    def filter_queryset(self, queryset):
+        queryset = apply_export_filters(queryset, self.get_range_filters(), *self.range_fields)
+        return super().filter_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        if not self.reads_archive():
+            return super().list(request, *args, **kwargs)
+        # get_queryset อาจเปลี่ยน range_fields ตามผู้ใช้ (ผู้ขายกรองด้วยคอลัมน์ของ OrderSeller)
+        hot, archived = self.get_queryset(), self.get_archived_queryset()
+        rows = ranged_order_rows(hot, archived, self.get_range_filters(), *self.range_fields)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(trim_fields(serialize_orders(page), self.get_sparse_fields()))
+
+@query_budget(6)
+class OrderListView(OrderRangeMixin, SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
+    pagination_class = HybridPagination
     permission_classes = [IsAuthenticated]
 
+    cursor_field_lookups = SELLER_ORDER_CURSOR_LOOKUPS
+
     def get_queryset(self):
         user = self.request.user
         if hasattr(user, 'seller'):
-            return Order.objects.filter(items__product__seller=user.seller).distinct().order_by('-created_at')
-        return Order.objects.filter(customer_email=user.email).order_by('-created_at')
+            self.range_fields = SELLER_ORDER_RANGE_FIELDS
+            return seller_orders(user.seller)
+        self.cursor_field_lookups = {}
+        return Order.objects.filter(customer=user).order_by('-created_at')
 
-class OrderDetailView(generics.RetrieveAPIView):
+    def get_archived_queryset(self):
+        user = self.request.user
+        if hasattr(user, 'seller'):
+            return archived_seller_orders(user.seller)
+        return ArchivedOrder.objects.filter(customer=user)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_LIST_SERIALIZERS or self.get_sparse_fields() is not None or self.reads_archive():
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*ORDER_VALUES))
+        return self.get_paginated_response(serialize_orders(page))
+
+@query_budget(5)
+class OrderDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
+    """ไม่พบในตารางหลักแล้วค่อยหาใน archive (ออร์เดอร์เก่าที่ถูกย้ายไปแล้ว)"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         if hasattr(user, 'seller'):
-            return Order.objects.filter(items__product__seller=user.seller).distinct()
-        return Order.objects.filter(customer_email=user.email)
+            return Order.objects.filter(seller_links__seller=user.seller)
+        return Order.objects.filter(customer=user)
+
+    def get_archived_queryset(self):
+        user = self.request.user
+        if hasattr(user, 'seller'):
+            return ArchivedOrder.objects.filter(seller_links__seller=user.seller)
+        return ArchivedOrder.objects.filter(customer=user)
 
-class MyOrderListView(generics.ListAPIView):
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            row = self.get_archived_queryset().filter(pk=self.kwargs['pk']).values(*ORDER_VALUES).first()
+            if row is None:
+                raise
+        return Response(trim_fields(serialize_orders([{**row, 'archived': True}]), self.get_sparse_fields())[0])
+
+@query_budget(5)
+class MyOrderListView(OrderRangeMixin, SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
+    pagination_class = HybridPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(customer_email=self.request.user.email).order_by('-created_at')
-
+        return Order.objects.filter(customer=self.request.user).order_by('-created_at')
+
+    def get_archived_queryset(self):
+        return ArchivedOrder.objects.filter(customer=self.request.user)
+
+# ---------- Orders (แจ้งเปลี่ยนสถานะแบบ SSE) ----------
+def events_channels(request):
+    """
+    (channel ของผู้ใช้, exp ของ token) จาก JWT ใน header Authorization
+    None = ไม่ได้ login / token ไม่ถูกต้อง
+    ปิด DB connection ก่อนคืนค่า: stream ค้างได้ถึงอายุ token และไม่ได้ใช้ DB อีก
+    """
+    try:
+        try:
+            auth = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if not auth:
+            return None
+        user, token = auth
+        return user_channels(user), token['exp']
+    finally:
+        connection.close()
+
+@query_budget(2)
+async def order_events(request):
+    """
+    stream text/event-stream ของสถานะออร์เดอร์ที่เปลี่ยน (ลูกค้า: ออร์เดอร์ของตัวเอง, ผู้ขาย: ออร์เดอร์ของร้านด้วย)
+    ต่อค้างได้นานโดยไม่กิน thread ต้องรันผ่าน ASGI (otop_project/asgi.py)
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'รองรับเฉพาะ GET'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'message': 'endpoint นี้ต้องเปิดผ่าน ASGI server (otop_project.asgi)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    session = await sync_to_async(events_channels)(request)
+    if session is None:
+        return JsonResponse({'success': False, 'message': 'กรุณาเข้าสู่ระบบ'}, status=status.HTTP_401_UNAUTHORIZED)
+    channels, expires_at = session
+    # ปิด stream เมื่อ token หมดอายุ (event token.expired)
+    return StreamingHttpResponse(
+        event_stream(channels, expires_at=expires_at),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+ERROR_STATUS = {
+    'not_found': status.HTTP_404_NOT_FOUND,
+    'forbidden': status.HTTP_403_FORBIDDEN,
+    'invalid_transition': status.HTTP_400_BAD_REQUEST,
+}
+
+@query_budget(7)
 class OrderStatusUpdateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
+        if not hasattr(request.user, 'seller'):
+            return Response({
+                'success': False,
+                'message': 'ไม่มีสิทธิ์แก้ไขออร์เดอร์นี้'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        status_value = request.data.get('status')
+        if status_value not in dict(Order.STATUS_CHOICES):
+            return Response({
+                'success': False,
+                'message': 'สถานะไม่ถูกต้อง'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            order = get_object_or_404(Order, pk=pk)
-            
-            if not hasattr(request.user, 'seller') or not order.items.filter(product__seller=request.user.seller).exists():
-                return Response({
-                    'success': False,
-                    'message': 'ไม่มีสิทธิ์แก้ไขออร์เดอร์นี้'
-                }, status=status.HTTP_403_FORBIDDEN)
-            
-            status_value = request.data.get('status')
-            if status_value not in dict(Order.STATUS_CHOICES):
-                return Response({
-                    'success': False,
-                    'message': 'สถานะไม่ถูกต้อง'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            order.status = status_value
-            order.save()
-            
+            updated, errors = change_order_status(request.user.seller, {pk: status_value})
+        except OrderStatusConflict:
             return Response({
-                'success': True,
-                'message': 'อัพเดทสถานะสำเร็จ',
-                'status': status_value
-            })
-            
-        except Exception as e:
+                'success': False,
+                'message': 'ออร์เดอร์ถูกแก้ไขพร้อมกัน กรุณาลองใหม่'
+            }, status=status.HTTP_409_CONFLICT)
+        if pk in errors:
+            code, message = errors[pk]
             return Response({
                 'success': False,
-                'message': f'เกิดข้อผิดพลาด: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'message': message
+            }, status=ERROR_STATUS[code])
+
+        return Response({
+            'success': True,
+            'message': 'อัพเดทสถานะสำเร็จ',
+            'status': status_value
+        })
+
+@query_budget(7)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request):
+    """เปลี่ยนสถานะหลายออร์เดอร์ในครั้งเดียว (ดูกติกาใน otop_app/order_status.py)"""
+    if not hasattr(request.user, 'seller'):
+        return Response({
+            'success': False,
+            'message': 'สำหรับผู้ขายเท่านั้น'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = BulkOrderStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'ข้อมูลไม่ถูกต้อง',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    changes = {change['id']: change['status'] for change in serializer.validated_data['orders']}
+    try:
+        updated, errors = change_order_status(request.user.seller, changes)
+    except OrderStatusConflict:
+        return Response({
+            'success': False,
+            'message': 'ออร์เดอร์ถูกแก้ไขพร้อมกัน กรุณาลองใหม่'
+        }, status=status.HTTP_409_CONFLICT)
+
+    return Response({
+        'success': not errors,
+        'message': f'อัพเดทสถานะ {len(updated)} ออร์เดอร์' + (f', ไม่สำเร็จ {len(errors)} ออร์เดอร์' if errors else ''),
+        'updated': [{'id': pk, 'status': value} for pk, value in sorted(updated.items())],
+        'errors': [{'id': pk, 'code': code, 'message': message} for pk, (code, message) in sorted(errors.items())],
+    }, status=status.HTTP_200_OK if updated or not errors else status.HTTP_400_BAD_REQUEST)
+
+# ---------- Cart (stock hold) ----------
+# hold ล็อก stock ไว้จากคนอื่น: ต้อง login, token ผูกกับผู้สร้าง, จำกัดจำนวน (settings.STOCK_HOLD_MAX_*) และความถี่
+class CartHoldThrottle(UserRateThrottle):
+    scope = 'cart_holds'
+
+def foreign_holds(token, user):
+    """token นี้มี hold ที่ไม่ใช่ของ user (รวมถึง hold ที่ไม่มีเจ้าของ)"""
+    return StockHold.objects.filter(token=token).exclude(user=user).exists()
+
+def hold_summary(token, user):
+    holds = list(StockHold.objects.filter(token=token, user=user, expires_at__gt=timezone.now()).order_by('product_id'))
+    available = available_stock([hold.product_id for hold in holds])
+    return {
+        'token': token,
+        'expires_at': min((hold.expires_at for hold in holds), default=None),
+        'items': [
+            {
+                'product_id': hold.product_id,
+                'quantity': hold.quantity,
+                'available': available.get(hold.product_id, (None, 0))[1],
+            }
+            for hold in holds
+        ],
+    }
+
+@query_budget(7)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([CartHoldThrottle])
+def place_cart_holds(request):
+    """กันสินค้าในตะกร้าไว้ชั่วคราว (STOCK_HOLD_TTL) ส่ง token เดิมเพื่อแก้จำนวน / ต่อเวลา"""
+    serializer = PlaceHoldSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'ข้อมูลไม่ถูกต้อง',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    token = serializer.validated_data.get('token') or uuid.uuid4().hex
+    quantities = merge_quantities((item['product_id'], item['quantity']) for item in serializer.validated_data['items'])
+    # hold ที่ยังไม่หมดอายุของ token นี้ (ทุกคน) และของผู้ใช้นี้ (ทุก token) ใน query เดียว
+    held = list(
+        StockHold.objects.filter(Q(token=token) | Q(user=user), expires_at__gt=timezone.now())
+        .values_list('token', 'product_id', 'user_id')
+    )
+    if any(held_token == token and owner != user.pk for held_token, _, owner in held):
+        return Response({
+            'success': False,
+            'message': 'ไม่พบตะกร้านี้'
+        }, status=status.HTTP_404_NOT_FOUND)
+    lines = {pk for held_token, pk, _ in held if held_token == token} | set(quantities)
+    carts = {held_token for held_token, _, _ in held} | {token}
+    if len(lines) > settings.STOCK_HOLD_MAX_ITEMS or len(carts) > settings.STOCK_HOLD_MAX_CARTS:
+        return Response({
+            'success': False,
+            'message': f'กันสินค้าได้ไม่เกิน {settings.STOCK_HOLD_MAX_ITEMS} รายการต่อตะกร้า '
+                       f'และไม่เกิน {settings.STOCK_HOLD_MAX_CARTS} ตะกร้าพร้อมกัน'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        place_holds(token, quantities, user)
+    except InsufficientStock as e:
+        return Response({
+            'success': False,
+            'message': e.message
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'success': True,
+        'message': 'กันสินค้าไว้ให้แล้ว',
+        'data': hold_summary(token, user)
+    }, status=status.HTTP_201_CREATED)
+
+@query_budget(3)
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def cart_holds(request, token):
+    if request.method == 'DELETE':
+        release_holds(token, request.user)
+        return Response({
+            'success': True,
+            'message': 'ปล่อยสินค้าที่กันไว้แล้ว'
+        })
+    return Response({
+        'success': True,
+        'data': hold_summary(token, request.user)
+    })
 
 # ---------- Seller ----------
+@query_budget(1)
 @api_view(['GET'])
 def seller_dashboard(request):
     return Response({
@@ -236,6 +687,7 @@ def seller_dashboard(request):
         }
     })
 
+@query_budget(2, put=3, patch=3)
 class SellerDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = SellerSerializer
     permission_classes = [IsAuthenticated]
@@ -244,8 +696,10 @@ class SellerDetailView(generics.RetrieveUpdateAPIView):
         return get_object_or_404(Seller, user=self.request.user)
 
 # ---------- Seller Products (แก้ไขให้รองรับ Cloudinary) ----------
-class SellerProductListView(generics.ListCreateAPIView):
+@query_budget(3, post=8)
+class SellerProductListView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
+    pagination_class = HybridPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -268,6 +722,7 @@ class SellerProductListView(generics.ListCreateAPIView):
         else:
             serializer.save(seller=seller)
 
+@query_budget(2, put=5, patch=5, delete=12)
 class ProductManageView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
@@ -276,6 +731,8 @@ class ProductManageView(generics.RetrieveUpdateDestroyAPIView):
         return Product.objects.filter(seller__user=self.request.user)
 
     def perform_update(self, serializer):
+        # การแก้ stock ถูกบันทึกเป็น movement (ดู signals.py)
+        serializer.instance._stock_reference = f'seller:{self.request.user.get_username()}'
         image_file = self.request.FILES.get('image')
         if image_file:
             upload_result = cloudinary.uploader.upload(
@@ -289,15 +746,86 @@ class ProductManageView(generics.RetrieveUpdateDestroyAPIView):
         else:
             serializer.save()
 
-class SellerOrderListView(generics.ListAPIView):
+@query_budget(5)
+class SellerOrderListView(OrderRangeMixin, SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
+    pagination_class = HybridPagination
     permission_classes = [IsAuthenticated]
 
+    cursor_field_lookups = SELLER_ORDER_CURSOR_LOOKUPS
+    range_fields = SELLER_ORDER_RANGE_FIELDS
+
+    def get_seller(self):
+        if not hasattr(self, '_seller'):
+            self._seller = get_object_or_404(Seller, user=self.request.user)
+        return self._seller
+
     def get_queryset(self):
-        seller = get_object_or_404(Seller, user=self.request.user)
-        return Order.objects.filter(items__product__seller=seller).distinct().order_by('-created_at')
+        return seller_orders(self.get_seller())
+
+    def get_archived_queryset(self):
+        return archived_seller_orders(self.get_seller())
+
+# ---------- Export (CSV / NDJSON แบบ stream) ----------
+# query ระหว่าง stream ไม่ถูกนับในงบ (นับเฉพาะก่อนเริ่มส่ง body)
+def export_response(lines, name, fmt):
+    response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
+
+def export_error(message, code=status.HTTP_400_BAD_REQUEST):
+    return Response({
+        'success': False,
+        'message': message
+    }, status=code)
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def orders_export(request, fmt):
+    """ส่งออกออร์เดอร์ทั้งหมด (admin) หรือของร้าน (ผู้ขาย) กรองด้วย created_from / created_to / status"""
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return export_error('รองรับเฉพาะ .csv และ .ndjson', status.HTTP_404_NOT_FOUND)
+    try:
+        filters = parse_export_filters(request.query_params, ORDER_STATUSES)
+    except ExportFilterError as e:
+        return export_error(str(e))
+
+    user = request.user
+    if user.is_staff:
+        rows = ranged_order_rows(Order.objects.order_by('-pk'), ArchivedOrder.objects.all(), filters)
+    elif hasattr(user, 'seller'):
+        rows = ranged_order_rows(
+            seller_orders(user.seller), archived_seller_orders(user.seller), filters, *SELLER_ORDER_RANGE_FIELDS,
+        )
+    else:
+        return export_error('เฉพาะผู้ขายหรือผู้ดูแลระบบ', status.HTTP_403_FORBIDDEN)
+    return export_response(export_orders(rows, fmt), 'orders', fmt)
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def products_export(request, fmt):
+    """ส่งออกสินค้าทั้งหมด (admin) หรือของร้าน (ผู้ขาย) กรองด้วย created_from / created_to / status=active|inactive"""
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return export_error('รองรับเฉพาะ .csv และ .ndjson', status.HTTP_404_NOT_FOUND)
+    try:
+        filters = parse_export_filters(request.query_params, PRODUCT_STATUSES)
+    except ExportFilterError as e:
+        return export_error(str(e))
+
+    user = request.user
+    if user.is_staff:
+        products = Product.objects.order_by('-created_at')
+    elif hasattr(user, 'seller'):
+        products = Product.objects.filter(seller=user.seller).order_by('-created_at')
+    else:
+        return export_error('เฉพาะผู้ขายหรือผู้ดูแลระบบ', status.HTTP_403_FORBIDDEN)
+    products = apply_export_filters(products, filters, status_field='is_active')
+    return export_response(export_products(products, fmt, request=request), 'products', fmt)
 
 # ---------- Register & Profile ----------
+@query_budget(6)
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
@@ -340,6 +868,7 @@ class RegisterView(generics.CreateAPIView):
                 'message': f'สมัครสมาชิกไม่สำเร็จ: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(1, put=2, patch=2)
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -348,12 +877,13 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 # ---------- Product Review ----------
+@query_budget(3)
 class ProductReviewListCreateView(generics.ListCreateAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return ProductReview.objects.filter(product_id=self.kwargs['product_id']).order_by('-created_at')
+        return ProductReview.objects.filter(product_id=self.kwargs['product_id']).select_related('user').order_by('-created_at')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, product_id=self.kwargs['product_id'])
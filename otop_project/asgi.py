@@ -1,35 +1,25 @@
-from django.contrib import admin
-from django.urls import path, include
-from django.http import HttpResponse
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Swagger/OpenAPI Schema
-schema_view = get_schema_view(
-    openapi.Info(
-        title="OTOP Project API",
-        default_version='v1',
-        description="API documentation for OTOP Project",
-        contact=openapi.Contact(email="support@otop.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
-# Home Page
-def home(request):
-    return HttpResponse("🎉 ยินดีต้อนรับสู่ OTOP Project API 🎉")
-
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('', home, name="home"),
-
-    # API routes
-    path('api/', include('otop_app.urls')),
-
-    # Swagger Docs
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]
+"""
+ASGI config for otop_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+ใช้รัน endpoint ที่ต่อค้างนาน (GET /api/orders/events/) เช่น
+    gunicorn otop_project.asgi:application -k uvicorn.workers.UvicornWorker
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'otop_project.settings')
+
+application = get_asgi_application()
+
+# process นี้แยกจาก web (WSGI) ที่ publish event: นอก DEBUG ต้องใช้ broker ข้าม process (RedisBroker)
+from otop_app.cache import check_cache  # noqa: E402
+from otop_app.events import check_broker  # noqa: E402
+
+check_broker()
+check_cache()
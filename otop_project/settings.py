@@ -67,6 +67,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'otop_app.querybudget.QueryBudgetMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -96,6 +97,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'otop_project.wsgi.application'
+ASGI_APPLICATION = 'otop_project.asgi.application'
 
 # -----------------------------
 # DATABASE CONFIGURATION
@@ -118,6 +120,77 @@ else:
         }
     }
 
+# -----------------------------
+# CACHE
+# -----------------------------
+# รันหลาย worker ต้องใช้ cache ร่วมกัน (Redis) ไม่งั้น invalidation เห็นแค่ process เดียว
+# นอก DEBUG web/events ไม่ยอมเริ่มถ้าไม่ได้ตั้ง REDIS_URL (otop_app.cache.check_cache)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'otop',
+        }
+    }
+
+# payload สินค้าที่ serialize แล้ว (วินาที) ถูกลบทันทีเมื่อข้อมูลเปลี่ยน
+PRODUCT_PAYLOAD_CACHE_TIMEOUT = config('PRODUCT_PAYLOAD_CACHE_TIMEOUT', default=600, cast=int)
+
+# facet counts ของผลค้นหาสินค้า (วินาที)
+FACET_CACHE_TIMEOUT = config('FACET_CACHE_TIMEOUT', default=60, cast=int)
+
+# สร้าง output ของ list สินค้า/ออร์เดอร์จาก .values() โดยตรง (otop_app/fastpath.py)
+FAST_LIST_SERIALIZERS = config('FAST_LIST_SERIALIZERS', default=False, cast=bool)
+
+# Idempotency-Key ของการสร้างออร์เดอร์ (วินาที): เก็บคำตอบไว้นานเท่าไร,
+# request แรกถือ key ได้นานเท่าไรก่อนถือว่าค้าง, Retry-After ของ request ซ้ำที่มาระหว่าง request แรกยังทำงาน
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)
+IDEMPOTENCY_RETRY_AFTER = config('IDEMPOTENCY_RETRY_AFTER', default=1, cast=int)
+
+# คิวงานเบื้องหลัง (manage.py run_jobs): จำนวน thread, จำนวนครั้งที่ลองใหม่,
+# backoff ตั้งต้น (วินาที, เพิ่มเท่าตัวทุกครั้ง) และเวลาที่งาน running ถูกถือว่า worker ตายไปแล้ว
+JOB_WORKER_THREADS = config('JOB_WORKER_THREADS', default=4, cast=int)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=30, cast=int)
+JOB_LOCK_TIMEOUT = config('JOB_LOCK_TIMEOUT', default=300, cast=int)
+# งานที่ done / failed เก็บไว้กี่วันก่อน run_jobs ลบทิ้ง
+JOB_RETENTION_DAYS = config('JOB_RETENTION_DAYS', default=7, cast=int)
+
+# จำนวนเลขออร์เดอร์ที่แต่ละ process จองไว้ต่อครั้ง (มากขึ้น = แตะแถวตัวนับน้อยลง แต่เลขข้ามมากขึ้นเมื่อ restart)
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=50, cast=int)
+
+# เวลาที่สินค้าในตะกร้าถูกกันไว้ให้ (วินาที) ก่อนปล่อยคืนให้คนอื่น
+STOCK_HOLD_TTL = config('STOCK_HOLD_TTL', default=900, cast=int)
+# เพดานต่อผู้ใช้: จำนวนต่อรายการ, จำนวนรายการต่อตะกร้า (token) และจำนวนตะกร้าที่ยังไม่หมดอายุ
+STOCK_HOLD_MAX_QUANTITY = config('STOCK_HOLD_MAX_QUANTITY', default=20, cast=int)
+STOCK_HOLD_MAX_ITEMS = config('STOCK_HOLD_MAX_ITEMS', default=30, cast=int)
+STOCK_HOLD_MAX_CARTS = config('STOCK_HOLD_MAX_CARTS', default=3, cast=int)
+
+# นับ query ต่อ request (otop_app/querybudget.py) ใส่ X-Query-Count ใน response และ log SQL ที่รันซ้ำ
+QUERY_COUNT_HEADER = config('QUERY_COUNT_HEADER', default=DEBUG, cast=bool)
+QUERY_DUPLICATE_THRESHOLD = config('QUERY_DUPLICATE_THRESHOLD', default=3, cast=int)
+
+# ออร์เดอร์ที่ปิดแล้วและเก่ากว่านี้ (วัน) ถูกย้ายไป archive ด้วย manage.py archive_orders (otop_app/archive.py)
+ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=180, cast=int)
+
+# แจ้งเปลี่ยนสถานะออร์เดอร์แบบ SSE (otop_app/events.py)
+# Procfile แยก web (publish) กับ events (ผู้ฟัง) คนละ process: production ต้องตั้ง REDIS_URL (RedisBroker)
+# LocalBroker ใช้ได้เฉพาะตอน DEBUG ที่รันทุกอย่างใน ASGI process เดียว (process events ไม่ยอมเริ่มถ้าไม่ใช่)
+ORDER_EVENTS_BACKEND = config(
+    'ORDER_EVENTS_BACKEND',
+    default='otop_app.events.RedisBroker' if REDIS_URL else 'otop_app.events.LocalBroker',
+)
+ORDER_EVENTS_HEARTBEAT = config('ORDER_EVENTS_HEARTBEAT', default=15, cast=int)
+
 # -----------------------------
 # PASSWORD VALIDATION
 # -----------------------------
@@ -160,9 +233,15 @@ if RAILWAY_ENVIRONMENT:
         'API_SECRET': CLOUDINARY_API_SECRET,
     }
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+    # ไฟล์นำเข้าออร์เดอร์: web อัปโหลด worker อ่าน (คนละเครื่อง) ต้องเป็น storage ที่เห็นร่วมกัน
+    ORDER_IMPORT_STORAGE = 'cloudinary_storage.storage.RawMediaCloudinaryStorage'
 else:
     # Local: เก็บไฟล์ในเครื่อง
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    ORDER_IMPORT_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# จำนวนข้อผิดพลาดรายแถวที่เก็บใน Job.result ของการนำเข้า (ที่เหลืออยู่ในไฟล์รายงาน)
+ORDER_IMPORT_ERROR_SAMPLE = config('ORDER_IMPORT_ERROR_SAMPLE', default=100, cast=int)
 
 # -----------------------------
 # REST FRAMEWORK
@@ -180,6 +259,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_RATES': {
+        # POST /api/cart/holds/ ต่อผู้ใช้ (views.CartHoldThrottle)
+        'cart_holds': config('CART_HOLD_THROTTLE_RATE', default='30/min'),
+    },
 }
 
 # -----------------------------
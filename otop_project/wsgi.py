@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'otop_project.settings')
 
 application = get_wsgi_application()
+
+# worker / management command ลบ cache ของ payload สินค้า: นอก DEBUG ต้องใช้ cache ร่วม (Redis)
+from otop_app.cache import check_cache  # noqa: E402
+
+check_cache()